@@ -0,0 +1,30 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from ..core.ws_manager import ws_manager
+
+# Shared secret for the /admin endpoints, sent as X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        # Don't advertise endpoints nobody is allowed to use
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+@router.get("/admin/sessions", tags=["admin"])
+def list_sessions(limit: int = Query(100, ge=1, le=1000)):
+    """
+    Live WebSocket sessions with their sockets and approximate memory held. Sessions
+    are identified by a hash of their id: a raw id is enough to join a session's stream.
+    """
+    return ws_manager.sessions_report(limit=limit)
+
+@router.post("/admin/sessions/sweep", tags=["admin"])
+def sweep_sessions():
+    """Expire idle sessions now instead of waiting for the periodic sweeper"""
+    return {"expired": ws_manager.sweep(), "sessions": len(ws_manager.sessions)}
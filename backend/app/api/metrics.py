@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from ..core import startup_profile
+from ..core.client_pool import client_pool
+from ..core.embedding_cache import embedding_cache
+from ..core.executors import executors
+from ..core.token_coalescer import TokenCoalescer
+from ..core.ws_manager import ws_manager
+from ..services.chat_log_writer import chat_log_writer
+from ..services.conversation_memory import conversation_memory
+from ..services.execution_plan import plan_cache
+from ..services.ingest_jobs import ingest_jobs
+from ..services.node_cache import node_cache
+
+router = APIRouter()
+
+@router.get("/metrics", tags=["metrics"])
+def get_metrics():
+    """Runtime counters for the in-process caches and pools"""
+    return {
+        "plan_cache": plan_cache.stats(),
+        "node_cache": node_cache.stats(),
+        "client_pool": client_pool.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "ingest_jobs": ingest_jobs.stats(),
+        "executors": executors.stats(),
+        "websocket": ws_manager.stats(),
+        "token_frames": TokenCoalescer.stats(),
+        "chat_log_writer": chat_log_writer.stats(),
+        "conversation_memory": conversation_memory.stats(),
+        "startup": startup_profile.report(),
+    }
@@ -1,72 +1,117 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from ..services.processor import extract_text_from_pdf, store_document_in_chroma
-from ..db import SessionLocal
-from ..models import Document
-from sqlalchemy.orm import Session
+import asyncio
+import os
+from typing import Iterable, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from ..services import document_store
+from ..services.ingest_jobs import IngestQueueFull, ingest_jobs
+
+# Room for the multipart boundaries and form fields around the file itself
+UPLOAD_FORM_OVERHEAD = int(os.getenv("UPLOAD_FORM_OVERHEAD", str(64 * 1024)))
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+class UploadSizeLimit:
+    """
+    ASGI middleware bounding request bodies on the upload paths. Starlette parses the
+    whole multipart body before the endpoint runs, so the endpoint's own checks come
+    too late to stop an oversized upload being received. This rejects with 413 on the
+    declared Content-Length, or as soon as the bytes read pass the limit.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Iterable[str]):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        limit = document_store.UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            response = JSONResponse(status_code=413, content={"detail": _too_large(int(declared))})
+            await response(scope, receive, send)
+            return
 
-@router.post("/upload", tags=["documents"])
-async def upload_pdf(file: UploadFile = File(...), description: str = ""):
+        received = 0
+
+        async def counted_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing; FastAPI passes HTTPException through as the response
+                    raise HTTPException(status_code=413, detail=_too_large(received))
+            return message
+
+        await self.app(scope, counted_receive, send)
+
+def _too_large(size: int) -> str:
+    return str(document_store.UploadTooLarge(size, document_store.UPLOAD_MAX_BYTES))
+
+@router.post("/upload", tags=["documents"], status_code=202)
+async def upload_pdf(file: UploadFile = File(...), description: str = "", session_id: Optional[str] = None,
+                     ingest: bool = True):
+    """
+    Accept a PDF and queue it for background ingestion; poll the returned job or subscribe
+    over /ws. With ingest=false the file is only stored, for Knowledge Base nodes to
+    reference by document_id.
+    """
     # Validate file type
     if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Only PDFs allowed")
     
-    # Validate file size (10MB limit)
-    max_size = 10 * 1024 * 1024  # 10MB
-    contents = await file.read()
-    if len(contents) > max_size:
-        raise HTTPException(status_code=400, detail=f"File size ({len(contents) / 1024 / 1024:.1f}MB) exceeds 10MB limit")
-    
     # Validate filename
     if not file.filename or not file.filename.strip():
         raise HTTPException(status_code=400, detail="Invalid filename")
-    
+
+    # UploadSizeLimit has bounded the request body; this checks the file part itself
+    if file.size is not None and file.size > document_store.UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=400, detail=str(document_store.UploadTooLarge(file.size, document_store.UPLOAD_MAX_BYTES)))
+
+    # Stream to disk in chunks instead of reading the whole file into memory
     try:
-        # Extract text with timeout
-        import asyncio
-        text = await asyncio.wait_for(
-            _run_blocking(extract_text_from_pdf, contents),
-            timeout=30.0  # 30 second timeout
-        )
-        
-        if not text or not text.strip():
-            raise HTTPException(status_code=400, detail="No text content found in PDF")
-        
-        # Store in ChromaDB with default settings
-        result = store_document_in_chroma(file.filename, text, metadata={"description": description})
-        
-        # Store in database
-        db: Session = next(get_db())
+        temp_path, size, content_hash = await asyncio.to_thread(document_store.spool, file.file)
+    except document_store.UploadTooLarge as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+
+    if not ingest:
         try:
-            doc = Document(filename=file.filename, description=description)
-            db.add(doc)
-            db.commit()
-            db.refresh(doc)
-            return {"success": True, "document_id": doc.id, "stored_chunks": result["stored_chunks"]}
+            doc = await ingest_jobs.store(temp_path, file.filename, description, size, content_hash)
         except Exception as e:
-            db.rollback()
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-        finally:
-            db.close()
-            
-    except asyncio.TimeoutError:
-        raise HTTPException(status_code=408, detail="File processing timeout")
+        return JSONResponse(status_code=200 if doc["duplicate"] else 201,
+                            content={"success": True, "job_id": None, "status": "stored", **doc})
+    
+    try:
+        job = await ingest_jobs.submit(temp_path, file.filename, description, size, content_hash, session_id=session_id)
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Ingestion queue is full, try again later ({e})")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"File processing error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-def _run_blocking(func, *args, **kwargs):
-    """Helper function to run blocking operations in async context"""
-    import asyncio
-    import concurrent.futures
-    
-    loop = asyncio.get_event_loop()
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        return loop.run_in_executor(executor, func, *args, **kwargs)
+    # The same file uploaded again resolves to the existing document and its job
+    duplicate = job.get("duplicate", False)
+    return JSONResponse(status_code=200 if duplicate else 202, content={
+        "success": True,
+        "job_id": job["job_id"],
+        "document_id": job["document_id"],
+        "status": job["status"],
+        "duplicate": duplicate,
+    })
+
+@router.get("/upload/jobs", tags=["documents"])
+async def list_ingest_jobs(limit: int = 50, status: Optional[str] = None):
+    return {"jobs": await ingest_jobs.list(limit=limit, status=status)}
+
+@router.get("/upload/jobs/{job_id}", tags=["documents"])
+async def get_ingest_job(job_id: str):
+    job = await ingest_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return job
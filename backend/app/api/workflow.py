@@ -1,35 +1,61 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..schemas import WorkflowDefinition
-from ..db import SessionLocal
+from ..db import AsyncSessionLocal, get_async_db
 from ..models import Workflow, ChatLog
-from ..services.graph_orchestrator import execute_graph
+from ..services.chat_log_writer import chat_log_writer
+from ..services.conversation_memory import MEMORY_ENABLED, conversation_memory
+from ..services.graph_orchestrator import execute_plan
+from ..services.execution_plan import plan_cache
 from ..services.workflow_validator import validate_workflow, validate_node_configuration
 from ..core.ws_manager import ws_manager
 from loguru import logger
+import asyncio
+import base64
+import datetime
 import json
+import os
 import uuid
 
 router = APIRouter()
 
+# Seconds between SSE comment lines that keep idle proxies from closing the stream
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+
+def encode_cursor(created_at: datetime.datetime, row_id: int) -> str:
+    """Opaque keyset cursor: the (created_at, id) of the last row of a page"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def older_than(created_col, id_col, cursor: str):
+    """Rows after the cursor in (created_at, id) descending order"""
+    created_at, row_id = decode_cursor(cursor)
+    return or_(created_col < created_at, and_(created_col == created_at, id_col < row_id))
+
 @router.post("/workflows", tags=["workflow"])
-def create_workflow(defn: WorkflowDefinition):
+async def create_workflow(defn: WorkflowDefinition, db: AsyncSession = Depends(get_async_db)):
     try:
         logger.info(f"Creating workflow: name='{defn.name}', nodes={len(defn.nodes)}, edges={len(defn.edges)}")
         
         # For empty workflows (initial creation), skip validation
         if not defn.nodes or len(defn.nodes) == 0:
-            db = SessionLocal()
             try:
                 wf = Workflow(name=defn.name, description=defn.description or "", definition=json.dumps({"nodes":defn.nodes, "edges": defn.edges}))
                 db.add(wf)
-                db.commit()
-                db.refresh(wf)
+                await db.commit()
                 return {"workflow_id": wf.id, "message": "Workflow created successfully"}
             except Exception as e:
-                db.rollback()
+                await db.rollback()
                 raise HTTPException(status_code=500, detail=f"Failed to create workflow: {str(e)}")
-            finally:
-                db.close()
         
         # For workflows with nodes, validate structure
         is_valid, errors = validate_workflow(defn.nodes, defn.edges)
@@ -42,18 +68,14 @@ def create_workflow(defn: WorkflowDefinition):
             if not node_valid:
                 raise HTTPException(status_code=400, detail=f"Node {node.get('id', 'unknown')} validation failed: {'; '.join(node_errors)}")
         
-        db = SessionLocal()
         try:
             wf = Workflow(name=defn.name, description=defn.description or "", definition=json.dumps({"nodes":defn.nodes, "edges": defn.edges}))
             db.add(wf)
-            db.commit()
-            db.refresh(wf)
+            await db.commit()
             return {"workflow_id": wf.id, "message": "Workflow created successfully"}
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=500, detail=f"Failed to create workflow: {str(e)}")
-        finally:
-            db.close()
     except HTTPException:
         raise
     except Exception as e:
@@ -61,14 +83,33 @@ def create_workflow(defn: WorkflowDefinition):
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 @router.post("/workflows/{workflow_id}/execute", tags=["workflow"])
-async def run_workflow(workflow_id: int, req: dict):
-    db = SessionLocal()
-    wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-    if not wf:
+async def run_workflow(workflow_id: int, req: dict, request: Request, stream: bool = False):
+    """
+    Run a workflow. With ?stream=true (or "stream": true in the body, or an
+    Accept: text/event-stream header) the response is an SSE stream carrying the
+    session's log/token/done/error events as they happen, ending with a "result"
+    event; otherwise the response is sent once the graph has finished.
+    """
+    # Only the lookup holds a connection; the graph run can take minutes
+    async with AsyncSessionLocal() as db:
+        definition = await db.scalar(select(Workflow.definition).where(Workflow.id == workflow_id))
+    if definition is None:
         raise HTTPException(404, "Workflow not found")
-    definition = json.loads(wf.definition)
     session_id = req.get("session_id") or str(uuid.uuid4())
-    
+
+    if stream or req.get("stream") or "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _event_stream(workflow_id, definition, req, session_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        return await _execute(workflow_id, definition, req, session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _execute(workflow_id: int, definition: str, req: dict, session_id: str) -> dict:
     # Extract API keys and config from request
     execution_context = {
         "query": req.get("query"),
@@ -77,8 +118,17 @@ async def run_workflow(workflow_id: int, req: dict):
         "chat_history": req.get("chat_history", [])
     }
     
+    run_stats = {}
+    conversation_id = req.get("conversation_id")
     try:
-        outputs = await execute_graph(definition.get("nodes", []), definition.get("edges", []), execution_context, session_id=session_id)
+        plan = plan_cache.get_or_compile(workflow_id, definition)
+        if MEMORY_ENABLED and any(n.get("type") == "llm" for n in plan.node_map.values()):
+            # History comes from the server-side conversation, not from the request
+            memory = await conversation_memory.context_for(workflow_id, conversation_id, execution_context["api_keys"])
+            execution_context["chat_history"] = memory["chat_history"]
+            execution_context["history_summary"] = memory["summary"]
+            run_stats["history_tokens"] = memory["history_tokens"]
+        outputs = await execute_plan(plan, execution_context, session_id=session_id, stats=run_stats)
         # store chat log (take first output)
         if outputs and len(outputs) > 0:
             output_data = outputs[0]["value"] if "value" in outputs[0] else outputs[0]
@@ -90,29 +140,72 @@ async def run_workflow(workflow_id: int, req: dict):
         else:
             out_text = ""
         
-        log = ChatLog(workflow_id=workflow_id, user_query=req.get("query"), response=out_text)
-        db.add(log)
-        db.commit()
-        return {"session_id": session_id, "output": out_text}
+        # Queued for a batched insert; the response does not wait on the commit
+        await chat_log_writer.add(workflow_id, req.get("query"), out_text, conversation_id=conversation_id)
+        return {"session_id": session_id, "output": out_text, "stats": run_stats}
     except Exception as e:
         logger.exception("Workflow execution failed")
         # Send error via WebSocket if session_id exists
         if session_id:
-            from ..core.ws_manager import ws_manager
             await ws_manager.send(session_id, {"type":"error","message": str(e)})
-        raise HTTPException(status_code=500, detail=str(e))
+        raise
+
+def _sse(event: str, data: dict, event_id=None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _event_stream(workflow_id: int, definition: str, req: dict, session_id: str):
+    """
+    Start the run and relay its session events as SSE until it finishes, then send its
+    result. Nothing is registered until the response starts streaming, so a client that
+    disconnects before that leaves no listener or orphaned run behind.
+    """
+    # Register before starting so not even the first event is missed
+    listener = ws_manager.listen(session_id, level=req.get("log_level"))
+    task = asyncio.create_task(_execute(workflow_id, definition, req, session_id))
+    try:
+        # Tell the client which session to watch if it wants to reconnect over WebSocket
+        yield _sse("session", {"session_id": session_id})
+        while not task.done() or listener.queue:
+            getter = asyncio.ensure_future(listener.get())
+            done, _ = await asyncio.wait({getter, task}, timeout=SSE_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if not done:
+                    yield ": keepalive\n\n"
+                continue
+            event = getter.result()
+            if event is None:
+                break
+            yield _sse(event.get("type", "message"), event, event.get("seq"))
+        if task.done() and not task.cancelled():
+            if task.exception() is None:
+                yield _sse("result", task.result())
+            # A failed run has already emitted its "error" event through the session
+    finally:
+        ws_manager.unlisten(listener)
+        if not task.done() and not ws_manager.wants(session_id, "error"):
+            # The client went away and nobody else is watching this session
+            logger.info(f"SSE client for session {session_id} disconnected, cancelling run")
+            task.cancel()
 
 @router.get("/workflows", tags=["workflow"])
-def list_workflows():
-    db = SessionLocal()
-    wfs = db.query(Workflow).order_by(Workflow.created_at.desc()).all()
-    result = [{"id": w.id, "workflow_id": w.id, "name": w.name, "description": w.description or "", "created_at": w.created_at.isoformat()} for w in wfs]
-    return {"workflows": result}
+async def list_workflows(limit: int = Query(100, ge=1, le=500), cursor: Optional[str] = None,
+                         db: AsyncSession = Depends(get_async_db)):
+    """Newest first, one page at a time; pass next_cursor back as ?cursor= for the next page"""
+    # Project only the listed columns; definition can be large
+    q = select(Workflow.id, Workflow.name, Workflow.description, Workflow.created_at)
+    if cursor:
+        q = q.where(older_than(Workflow.created_at, Workflow.id, cursor))
+    rows = (await db.execute(q.order_by(Workflow.created_at.desc(), Workflow.id.desc()).limit(limit + 1))).all()
+    page = rows[:limit]
+    result = [{"id": w.id, "workflow_id": w.id, "name": w.name, "description": w.description or "", "created_at": w.created_at.isoformat()} for w in page]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None
+    return {"workflows": result, "next_cursor": next_cursor}
 
 @router.get("/workflows/{workflow_id}", tags=["workflow"])
-def get_workflow(workflow_id: int):
-    db = SessionLocal()
-    wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
+async def get_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    wf = await db.get(Workflow, workflow_id)
     if not wf:
         raise HTTPException(status_code=404, detail="Workflow not found")
     try:
@@ -122,17 +215,40 @@ def get_workflow(workflow_id: int):
     return {"workflow_id": wf.id, "name": wf.name, "description": wf.description or "", "definition": definition}
 
 @router.get("/workflows/{workflow_id}/chat-history", tags=["workflow"])
-def get_chat_history(workflow_id: int, limit: int = 50):
-    db = SessionLocal()
-    wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-    if not wf:
+async def get_chat_history(workflow_id: int, limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None,
+                           db: AsyncSession = Depends(get_async_db)):
+    """Newest first, one page at a time; pass next_cursor back as ?cursor= for older entries"""
+    exists = await db.scalar(select(Workflow.id).where(Workflow.id == workflow_id))
+    if exists is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
-    logs = db.query(ChatLog).filter(ChatLog.workflow_id == workflow_id).order_by(ChatLog.created_at.desc()).limit(limit).all()
-    return {"chat_history": [{"id": log.id, "user_query": log.user_query, "response": log.response, "created_at": log.created_at.isoformat()} for log in logs]}
+    if not cursor and chat_log_writer.pending(workflow_id):
+        # Commit buffered chat logs first so every returned row has an id to page from
+        try:
+            await chat_log_writer.flush()
+        except Exception as e:
+            logger.warning(f"Chat log flush before history read failed: {e}")
+
+    q = select(ChatLog.id, ChatLog.workflow_id, ChatLog.user_query, ChatLog.response, ChatLog.created_at).where(ChatLog.workflow_id == workflow_id)
+    if cursor:
+        q = q.where(older_than(ChatLog.created_at, ChatLog.id, cursor))
+    rows = (await db.execute(q.order_by(ChatLog.created_at.desc(), ChatLog.id.desc()).limit(limit + 1))).all()
+    history = [dict(r._mapping) for r in rows[:limit]]
+    if not cursor:
+        # Rows still buffered (the flush failed) are the newest and may push stored rows off this page
+        history = chat_log_writer.merge_history(workflow_id, history, limit)
+    # Continue after the last stored row actually returned, so rows pushed off the page come next
+    shown = [h for h in history if h["id"] is not None]
+    next_cursor = None
+    if len(rows) > len(shown):
+        next_cursor = encode_cursor(shown[-1]["created_at"], shown[-1]["id"]) if shown else encode_cursor(datetime.datetime.max, 0)
+    return {
+        "chat_history": [{"id": h["id"], "user_query": h["user_query"], "response": h["response"], "created_at": h["created_at"].isoformat()} for h in history],
+        "next_cursor": next_cursor,
+    }
 
 @router.put("/workflows/{workflow_id}", tags=["workflow"])
-def update_workflow(workflow_id: int, defn: WorkflowDefinition):
+async def update_workflow(workflow_id: int, defn: WorkflowDefinition, db: AsyncSession = Depends(get_async_db)):
     # Validate workflow structure
     is_valid, errors = validate_workflow(defn.nodes, defn.edges)
     if not is_valid:
@@ -144,42 +260,38 @@ def update_workflow(workflow_id: int, defn: WorkflowDefinition):
         if not node_valid:
             raise HTTPException(status_code=400, detail=f"Node {node.get('id', 'unknown')} validation failed: {'; '.join(node_errors)}")
     
-    db = SessionLocal()
+    wf = await db.get(Workflow, workflow_id)
+    if not wf:
+        raise HTTPException(status_code=404, detail="Workflow not found")
     try:
-        wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-        if not wf:
-            raise HTTPException(status_code=404, detail="Workflow not found")
-        
         wf.name = defn.name
         wf.description = defn.description or ""
         wf.definition = json.dumps({"nodes": defn.nodes, "edges": defn.edges})
-        db.commit()
+        await db.commit()
+        plan_cache.invalidate(workflow_id)
         
-        return {"message": "Workflow updated successfully", "workflow_id": wf.id}
+        return {"message": "Workflow updated successfully", "workflow_id": workflow_id}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update workflow: {str(e)}")
-    finally:
-        db.close()
 
 @router.delete("/workflows/{workflow_id}", tags=["workflow"])
-def delete_workflow(workflow_id: int):
-    db = SessionLocal()
+async def delete_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db)):
+    wf = await db.get(Workflow, workflow_id)
+    if not wf:
+        raise HTTPException(status_code=404, detail="Workflow not found")
     try:
-        wf = db.query(Workflow).filter(Workflow.id == workflow_id).first()
-        if not wf:
-            raise HTTPException(status_code=404, detail="Workflow not found")
-        
+        # Buffered chat logs must land before their rows are deleted with the workflow
+        await chat_log_writer.flush()
         # Delete associated chat logs first
-        db.query(ChatLog).filter(ChatLog.workflow_id == workflow_id).delete()
+        await db.execute(delete(ChatLog).where(ChatLog.workflow_id == workflow_id))
         
         # Delete the workflow
-        db.delete(wf)
-        db.commit()
+        await db.delete(wf)
+        await db.commit()
+        plan_cache.invalidate(workflow_id)
         
         return {"message": "Workflow deleted successfully"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete workflow: {str(e)}")
-    finally:
-        db.close()
@@ -0,0 +1,335 @@
+import abc
+import asyncio
+import glob
+import json
+import os
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+from loguru import logger
+
+# memory: single process; unix: workers on one box talk over Unix sockets; redis: external broker
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "memory")
+WS_BACKPLANE_DIR = os.getenv("WS_BACKPLANE_DIR", "/tmp/flowmind-ws")
+WS_BACKPLANE_URL = os.getenv("WS_BACKPLANE_URL", "redis://localhost:6379/0")
+WS_BACKPLANE_CHANNEL = os.getenv("WS_BACKPLANE_CHANNEL", "flowmind:ws")
+# Bytes buffered towards one peer before further messages to it are dropped
+WS_BACKPLANE_PEER_BUFFER = int(os.getenv("WS_BACKPLANE_PEER_BUFFER", str(4 * 1024 * 1024)))
+# Seconds between rescans of the socket directory for new workers
+WS_BACKPLANE_REFRESH = float(os.getenv("WS_BACKPLANE_REFRESH", "2"))
+# Backoff bounds (seconds) for resubscribing after the broker subscription fails
+WS_BACKPLANE_RETRY_MIN = float(os.getenv("WS_BACKPLANE_RETRY_MIN", "0.5"))
+WS_BACKPLANE_RETRY_MAX = float(os.getenv("WS_BACKPLANE_RETRY_MAX", "30"))
+
+# Called with every message published by another worker
+Deliver = Callable[[Dict[str, Any]], None]
+
+class Backplane:
+    """
+    Fans ConnectionManager messages out to the other workers. Messages are plain
+    dicts with an "op" ("event" or "presence") and a "session_id". publish never
+    blocks the caller; delivery to this worker's own sockets is done by the manager.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    def publish(self, message: Dict[str, Any]):
+        pass
+
+    async def close(self):
+        pass
+
+    def has_peers(self) -> bool:
+        return False
+
+    def _receive(self, message: Dict[str, Any]):
+        if message.get("origin") == self.origin or self._deliver is None:
+            return
+        self.received += 1
+        try:
+            self._deliver(message)
+        except Exception as e:
+            logger.warning(f"Backplane delivery failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "origin": self.origin,
+            "published": self.published,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+class InProcessBackplane(Backplane):
+    """Single worker: nothing to fan out to"""
+
+    name = "memory"
+
+class UnixSocketBackplane(Backplane):
+    """
+    Workers on one host each listen on <dir>/<origin>.sock and send newline-delimited
+    JSON to every other socket in the directory. No broker process is needed; a worker
+    that dies leaves a stale socket file which the next connection attempt removes.
+    """
+
+    name = "unix"
+
+    def __init__(self, directory: str = WS_BACKPLANE_DIR, peer_buffer: int = WS_BACKPLANE_PEER_BUFFER,
+                 refresh: float = WS_BACKPLANE_REFRESH):
+        super().__init__()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.origin}.sock")
+        self.peer_buffer = peer_buffer
+        self.refresh = refresh
+        self.peers: Dict[str, asyncio.StreamWriter] = {}
+        self._connecting: Dict[str, asyncio.Task] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._last_scan = 0.0
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        os.makedirs(self.directory, exist_ok=True)
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path)
+        self._scan(force=True)
+        logger.info(f"WS backplane listening on {self.path}")
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                if message.get("op") == "hello":
+                    # A new worker came up; connect back so it receives our events too
+                    self._scan(force=True)
+                self._receive(message)
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _scan(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_scan < self.refresh:
+            return
+        self._last_scan = now
+        for path in glob.glob(os.path.join(self.directory, "*.sock")):
+            if path != self.path and path not in self.peers and path not in self._connecting:
+                self._connecting[path] = asyncio.get_running_loop().create_task(self._connect(path))
+
+    async def _connect(self, path: str):
+        try:
+            _, writer = await asyncio.open_unix_connection(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Left behind by a worker that exited without cleaning up
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return
+        except OSError as e:
+            logger.warning(f"WS backplane could not reach {path}: {e}")
+            return
+        finally:
+            self._connecting.pop(path, None)
+        self.peers[path] = writer
+        self._write(path, writer, {"op": "hello", "origin": self.origin})
+
+    def _write(self, path: str, writer: asyncio.StreamWriter, message: Dict[str, Any]) -> bool:
+        if writer.is_closing():
+            self.peers.pop(path, None)
+            return False
+        if writer.transport.get_write_buffer_size() > self.peer_buffer:
+            # A stalled peer must not grow our memory or hold up the publisher
+            self.dropped += 1
+            return False
+        writer.write(json.dumps(message, default=str).encode() + b"\n")
+        return True
+
+    def publish(self, message: Dict[str, Any]):
+        self._scan()
+        data = {**message, "origin": self.origin}
+        for path, writer in list(self.peers.items()):
+            self._write(path, writer, data)
+        self.published += 1
+
+    def has_peers(self) -> bool:
+        return bool(self.peers)
+
+    async def close(self):
+        for task in list(self._connecting.values()):
+            task.cancel()
+        for writer in self.peers.values():
+            writer.close()
+        self.peers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "path": self.path, "peers": len(self.peers)}
+
+class BrokerAdapter(abc.ABC):
+    """
+    Minimal interface to an external pub/sub broker. Implement the four abstract
+    methods to plug another broker into BrokerBackplane.
+    """
+
+    @abc.abstractmethod
+    async def connect(self):
+        """Connect and subscribe"""
+
+    @abc.abstractmethod
+    async def publish(self, data: bytes):
+        ...
+
+    @abc.abstractmethod
+    def listen(self) -> AsyncIterator[bytes]:
+        """Messages from the subscription, until it ends or fails"""
+
+    @abc.abstractmethod
+    async def close(self):
+        ...
+
+    async def reconnect(self):
+        """Drop a failed connection and subscribe again"""
+        try:
+            await self.close()
+        except Exception as e:
+            logger.debug(f"Closing the failed broker connection: {e}")
+        await self.connect()
+
+class RedisAdapter(BrokerAdapter):
+    """Redis pub/sub on one channel; needs the optional `redis` package"""
+
+    def __init__(self, url: str = WS_BACKPLANE_URL, channel: str = WS_BACKPLANE_CHANNEL):
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._pubsub = None
+
+    async def connect(self):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("WS_BACKPLANE=redis needs the 'redis' package") from e
+        self._redis = redis.from_url(self.url)
+        self._pubsub = self._redis.pubsub()
+        await self._pubsub.subscribe(self.channel)
+
+    async def publish(self, data: bytes):
+        await self._redis.publish(self.channel, data)
+
+    async def listen(self) -> AsyncIterator[bytes]:
+        async for item in self._pubsub.listen():
+            if item.get("type") == "message":
+                yield item["data"]
+
+    async def close(self):
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe(self.channel)
+            await self._pubsub.close()
+        if self._redis is not None:
+            await self._redis.close()
+
+class BrokerBackplane(Backplane):
+    """Backplane over an external broker; publishes go through a bounded local queue"""
+
+    name = "broker"
+
+    def __init__(self, adapter: BrokerAdapter, max_pending: int = 10000,
+                 retry_min: float = WS_BACKPLANE_RETRY_MIN, retry_max: float = WS_BACKPLANE_RETRY_MAX):
+        super().__init__()
+        self.adapter = adapter
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.resubscribes = 0
+        self._tasks = []
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        await self.adapter.connect()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._send_loop()), loop.create_task(self._listen_loop())]
+
+    def publish(self, message: Dict[str, Any]):
+        try:
+            self.queue.put_nowait({**message, "origin": self.origin})
+            self.published += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _send_loop(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                await self.adapter.publish(json.dumps(message, default=str).encode())
+            except Exception as e:
+                self.dropped += 1
+                logger.warning(f"WS backplane publish failed: {e}")
+
+    async def _listen_loop(self):
+        """Receive until cancelled; a failed or ended subscription is renewed with backoff"""
+        delay = self.retry_min
+        while True:
+            try:
+                async for data in self.adapter.listen():
+                    delay = self.retry_min
+                    try:
+                        self._receive(json.loads(data))
+                    except ValueError:
+                        continue
+                logger.warning("WS backplane subscription ended, resubscribing")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"WS backplane subscription failed, resubscribing in {delay:.1f}s: {e}")
+            while True:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+                try:
+                    await self.adapter.reconnect()
+                    self.resubscribes += 1
+                    break
+                except Exception as e:
+                    logger.warning(f"WS backplane resubscribe failed, retrying in {delay:.1f}s: {e}")
+
+    def has_peers(self) -> bool:
+        return True
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.adapter.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "pending": self.queue.qsize(), "resubscribes": self.resubscribes}
+
+def create_backplane(kind: str = WS_BACKPLANE) -> Backplane:
+    if kind == "unix":
+        return UnixSocketBackplane()
+    if kind == "redis":
+        return BrokerBackplane(RedisAdapter())
+    if kind != "memory":
+        logger.warning(f"Unknown WS_BACKPLANE '{kind}', using in-process delivery")
+    return InProcessBackplane()
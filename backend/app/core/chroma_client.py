@@ -1,25 +1,37 @@
-import chromadb
 import os
+import threading
 from loguru import logger
 
 CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
 
-# Initialize ChromaDB client with error handling
-try:
-    _client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
-    logger.info(f"ChromaDB client initialized with path: {CHROMA_PERSIST_DIR}")
-except Exception as e:
-    logger.error(f"Failed to initialize ChromaDB client: {e}")
-    # Fallback to in-memory client
-    _client = chromadb.Client()
-    logger.warning("Using in-memory ChromaDB client as fallback")
+_client = None
+_lock = threading.Lock()
 
 def get_client():
+    """The ChromaDB client, opened on first use; chromadb itself is imported only then"""
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            import chromadb
+            # Initialize ChromaDB client with error handling
+            try:
+                _client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+                logger.info(f"ChromaDB client initialized with path: {CHROMA_PERSIST_DIR}")
+            except Exception as e:
+                logger.error(f"Failed to initialize ChromaDB client: {e}")
+                # Fallback to in-memory client
+                _client = chromadb.Client()
+                logger.warning("Using in-memory ChromaDB client as fallback")
     return _client
 
+def is_open() -> bool:
+    return _client is not None
+
 def get_or_create_collection(name: str):
     try:
-        return _client.get_or_create_collection(name)
+        return get_client().get_or_create_collection(name)
     except Exception as e:
         logger.error(f"Failed to get or create collection '{name}': {e}")
         raise
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import importlib.util
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, ContextManager, Dict, Optional, Tuple
+from loguru import logger
+
+# httpx and the SDKs are imported inside the factories so importing the app stays fast
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI, OpenAI
+
+CLIENT_POOL_MAX_SIZE = int(os.getenv("CLIENT_POOL_MAX_SIZE", "64"))
+CLIENT_POOL_IDLE_TTL = float(os.getenv("CLIENT_POOL_IDLE_TTL", "600"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+# HTTP/2 needs the optional `h2` package (httpx[http2]); fall back to HTTP/1.1 keep-alive without it
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+# Optional overrides for the Gemini service client, e.g. to point benchmarks at a local fake
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT")  # grpc (default) | rest
+
+def key_fingerprint(api_key: str) -> str:
+    """Stable, non-reversible id for an API key, safe to log and keep in memory"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+class _Entry:
+    __slots__ = ("client", "close", "http", "loop", "last_used", "refs", "retired")
+
+    def __init__(self, client: Any, close: Optional[Callable], http: Any):
+        self.client = client
+        self.close = close
+        self.http = http
+        # Async clients are bound to the loop they were built on; their close must run there too
+        try:
+            self.loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.loop = None
+        self.last_used = time.monotonic()
+        self.refs = 0
+        self.retired = False
+
+# Strong refs to scheduled async closes so they are not garbage collected mid-flight
+_closing_tasks: set = set()
+
+def _finish_async_close(coro, loop: Optional[asyncio.AbstractEventLoop]):
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if loop is not None and loop is not running and loop.is_running():
+        asyncio.run_coroutine_threadsafe(coro, loop)
+    elif running is not None:
+        task = running.create_task(coro)
+        _closing_tasks.add(task)
+        task.add_done_callback(_closing_tasks.discard)
+    else:
+        asyncio.run(coro)  # the owning loop is gone; drive the close to completion here
+
+def _close_quietly(entry: _Entry):
+    if not entry.close:
+        return
+    try:
+        result = entry.close()
+        if inspect.isawaitable(result):
+            _finish_async_close(result, entry.loop)
+    except Exception as e:
+        logger.warning(f"Failed to close pooled client: {e}")
+
+def _open_connections(http: Any) -> int:
+    """Connections currently held by an httpx client's connection pool"""
+    pool = getattr(getattr(http, "_transport", None), "_pool", None)
+    return len(getattr(pool, "connections", None) or [])
+
+class ClientPool:
+    """
+    Registry of long-lived provider clients keyed by (kind, API key fingerprint).
+    Clients keep their connections alive between calls; idle ones are closed after
+    idle_ttl seconds and the least recently used one goes when max_size is exceeded.
+    Callers hold a lease for as long as they use a client, streams included.
+    """
+
+    def __init__(self, max_size: int = CLIENT_POOL_MAX_SIZE, idle_ttl: float = CLIENT_POOL_IDLE_TTL):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _retire(self, entry: _Entry, closing: list):
+        """Drop an entry from the pool; it is closed now if unused, else by its last release"""
+        entry.retired = True
+        if entry.refs == 0:
+            closing.append(entry)
+
+    def _acquire(self, kind: str, api_key: str, factory: Callable[[], Tuple[Any, Optional[Callable], Any]]) -> _Entry:
+        key = (kind, key_fingerprint(api_key))
+        closing = []
+        with self._lock:
+            now = time.monotonic()
+            idle = [k for k, e in self._entries.items() if e.refs == 0 and now - e.last_used > self.idle_ttl and k != key]
+            for k in idle:
+                self._retire(self._entries.pop(k), closing)
+            self.evictions += len(idle)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+                entry = _Entry(*factory())
+                self._entries[key] = entry
+                while len(self._entries) > self.max_size:
+                    self._retire(self._entries.popitem(last=False)[1], closing)
+                    self.evictions += 1
+            entry.refs += 1
+            entry.last_used = now
+        for old in closing:
+            _close_quietly(old)
+        return entry
+
+    def _release(self, entry: _Entry):
+        with self._lock:
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+            close = entry.retired and entry.refs == 0
+        if close:
+            _close_quietly(entry)
+
+    @contextmanager
+    def lease(self, kind: str, api_key: str, factory: Callable[[], Tuple[Any, Optional[Callable], Any]]):
+        """
+        Borrow the pooled client for (kind, api_key), building it with factory() on a miss.
+        Eviction never closes a leased client; it is closed when the last lease is returned.
+        """
+        entry = self._acquire(kind, api_key, factory)
+        try:
+            yield entry.client
+        finally:
+            self._release(entry)
+
+    def close_all(self):
+        closing = []
+        with self._lock:
+            for entry in self._entries.values():
+                self._retire(entry, closing)
+            self._entries.clear()
+        for entry in closing:
+            _close_quietly(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_kind: Dict[str, int] = {}
+            connections = 0
+            for (kind, _), entry in self._entries.items():
+                by_kind[kind] = by_kind.get(kind, 0) + 1
+                connections += _open_connections(entry.http)
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "leased": sum(1 for e in self._entries.values() if e.refs),
+                "max_size": self.max_size,
+                "by_kind": by_kind,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "open_connections": connections,
+                "http2": HTTP2_ENABLED,
+            }
+
+client_pool = ClientPool()
+
+def _http_limits():
+    import httpx
+    return httpx.Limits(max_keepalive_connections=HTTP_MAX_KEEPALIVE, keepalive_expiry=CLIENT_POOL_IDLE_TTL)
+
+def lease_openai_client(api_key: str) -> ContextManager["OpenAI"]:
+    def factory():
+        import httpx
+        from openai import OpenAI
+        http = httpx.Client(http2=HTTP2_ENABLED, limits=_http_limits(), timeout=httpx.Timeout(60.0, connect=10.0))
+        c = OpenAI(api_key=api_key, http_client=http)
+        return c, c.close, http
+    return client_pool.lease("openai", api_key, factory)
+
+def lease_async_openai_client(api_key: str) -> ContextManager["AsyncOpenAI"]:
+    def factory():
+        import httpx
+        from openai import AsyncOpenAI
+        http = httpx.AsyncClient(http2=HTTP2_ENABLED, limits=_http_limits(), timeout=httpx.Timeout(60.0, connect=10.0))
+        c = AsyncOpenAI(api_key=api_key, http_client=http)
+        return c, c.close, http
+    return client_pool.lease("openai_async", api_key, factory)
+
+def lease_http_client(provider: str, api_key: str) -> ContextManager["httpx.Client"]:
+    """Keep-alive HTTP client for providers called over plain REST (e.g. Grok)"""
+    def factory():
+        import httpx
+        http = httpx.Client(http2=HTTP2_ENABLED, limits=_http_limits(), timeout=httpx.Timeout(60.0, connect=10.0))
+        return http, http.close, http
+    return client_pool.lease(f"{provider}_http", api_key, factory)
+
+def lease_async_http_client(provider: str, api_key: str) -> ContextManager["httpx.AsyncClient"]:
+    def factory():
+        import httpx
+        http = httpx.AsyncClient(http2=HTTP2_ENABLED, limits=_http_limits(), timeout=httpx.Timeout(60.0, connect=10.0))
+        return http, http.aclose, http
+    return client_pool.lease(f"{provider}_http_async", api_key, factory)
+
+def lease_gemini_client(api_key: str) -> ContextManager[Any]:
+    """Per-key GenerativeServiceClient, so calls never depend on the global genai.configure()"""
+    def factory():
+        import google.ai.generativelanguage as glm
+        client_options = {"api_key": api_key}
+        if GEMINI_API_ENDPOINT:
+            client_options["api_endpoint"] = GEMINI_API_ENDPOINT
+        c = glm.GenerativeServiceClient(transport=GEMINI_TRANSPORT, client_options=client_options)
+        return c, c.transport.close, None
+    return client_pool.lease("gemini", api_key, factory)
+
+def lease_gemini_async_client(api_key: str) -> ContextManager[Any]:
+    def factory():
+        import google.ai.generativelanguage as glm
+        c = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+        return c, c.transport.close, None
+    return client_pool.lease("gemini_async", api_key, factory)
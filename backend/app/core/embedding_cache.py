@@ -0,0 +1,184 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from loguru import logger
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+EMBEDDING_CACHE_MEMORY_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "4096"))
+# Rows kept on disk; the least recently used ones are pruned beyond it (0: unbounded)
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "200000"))
+
+CacheKey = Tuple[str, str, str]
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _to_blob(vector: Sequence[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+def _from_blob(blob: bytes) -> List[float]:
+    vec = array("f")
+    vec.frombytes(blob)
+    return vec.tolist()
+
+class EmbeddingCache:
+    """
+    Two-level embedding cache keyed by (provider, model, sha256(text)): an in-memory
+    LRU in front of a SQLite table storing vectors as float32 blobs. The table is capped
+    at max_rows, pruning rows least recently written or read from disk.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, memory_size: int = EMBEDDING_CACHE_MEMORY_SIZE,
+                 max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self._memory: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.lookups = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.provider_calls = 0
+        self.provider_calls_saved = 0
+        self.texts_embedded = 0
+        self.pruned = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "provider TEXT NOT NULL, model TEXT NOT NULL, text_hash TEXT NOT NULL, "
+                "dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "accessed_at REAL NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (provider, model, text_hash))"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(embeddings)")}
+            if "accessed_at" not in columns:
+                # Caches written before pruning existed; their rows go first
+                self._conn.execute("ALTER TABLE embeddings ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_accessed ON embeddings (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: CacheKey, blob: bytes):
+        self._memory[key] = blob
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, provider: str, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors in input order, None where the text has not been embedded yet"""
+        keys = [(provider, model, text_hash(t)) for t in texts]
+        found: Dict[CacheKey, bytes] = {}
+        with self._lock:
+            self.lookups += len(keys)
+            missing = []
+            for key in keys:
+                blob = self._memory.get(key)
+                if blob is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = blob
+                    self.memory_hits += 1
+                elif key not in found:
+                    missing.append(key)
+            if missing:
+                try:
+                    db = self._db()
+                    unique_hashes = list({k[2] for k in missing})
+                    hit_hashes = []
+                    for start in range(0, len(unique_hashes), 500):
+                        part = unique_hashes[start:start + 500]
+                        rows = db.execute(
+                            f"SELECT text_hash, vector FROM embeddings WHERE provider = ? AND model = ? "
+                            f"AND text_hash IN ({','.join('?' * len(part))})",
+                            (provider, model, *part),
+                        ).fetchall()
+                        for h, blob in rows:
+                            key = (provider, model, h)
+                            found[key] = blob
+                            self._remember(key, blob)
+                            hit_hashes.append(h)
+                    self.disk_hits += sum(1 for k in missing if k in found)
+                    if hit_hashes and self.max_rows:
+                        now = time.time()
+                        db.executemany(
+                            "UPDATE embeddings SET accessed_at = ? WHERE provider = ? AND model = ? AND text_hash = ?",
+                            [(now, provider, model, h) for h in hit_hashes],
+                        )
+                        db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache read failed: {e}")
+        return [_from_blob(found[k]) if k in found else None for k in keys]
+
+    def _prune(self, db: sqlite3.Connection):
+        overflow = db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_rows
+        if overflow > 0:
+            db.execute(
+                "DELETE FROM embeddings WHERE rowid IN "
+                "(SELECT rowid FROM embeddings ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.pruned += overflow
+
+    def put_many(self, provider: str, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                if not vector:
+                    continue
+                key = (provider, model, text_hash(text))
+                blob = _to_blob(vector)
+                self._remember(key, blob)
+                rows.append((provider, model, key[2], len(vector), blob, now))
+            if not rows:
+                return
+            try:
+                db = self._db()
+                db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (provider, model, text_hash, dim, vector, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                if self.max_rows:
+                    self._prune(db)
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Embedding cache write failed: {e}")
+
+    def record_call(self, requested: int, sent: int):
+        """Account for one embed request: `requested` texts, of which `sent` went to the provider"""
+        with self._lock:
+            if sent:
+                self.provider_calls += 1
+                self.texts_embedded += sent
+            elif requested:
+                self.provider_calls_saved += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "enabled": EMBEDDING_CACHE_ENABLED,
+                "memory_entries": len(self._memory),
+                "lookups": self.lookups,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hit_ratio": round(hits / self.lookups, 4) if self.lookups else 0.0,
+                "provider_calls": self.provider_calls,
+                "provider_calls_saved": self.provider_calls_saved,
+                "texts_embedded": self.texts_embedded,
+                "max_rows": self.max_rows,
+                "pruned": self.pruned,
+            }
+
+embedding_cache = EmbeddingCache()
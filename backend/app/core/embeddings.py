@@ -1,19 +1,27 @@
 import os
-from openai import OpenAI
-import google.generativeai as genai
+import time
+from collections import deque
+from concurrent.futures import wait
 from loguru import logger
+from .client_pool import lease_gemini_client, lease_openai_client
+from .embedding_cache import EMBEDDING_CACHE_ENABLED, embedding_cache
+from .executors import executors
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+GEMINI_EMBED_BATCH_SIZE = int(os.getenv("GEMINI_EMBED_BATCH_SIZE", "100"))
+GEMINI_EMBED_CONCURRENCY = int(os.getenv("GEMINI_EMBED_CONCURRENCY", "4"))
+GEMINI_EMBED_MAX_RETRIES = int(os.getenv("GEMINI_EMBED_MAX_RETRIES", "2"))
 
 def embed_texts(texts):
     if not texts:
         return []
-    if not client:
+    if not OPENAI_API_KEY:
         raise Exception("OpenAI client not initialized. Please set OPENAI_API_KEY environment variable.")
     try:
-        resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
+        # The SDK client is only built when embeddings are first needed
+        with lease_openai_client(OPENAI_API_KEY) as client:
+            resp = client.embeddings.create(model=EMBEDDING_MODEL, input=texts)
         embeddings = [item.embedding for item in resp.data]
         return embeddings
     except Exception as e:
@@ -27,98 +35,138 @@ def embed_texts_with_key(api_key: str, texts: list, model: str = None):
     if not api_key:
         raise Exception("API key not provided for embeddings")
     
-    temp_client = OpenAI(api_key=api_key)
     embedding_model = model or EMBEDDING_MODEL
     
     try:
-        resp = temp_client.embeddings.create(model=embedding_model, input=texts)
+        with lease_openai_client(api_key) as pooled_client:
+            resp = pooled_client.embeddings.create(model=embedding_model, input=texts)
         embeddings = [item.embedding for item in resp.data]
         return embeddings
     except Exception as e:
         logger.exception("OpenAI embedding error with custom key")
         raise
 
-def embed_texts_gemini(api_key: str, texts: list, model: str = "models/embedding-001"):
-    """Create embeddings using Google Gemini API with improved timeout handling"""
+def _embed_gemini_batch(gemini_client, model: str, batch: list, batch_no: int,
+                        max_retries: int = GEMINI_EMBED_MAX_RETRIES, retry_delay: float = 2):
+    """Embed one batch with a single batchEmbedContents call, retrying the whole batch with backoff"""
+    import google.generativeai as genai
+    for attempt in range(max_retries):
+        try:
+            result = genai.embed_content(
+                model=model,
+                content=batch,
+                task_type="retrieval_document",
+                client=gemini_client
+            )
+            vectors = result.get("embedding") if result else None
+            if not vectors or len(vectors) != len(batch):
+                raise Exception("Invalid response from Gemini API")
+            return vectors
+        except Exception as e:
+            error_msg = str(e)
+            delay = retry_delay * (2 ** attempt)
+
+            # Check for timeout errors
+            if "DeadlineExceeded" in error_msg or "504" in error_msg or "timeout" in error_msg.lower():
+                if attempt < max_retries - 1:
+                    logger.warning(f"Gemini API timeout for batch {batch_no}, retry {attempt + 1}/{max_retries}")
+                    time.sleep(delay)
+                    continue
+                raise Exception("Gemini API timeout. The service is currently slow or unavailable. Please try again in a few minutes.")
+
+            # Check for rate limiting
+            elif "429" in error_msg or "quota" in error_msg.lower():
+                if attempt < max_retries - 1:
+                    logger.warning(f"Gemini API rate limited for batch {batch_no}, retry {attempt + 1}/{max_retries}")
+                    time.sleep(delay * 2)
+                    continue
+                raise Exception("Gemini API rate limit exceeded. Please try again later.")
+
+            # Other errors - fail immediately
+            else:
+                raise Exception(f"Gemini API error: {error_msg}")
+
+    raise Exception(f"Failed to get embeddings for batch {batch_no} after {max_retries} attempts")
+
+def embed_texts_gemini(api_key: str, texts: list, model: str = "models/embedding-001",
+                       batch_size: int = None, concurrency: int = None):
+    """
+    Create embeddings using Google Gemini batch requests. Texts are split into batches of
+    `batch_size` with at most `concurrency` batches in flight; output order matches input order.
+    """
     if not texts:
         return []
     if not api_key:
         raise Exception("Gemini API key not provided for embeddings")
     
+    batch_size = max(1, min(batch_size or GEMINI_EMBED_BATCH_SIZE, 100))  # API accepts up to 100 per call
+    concurrency = max(1, concurrency or GEMINI_EMBED_CONCURRENCY)
+
     try:
-        genai.configure(api_key=api_key)
-        embeddings = []
-        
-        for i, text in enumerate(texts):
-            max_retries = 2  # Reduced retries to fail faster
-            retry_delay = 2  # Increased delay between retries
-            
-            for attempt in range(max_retries):
-                try:
-                    import time
-                    start_time = time.time()
-                    
-                    # Set a shorter timeout for individual requests
-                    result = genai.embed_content(
-                        model=model,
-                        content=text,
-                        task_type="retrieval_document"
-                    )
-                    
-                    # Check if we got a valid response
-                    if result and 'embedding' in result:
-                        embeddings.append(result['embedding'])
-                        break
-                    else:
-                        raise Exception("Invalid response from Gemini API")
-                        
-                except Exception as e:
-                    error_msg = str(e)
-                    
-                    # Check for timeout errors
-                    if "DeadlineExceeded" in error_msg or "504" in error_msg or "timeout" in error_msg.lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Gemini API timeout for text {i+1}, retry {attempt + 1}/{max_retries}")
-                            time.sleep(retry_delay)
-                            continue
-                        else:
-                            raise Exception("Gemini API timeout. The service is currently slow or unavailable. Please try again in a few minutes.")
-                    
-                    # Check for rate limiting
-                    elif "429" in error_msg or "quota" in error_msg.lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Gemini API rate limited for text {i+1}, retry {attempt + 1}/{max_retries}")
-                            time.sleep(retry_delay * 2)
-                            continue
-                        else:
-                            raise Exception("Gemini API rate limit exceeded. Please try again later.")
-                    
-                    # Other errors - fail immediately
-                    else:
-                        raise Exception(f"Gemini API error: {error_msg}")
-            
-            # If we get here without breaking, it means all retries failed
-            if len(embeddings) == i:
-                raise Exception(f"Failed to get embedding for text {i+1} after {max_retries} attempts")
-        
-        return embeddings
+        with lease_gemini_client(api_key) as gemini_client:
+            batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+            if len(batches) == 1:
+                return _embed_gemini_batch(gemini_client, model, batches[0], 1)
+
+            # Sliding window of `concurrency` batches on the shared fan-out pool; results are
+            # collected in submission order regardless of completion order
+            pool = executors["provider_fanout"]
+            in_flight = deque()
+            embeddings = []
+            try:
+                for batch_no, batch in enumerate(batches, start=1):
+                    if len(in_flight) >= concurrency:
+                        embeddings.extend(in_flight.popleft().result())
+                    in_flight.append(pool.submit(_embed_gemini_batch, gemini_client, model, batch, batch_no))
+                while in_flight:
+                    embeddings.extend(in_flight.popleft().result())
+            finally:
+                for future in in_flight:
+                    future.cancel()
+                # Batches already running still use the leased client; let them finish first
+                wait(in_flight)
+            return embeddings
         
     except Exception as e:
         logger.exception("Gemini embedding error")
         raise
 
+def _embed_uncached(api_key: str, texts: list, provider: str, model: str):
+    if provider == "gemini":
+        return embed_texts_gemini(api_key, texts, model)
+    elif provider == "openai":
+        return embed_texts_with_key(api_key, texts, model)
+    else:
+        raise Exception(f"Unsupported embedding provider: {provider}")
+
 def embed_texts_with_provider(api_key: str, texts: list, provider: str = "openai", model: str = None):
-    """Create embeddings with a specific provider and API key"""
+    """Create embeddings with a specific provider and API key, reusing cached vectors where possible"""
     if not texts:
         return []
     if not api_key:
         raise Exception("API key not provided for embeddings")
     
-    if provider.lower() == "gemini":
+    provider = provider.lower()
+    if provider == "gemini":
         embedding_model = model or "models/embedding-001"
-        return embed_texts_gemini(api_key, texts, embedding_model)
-    elif provider.lower() == "openai":
+    elif provider == "openai":
         embedding_model = model or "text-embedding-3-large"
-        return embed_texts_with_key(api_key, texts, embedding_model)
     else:
         raise Exception(f"Unsupported embedding provider: {provider}")
+
+    if not EMBEDDING_CACHE_ENABLED:
+        return _embed_uncached(api_key, texts, provider, embedding_model)
+
+    cached = embedding_cache.get_many(provider, embedding_model, texts)
+    # Send each distinct missing text once, as a single batch
+    missing = list(dict.fromkeys(t for t, vec in zip(texts, cached) if vec is None))
+    embedding_cache.record_call(len(texts), len(missing))
+    if missing:
+        fresh = _embed_uncached(api_key, missing, provider, embedding_model)
+        if len(fresh) != len(missing):
+            raise Exception(f"Embedding provider returned {len(fresh)} vectors for {len(missing)} texts")
+        embedding_cache.put_many(provider, embedding_model, missing, fresh)
+        by_text = dict(zip(missing, fresh))
+        cached = [vec if vec is not None else by_text[t] for t, vec in zip(texts, cached)]
+    return cached
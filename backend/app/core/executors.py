@@ -0,0 +1,256 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from loguru import logger
+
+_CPUS = os.cpu_count() or 2
+
+# Workload classes. pdf: CPU-bound PDF text extraction in worker processes (0 runs it in-thread);
+# provider: blocking LLM / embedding / search API calls made from the event loop;
+# provider_fanout: parallel sub-requests issued from inside a worker thread (never waits on another pool task);
+# vector: Chroma queries and writes; ingest: background ingestion jobs.
+EXEC_PDF_WORKERS = int(os.getenv("EXEC_PDF_WORKERS", str(min(4, _CPUS))))
+EXEC_PDF_START_METHOD = os.getenv("EXEC_PDF_START_METHOD", "spawn")
+EXEC_PROVIDER_WORKERS = int(os.getenv("EXEC_PROVIDER_WORKERS", "32"))
+EXEC_PROVIDER_FANOUT_WORKERS = int(os.getenv("EXEC_PROVIDER_FANOUT_WORKERS", "16"))
+EXEC_VECTOR_WORKERS = int(os.getenv("EXEC_VECTOR_WORKERS", "8"))
+EXEC_INGEST_WORKERS = int(os.getenv("EXEC_INGEST_WORKERS", os.getenv("INGEST_WORKERS", "2")))
+# Tasks allowed to wait per worker before submitters block
+EXEC_QUEUE_FACTOR = int(os.getenv("EXEC_QUEUE_FACTOR", "8"))
+
+def _timed(func: Callable, args: tuple, kwargs: dict):
+    """Runs in the worker (thread or process); wall-clock times are comparable across processes"""
+    started = time.time()
+    return started, func(*args, **kwargs)
+
+class WorkloadPool:
+    """
+    A named, bounded executor for one class of blocking work. Submitters block (or await)
+    once max_workers * queue_factor tasks are outstanding, so one workload cannot pile up
+    unbounded work, and separate pools keep it from taking the workers of another.
+    """
+
+    def __init__(self, name: str, kind: str, max_workers: int, queue_factor: int = EXEC_QUEUE_FACTOR,
+                 start_method: str = EXEC_PDF_START_METHOD):
+        self.name = name
+        self.kind = kind  # "thread" or "process"
+        self.max_workers = max_workers
+        self.max_outstanding = max(1, max_workers * queue_factor)
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_outstanding)
+        # Coroutines waiting in run() for a slot, oldest first; a freed slot is handed to them directly
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self.outstanding = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.created_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            mp_context=multiprocessing.get_context(self.start_method),
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+                    self.created_at = time.monotonic()
+        return self._executor
+
+    def start(self):
+        if self.enabled:
+            self._get_executor()
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Blocking submit for callers on worker threads; returns a future of func's result"""
+        if not self.enabled:
+            raise RuntimeError(f"Executor pool '{self.name}' is disabled")
+        self._slots.acquire()
+        return self._submit(func, args, kwargs)
+
+    def _submit(self, func: Callable, args: tuple, kwargs: dict) -> Future:
+        """Submit with a slot already held; the slot is released when the task finishes"""
+        queued_at = time.time()
+        with self._lock:
+            self.outstanding += 1
+            self.submitted += 1
+        try:
+            executor = self._get_executor()
+            try:
+                inner = executor.submit(_timed, func, args, kwargs)
+            except BrokenProcessPool:
+                self._discard_broken(executor)
+                executor = self._get_executor()
+                inner = executor.submit(_timed, func, args, kwargs)
+        except Exception:
+            self._release(None, queued_at)
+            raise
+        outer: Future = Future()
+
+        def done(f: Future):
+            if f.cancelled():
+                self._release(None, queued_at, failed=True)
+                outer.cancel()
+                return
+            try:
+                started, result = f.result()
+            except BaseException as e:
+                if isinstance(e, BrokenProcessPool):
+                    self._discard_broken(executor)
+                self._release(None, queued_at, failed=True)
+                if not outer.done():
+                    outer.set_exception(e)
+                return
+            self._release(started, queued_at)
+            if not outer.done():
+                outer.set_result(result)
+
+        # Cancelling the returned future drops the task if no worker has picked it up yet
+        outer.add_done_callback(lambda f: inner.cancel() if f.cancelled() else None)
+        inner.add_done_callback(done)
+        return outer
+
+    def _discard_broken(self, executor: Executor):
+        """A worker process died (killed, OOM); the next submit starts a fresh pool"""
+        with self._lock:
+            # Other tasks of the same broken pool fail too; replace it only once
+            if self._executor is not executor:
+                return
+            self._executor = None
+            self.restarts += 1
+        logger.warning(f"Executor pool '{self.name}' broke, starting a new one")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, started: Optional[float], queued_at: float, failed: bool = False):
+        now = time.time()
+        with self._lock:
+            self.outstanding -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            if started is not None:
+                self.wait_seconds += max(0.0, started - queued_at)
+                self.busy_seconds += max(0.0, now - started)
+        self._release_slot()
+
+    def _release_slot(self):
+        """Hand a freed slot to the longest-waiting coroutine, or back to the semaphore"""
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, waiter)
+                    return
+                except RuntimeError:
+                    # That waiter's loop is closed; try the next one
+                    continue
+            self._slots.release()
+
+    def _grant(self, waiter: asyncio.Future):
+        """Runs on the waiter's loop; the slot moves on if the waiter has given up meanwhile"""
+        if waiter.done():
+            self._release_slot()
+        else:
+            waiter.set_result(None)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Await func(*args, **kwargs) on this pool without blocking the event loop"""
+        if not self.enabled:
+            raise RuntimeError(f"Executor pool '{self.name}' is disabled")
+        waiter = None
+        # Checked under the lock _release_slot() holds, so a slot freed meanwhile can't be missed
+        with self._lock:
+            if not self._slots.acquire(blocking=False):
+                # Pool saturated: wait on the loop for a released slot, holding no thread
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append((asyncio.get_running_loop(), waiter))
+        if waiter is not None:
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was granted just as we were cancelled; pass it on
+                    self._release_slot()
+                raise
+        return await asyncio.wrap_future(self._submit(func, args, kwargs))
+
+    def shutdown(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        uptime = max(time.monotonic() - self.created_at, 1e-9)
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "outstanding": self.outstanding,
+                "queued": max(0, self.outstanding - self.max_workers),
+                "max_outstanding": self.max_outstanding,
+                "waiting": sum(1 for _, w in self._waiters if not w.done()),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "utilization": round(self.busy_seconds / (uptime * self.max_workers), 4) if self.max_workers else 0.0,
+                "avg_wait_ms": round(self.wait_seconds / finished * 1000, 2) if finished else 0.0,
+            }
+
+class ExecutorRegistry:
+    """The process-wide set of workload pools, configured once and shared by all call sites"""
+
+    def __init__(self):
+        self.pools: Dict[str, WorkloadPool] = {
+            "pdf": WorkloadPool("pdf", "process", EXEC_PDF_WORKERS),
+            "provider": WorkloadPool("provider", "thread", EXEC_PROVIDER_WORKERS),
+            "provider_fanout": WorkloadPool("provider_fanout", "thread", EXEC_PROVIDER_FANOUT_WORKERS),
+            "vector": WorkloadPool("vector", "thread", EXEC_VECTOR_WORKERS),
+            "ingest": WorkloadPool("ingest", "thread", EXEC_INGEST_WORKERS),
+        }
+
+    def __getitem__(self, name: str) -> WorkloadPool:
+        return self.pools[name]
+
+    def start(self):
+        for pool in self.pools.values():
+            try:
+                pool.start()
+            except Exception as e:
+                logger.warning(f"Executor pool '{pool.name}' could not start: {e}")
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+
+    async def run(self, name: str, func: Callable, *args, **kwargs) -> Any:
+        return await self.pools[name].run(func, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+executors = ExecutorRegistry()
+
+def run_blocking(name: str, func: Callable, *args, **kwargs):
+    """Shorthand for `await executors.run(name, func, ...)`"""
+    return executors.run(name, func, *args, **kwargs)
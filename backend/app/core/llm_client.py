@@ -1,82 +1,42 @@
+import asyncio
+import json
 import os
-import requests
-from openai import OpenAI
+from contextlib import aclosing
+from typing import TYPE_CHECKING
 from loguru import logger
+from .client_pool import (
+    lease_async_http_client, lease_async_openai_client, lease_gemini_async_client,
+    lease_gemini_client, lease_http_client, lease_openai_client,
+)
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+GROK_API_URL = "https://api.x.ai/v1/chat/completions"
+GROK_MODEL = "grok-beta"
+GEMINI_MODEL = "gemini-1.5-flash"
+# Longest gap allowed between two streamed chunks before the stream is abandoned
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT", "30"))
 
 def ask_openai_system(system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
-    if not client:
+    if not OPENAI_API_KEY:
         raise Exception("OpenAI client not initialized. Please set OPENAI_API_KEY environment variable.")
-    try:
-        messages = []
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": user_prompt})
-        resp = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=messages,
-            temperature=float(temperature),
-            max_tokens=max_tokens
-        )
-        return resp.choices[0].message.content
-    except Exception as e:
-        logger.exception("OpenAI non-streaming error")
-        raise
+    # The SDK client for the server's own key is built on first use
+    with lease_openai_client(OPENAI_API_KEY) as client:
+        return ask_openai_system_with_client(client, system_prompt, user_prompt, temperature, max_tokens)
 
 def stream_chat_openai(system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
-    if not client:
+    if not OPENAI_API_KEY:
         yield {"type":"error", "error": "OpenAI client not initialized. Please set OPENAI_API_KEY environment variable."}
         return
-    messages = []
-    if system_prompt:
-        messages.append({"role": "system", "content": system_prompt})
-    messages.append({"role": "user", "content": user_prompt})
-    try:
-        resp = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=messages,
-            temperature=float(temperature),
-            max_tokens=max_tokens,
-            stream=True
-        )
-        final_text = ""
-        chunk_count = 0
-        max_chunks = 1000  # Safety limit to prevent infinite loops
-        import time
-        start_time = time.time()
-        max_duration = 30  # 30 second timeout
-        
-        for chunk in resp:
-            # Safety checks to prevent infinite loops
-            chunk_count += 1
-            if chunk_count > max_chunks:
-                logger.warning("OpenAI streaming: Too many chunks, breaking")
-                break
-                
-            if time.time() - start_time > max_duration:
-                logger.warning("OpenAI streaming: Timeout reached, breaking")
-                break
-                
-            try:
-                if chunk.choices and len(chunk.choices) > 0:
-                    choice = chunk.choices[0]
-                    if choice.delta and choice.delta.content:
-                        token = choice.delta.content
-                        final_text += token
-                        yield {"type":"token", "delta": token}
-                    if choice.finish_reason:
-                        yield {"type":"done", "text": final_text}
-                        return
-            except Exception:
-                continue
-        yield {"type":"done", "text": final_text}
-    except Exception as e:
-        logger.exception("OpenAI streaming error")
-        yield {"type":"error", "error": str(e)}
-        return
+    yield from stream_chat_openai_with_key(OPENAI_API_KEY, system_prompt, user_prompt, temperature, max_tokens)
+
+def stream_chat_openai_with_key(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
+    """Stream with the pooled client for api_key, holding its lease until the stream ends"""
+    with lease_openai_client(api_key) as client:
+        yield from stream_chat_openai_with_client(client, system_prompt, user_prompt, temperature, max_tokens)
 
 def ask_llm(provider: str, streaming: bool = False, **kwargs):
     if provider == "openai":
@@ -90,11 +50,11 @@ def ask_llm(provider: str, streaming: bool = False, **kwargs):
 def ask_llm_with_key(api_key: str, provider: str, streaming: bool = False, **kwargs):
     """Ask LLM with a specific API key"""
     if provider == "openai":
-        temp_client = OpenAI(api_key=api_key)
         if streaming:
-            return stream_chat_openai_with_client(temp_client, kwargs.get("system"), kwargs.get("prompt"), kwargs.get("temperature", 0.2), kwargs.get("max_tokens", 800))
+            return stream_chat_openai_with_key(api_key, kwargs.get("system"), kwargs.get("prompt"), kwargs.get("temperature", 0.2), kwargs.get("max_tokens", 800))
         else:
-            return ask_openai_system_with_client(temp_client, kwargs.get("system"), kwargs.get("prompt"), kwargs.get("temperature", 0.2), kwargs.get("max_tokens", 800))
+            with lease_openai_client(api_key) as pooled_client:
+                return ask_openai_system_with_client(pooled_client, kwargs.get("system"), kwargs.get("prompt"), kwargs.get("temperature", 0.2), kwargs.get("max_tokens", 800))
     elif provider == "grok":
         if streaming:
             return stream_chat_grok(api_key, kwargs.get("system"), kwargs.get("prompt"), kwargs.get("temperature", 0.2), kwargs.get("max_tokens", 800))
@@ -108,7 +68,7 @@ def ask_llm_with_key(api_key: str, provider: str, streaming: bool = False, **kwa
     else:
         raise NotImplementedError(f"Provider {provider} not implemented (streaming adapter missing).")
 
-def ask_openai_system_with_client(client: OpenAI, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
+def ask_openai_system_with_client(client: "OpenAI", system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
     try:
         messages = []
         if system_prompt:
@@ -125,7 +85,7 @@ def ask_openai_system_with_client(client: OpenAI, system_prompt: str, user_promp
         logger.exception("OpenAI non-streaming error")
         raise
 
-def stream_chat_openai_with_client(client: OpenAI, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
+def stream_chat_openai_with_client(client: "OpenAI", system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
     messages = []
     if system_prompt:
         messages.append({"role": "system", "content": system_prompt})
@@ -177,7 +137,6 @@ def stream_chat_openai_with_client(client: OpenAI, system_prompt: str, user_prom
 def ask_grok_system(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
     """Ask Grok API for non-streaming response"""
     try:
-        url = "https://api.x.ai/v1/chat/completions"
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
@@ -189,13 +148,14 @@ def ask_grok_system(api_key: str, system_prompt: str, user_prompt: str, temperat
         messages.append({"role": "user", "content": user_prompt})
         
         data = {
-            "model": "grok-beta",
+            "model": GROK_MODEL,
             "messages": messages,
             "temperature": float(temperature),
             "max_tokens": max_tokens
         }
         
-        response = requests.post(url, headers=headers, json=data)
+        with lease_http_client("grok", api_key) as http:
+            response = http.post(GROK_API_URL, headers=headers, json=data)
         
         if response.status_code == 403:
             raise Exception("Grok API access denied. Please check your API key and ensure you have access to Grok API.")
@@ -214,7 +174,6 @@ def ask_grok_system(api_key: str, system_prompt: str, user_prompt: str, temperat
 def stream_chat_grok(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
     """Stream chat with Grok API"""
     try:
-        url = "https://api.x.ai/v1/chat/completions"
         headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
@@ -226,52 +185,48 @@ def stream_chat_grok(api_key: str, system_prompt: str, user_prompt: str, tempera
         messages.append({"role": "user", "content": user_prompt})
         
         data = {
-            "model": "grok-beta",
+            "model": GROK_MODEL,
             "messages": messages,
             "temperature": float(temperature),
             "max_tokens": max_tokens,
             "stream": True
         }
         
-        response = requests.post(url, headers=headers, json=data, stream=True)
-        
-        if response.status_code == 403:
-            yield {"type":"error", "error": "Grok API access denied. Please check your API key and ensure you have access to Grok API."}
-            return
-        elif response.status_code == 401:
-            yield {"type":"error", "error": "Invalid Grok API key. Please check your API key."}
-            return
-        
-        response.raise_for_status()
-        
-        final_text = ""
-        line_count = 0
-        max_lines = 1000  # Safety limit to prevent infinite loops
-        import time
-        start_time = time.time()
-        max_duration = 30  # 30 second timeout
-        
-        for line in response.iter_lines():
-            # Safety checks to prevent infinite loops
-            line_count += 1
-            if line_count > max_lines:
-                logger.warning("Grok streaming: Too many lines, breaking")
-                break
-                
-            if time.time() - start_time > max_duration:
-                logger.warning("Grok streaming: Timeout reached, breaking")
-                break
-                
-            if line:
-                line = line.decode('utf-8')
+        with lease_http_client("grok", api_key) as http, http.stream("POST", GROK_API_URL, headers=headers, json=data) as response:
+            if response.status_code == 403:
+                yield {"type":"error", "error": "Grok API access denied. Please check your API key and ensure you have access to Grok API."}
+                return
+            elif response.status_code == 401:
+                yield {"type":"error", "error": "Invalid Grok API key. Please check your API key."}
+                return
+
+            response.raise_for_status()
+
+            final_text = ""
+            line_count = 0
+            max_lines = 1000  # Safety limit to prevent infinite loops
+            import time
+            start_time = time.time()
+            max_duration = 30  # 30 second timeout
+
+            for line in response.iter_lines():
+                # Safety checks to prevent infinite loops
+                line_count += 1
+                if line_count > max_lines:
+                    logger.warning("Grok streaming: Too many lines, breaking")
+                    break
+
+                if time.time() - start_time > max_duration:
+                    logger.warning("Grok streaming: Timeout reached, breaking")
+                    break
+
                 if line.startswith('data: '):
                     data_str = line[6:]  # Remove 'data: ' prefix
                     if data_str.strip() == '[DONE]':
                         yield {"type":"done", "text": final_text}
                         return
-                    
+
                     try:
-                        import json
                         chunk_data = json.loads(data_str)
                         if 'choices' in chunk_data and len(chunk_data['choices']) > 0:
                             choice = chunk_data['choices'][0]
@@ -281,7 +236,7 @@ def stream_chat_grok(api_key: str, system_prompt: str, user_prompt: str, tempera
                                 yield {"type":"token", "delta": token}
                     except json.JSONDecodeError:
                         continue
-        
+
         yield {"type":"done", "text": final_text}
         
     except Exception as e:
@@ -289,26 +244,37 @@ def stream_chat_grok(api_key: str, system_prompt: str, user_prompt: str, tempera
         yield {"type":"error", "error": str(e)}
         return
 
+def _gemini_request(system_prompt: str, user_prompt: str, temperature: float, max_tokens: int):
+    """
+    GenerateContentRequest for the pooled per-key service client. The request is sent
+    through the client's public methods, so nothing relies on GenerativeModel internals
+    or on the process-wide genai.configure() key.
+    """
+    import google.ai.generativelanguage as glm
+
+    # Combine system and user prompts
+    full_prompt = f"{system_prompt}\n\n{user_prompt}" if system_prompt else user_prompt
+    return glm.GenerateContentRequest(
+        model=f"models/{GEMINI_MODEL}",
+        contents=[glm.Content(role="user", parts=[glm.Part(text=full_prompt)])],
+        generation_config=glm.GenerationConfig(temperature=temperature, max_output_tokens=max_tokens),
+    )
+
+def _gemini_text(response) -> str:
+    """Text of the first candidate of a GenerateContentResponse or of one streamed chunk"""
+    if not response.candidates:
+        return ""
+    return "".join(part.text for part in response.candidates[0].content.parts)
+
 def ask_gemini_system(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
     """Ask Gemini API for non-streaming response"""
     try:
-        import google.generativeai as genai
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Combine system and user prompts
-        full_prompt = f"{system_prompt}\n\n{user_prompt}" if system_prompt else user_prompt
-        
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
-            )
-        )
-        
-        return response.text
+        request = _gemini_request(system_prompt, user_prompt, temperature, max_tokens)
+        with lease_gemini_client(api_key) as gemini_client:
+            response = gemini_client.generate_content(request)
+        if not response.candidates:
+            raise Exception(f"Gemini returned no candidates: {response.prompt_feedback}")
+        return _gemini_text(response)
         
     except Exception as e:
         logger.exception("Gemini non-streaming error")
@@ -317,48 +283,189 @@ def ask_gemini_system(api_key: str, system_prompt: str, user_prompt: str, temper
 def stream_chat_gemini(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 800):
     """Stream chat with Gemini API"""
     try:
-        import google.generativeai as genai
         import time
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Combine system and user prompts
-        full_prompt = f"{system_prompt}\n\n{user_prompt}" if system_prompt else user_prompt
-        
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
-            ),
-            stream=True
-        )
-        
-        final_text = ""
-        chunk_count = 0
-        max_chunks = 1000  # Safety limit to prevent infinite loops
-        start_time = time.time()
-        max_duration = 30  # 30 second timeout
-        
-        for chunk in response:
-            # Safety checks to prevent infinite loops
-            chunk_count += 1
-            if chunk_count > max_chunks:
-                logger.warning("Gemini streaming: Too many chunks, breaking")
-                break
-                
-            if time.time() - start_time > max_duration:
-                logger.warning("Gemini streaming: Timeout reached, breaking")
-                break
-                
-            if chunk.text:
-                final_text += chunk.text
-                yield {"type":"token", "delta": chunk.text}
-        
-        yield {"type":"done", "text": final_text}
+
+        request = _gemini_request(system_prompt, user_prompt, temperature, max_tokens)
+        with lease_gemini_client(api_key) as gemini_client:
+            response = gemini_client.stream_generate_content(request)
+
+            final_text = ""
+            chunk_count = 0
+            max_chunks = 1000  # Safety limit to prevent infinite loops
+            start_time = time.time()
+            max_duration = 30  # 30 second timeout
+
+            for chunk in response:
+                # Safety checks to prevent infinite loops
+                chunk_count += 1
+                if chunk_count > max_chunks:
+                    logger.warning("Gemini streaming: Too many chunks, breaking")
+                    break
+
+                if time.time() - start_time > max_duration:
+                    logger.warning("Gemini streaming: Timeout reached, breaking")
+                    break
+
+                text = _gemini_text(chunk)
+                if text:
+                    final_text += text
+                    yield {"type":"token", "delta": text}
+
+            yield {"type":"done", "text": final_text}
         
     except Exception as e:
         logger.exception("Gemini streaming error")
         yield {"type":"error", "error": str(e)}
-        return
\ No newline at end of file
+        return
+
+class StreamIdleTimeout(Exception):
+    pass
+
+async def _iter_with_idle_timeout(aiterable, idle_timeout: float):
+    """
+    Re-yield items from an async iterable, failing if no item arrives within idle_timeout
+    seconds. The provider stream is closed however iteration ends: exhausted, timed out,
+    failed, or abandoned by the consumer (use it under contextlib.aclosing).
+    """
+    iterator = aiterable.__aiter__()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(iterator.__anext__(), timeout=idle_timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise StreamIdleTimeout(f"No data received from provider for {idle_timeout:g}s")
+            yield item
+    finally:
+        # Close our iterator, then the stream object itself (the OpenAI SDK's holds the HTTP response)
+        for closable in (iterator, aiterable):
+            close = getattr(closable, "aclose", None) or getattr(closable, "close", None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.debug(f"Closing provider stream failed: {e}")
+
+def _build_messages(system_prompt: str, user_prompt: str):
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+async def astream_chat_openai(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2,
+                              max_tokens: int = 800, idle_timeout: float = LLM_STREAM_IDLE_TIMEOUT):
+    """Stream chat with OpenAI without blocking the event loop"""
+    try:
+        with lease_async_openai_client(api_key) as async_client:
+            resp = await async_client.chat.completions.create(
+                model=LLM_MODEL,
+                messages=_build_messages(system_prompt, user_prompt),
+                temperature=float(temperature),
+                max_tokens=max_tokens,
+                stream=True
+            )
+            final_text = ""
+            async with aclosing(_iter_with_idle_timeout(resp, idle_timeout)) as chunks:
+                async for chunk in chunks:
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    if choice.delta and choice.delta.content:
+                        token = choice.delta.content
+                        final_text += token
+                        yield {"type":"token", "delta": token}
+                    if choice.finish_reason:
+                        break
+            yield {"type":"done", "text": final_text}
+    except Exception as e:
+        logger.exception("OpenAI async streaming error")
+        yield {"type":"error", "error": str(e)}
+
+async def astream_chat_grok(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2,
+                            max_tokens: int = 800, idle_timeout: float = LLM_STREAM_IDLE_TIMEOUT):
+    """Stream chat with Grok over an async HTTP client"""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    data = {
+        "model": GROK_MODEL,
+        "messages": _build_messages(system_prompt, user_prompt),
+        "temperature": float(temperature),
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    try:
+        # Reads are bounded per chunk by _iter_with_idle_timeout
+        import httpx
+        timeout = httpx.Timeout(10.0, read=None)
+        with lease_async_http_client("grok", api_key) as http:
+            async with http.stream("POST", GROK_API_URL, headers=headers, json=data, timeout=timeout) as response:
+                if response.status_code == 403:
+                    yield {"type":"error", "error": "Grok API access denied. Please check your API key and ensure you have access to Grok API."}
+                    return
+                elif response.status_code == 401:
+                    yield {"type":"error", "error": "Invalid Grok API key. Please check your API key."}
+                    return
+                response.raise_for_status()
+
+                final_text = ""
+                async with aclosing(_iter_with_idle_timeout(response.aiter_lines(), idle_timeout)) as lines:
+                    async for line in lines:
+                        if not line.startswith("data: "):
+                            continue
+                        data_str = line[6:]
+                        if data_str.strip() == "[DONE]":
+                            break
+                        try:
+                            chunk_data = json.loads(data_str)
+                        except json.JSONDecodeError:
+                            continue
+                        choices = chunk_data.get("choices") or []
+                        if choices and "content" in (choices[0].get("delta") or {}):
+                            token = choices[0]["delta"]["content"] or ""
+                            final_text += token
+                            yield {"type":"token", "delta": token}
+                yield {"type":"done", "text": final_text}
+    except Exception as e:
+        logger.exception("Grok async streaming error")
+        yield {"type":"error", "error": str(e)}
+
+async def astream_chat_gemini(api_key: str, system_prompt: str, user_prompt: str, temperature: float = 0.2,
+                              max_tokens: int = 800, idle_timeout: float = LLM_STREAM_IDLE_TIMEOUT):
+    """Stream chat with Gemini using the pooled async service client"""
+    try:
+        request = _gemini_request(system_prompt, user_prompt, temperature, max_tokens)
+        with lease_gemini_async_client(api_key) as gemini_client:
+            response = await asyncio.wait_for(gemini_client.stream_generate_content(request), timeout=idle_timeout)
+
+            final_text = ""
+            async with aclosing(_iter_with_idle_timeout(response, idle_timeout)) as chunks:
+                async for chunk in chunks:
+                    text = _gemini_text(chunk)
+                    if text:
+                        final_text += text
+                        yield {"type":"token", "delta": text}
+            yield {"type":"done", "text": final_text}
+    except asyncio.TimeoutError:
+        yield {"type":"error", "error": f"No data received from provider for {idle_timeout:g}s"}
+    except Exception as e:
+        logger.exception("Gemini async streaming error")
+        yield {"type":"error", "error": str(e)}
+
+def astream_llm_with_key(api_key: str, provider: str, **kwargs):
+    """Async counterpart of ask_llm_with_key(streaming=True); returns an async generator of events"""
+    args = (api_key, kwargs.get("system"), kwargs.get("prompt"), kwargs.get("temperature", 0.2), kwargs.get("max_tokens", 800))
+    if provider == "openai":
+        return astream_chat_openai(*args)
+    elif provider == "grok":
+        return astream_chat_grok(*args)
+    elif provider == "gemini":
+        return astream_chat_gemini(*args)
+    else:
+        raise NotImplementedError(f"Provider {provider} not implemented (streaming adapter missing).")
@@ -0,0 +1,54 @@
+import builtins
+import os
+import sys
+import time
+from typing import Any, Dict, List
+from loguru import logger
+
+# Time every first-time import during startup (adds a little overhead of its own)
+STARTUP_IMPORT_PROFILE = os.getenv("STARTUP_IMPORT_PROFILE", "false").lower() in ("1", "true", "yes")
+# SDKs that should stay unloaded until first use
+HEAVY_MODULES = ("chromadb", "openai", "google.generativeai", "fitz", "httpx")
+
+_started = time.perf_counter()
+_marks: List[Dict[str, Any]] = []
+_import_times: Dict[str, float] = {}
+_original_import = builtins.__import__
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    t0 = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        # Inclusive of nested imports, like the cumulative column of -X importtime
+        _import_times.setdefault(name, time.perf_counter() - t0)
+
+def begin():
+    """Call first thing in app.main; starts the import timer when STARTUP_IMPORT_PROFILE is set"""
+    if STARTUP_IMPORT_PROFILE and builtins.__import__ is _original_import:
+        builtins.__import__ = _timed_import
+
+def mark(stage: str):
+    """Record seconds since process start-up reached this stage"""
+    _marks.append({"stage": stage, "seconds": round(time.perf_counter() - _started, 4)})
+    if stage == "app_imported" and builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+def report(top: int = 15) -> Dict[str, Any]:
+    slowest = sorted(_import_times.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "marks": list(_marks),
+        "heavy_modules_loaded": {name: name in sys.modules for name in HEAVY_MODULES},
+        "slowest_imports": [{"module": m, "seconds": round(t, 4)} for m, t in slowest],
+        "import_profile": STARTUP_IMPORT_PROFILE,
+    }
+
+def log_report():
+    data = report(top=5)
+    marks = ", ".join(f"{m['stage']}={m['seconds']}s" for m in data["marks"])
+    loaded = [name for name, is_loaded in data["heavy_modules_loaded"].items() if is_loaded]
+    logger.info(f"Startup profile: {marks}; heavy modules loaded: {loaded or 'none'}")
+    for item in data["slowest_imports"]:
+        logger.info(f"  import {item['module']}: {item['seconds']}s")
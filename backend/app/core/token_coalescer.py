@@ -0,0 +1,85 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+# Token deltas are buffered per node and sent as one frame per window or once the buffer
+# reaches the byte threshold. A window of 0 sends every token in its own frame.
+WS_TOKEN_FLUSH_MS = float(os.getenv("WS_TOKEN_FLUSH_MS", "30"))
+WS_TOKEN_FLUSH_BYTES = int(os.getenv("WS_TOKEN_FLUSH_BYTES", "512"))
+
+SendFunc = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+class TokenCoalescer:
+    """
+    Batches `token` frames for one node. The first token is always sent at once so
+    time-to-first-token is unchanged; later tokens wait at most one flush window.
+    """
+    totals = {"tokens": 0, "frames": 0}
+
+    def __init__(self, send: SendFunc, session_id: str, node_id: str,
+                 window_ms: float = WS_TOKEN_FLUSH_MS, max_bytes: int = WS_TOKEN_FLUSH_BYTES):
+        self.send = send
+        self.session_id = session_id
+        self.node_id = node_id
+        self.window = window_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.buffer = []
+        self.buffered_bytes = 0
+        self.first_sent = False
+        self.tokens = 0
+        self.frames = 0
+        self._timer: Optional[asyncio.Task] = None
+
+    async def push(self, token: str):
+        self.tokens += 1
+        TokenCoalescer.totals["tokens"] += 1
+        if not self.first_sent or self.window <= 0:
+            self.first_sent = True
+            await self._emit(token)
+            return
+        self.buffer.append(token)
+        self.buffered_bytes += len(token.encode("utf-8"))
+        if self.buffered_bytes >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def flush(self):
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+        if not self.buffer:
+            return
+        text = "".join(self.buffer)
+        self.buffer = []
+        self.buffered_bytes = 0
+        await self._emit(text)
+
+    async def aclose(self):
+        await self.flush()
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.window)
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Token flush failed")
+
+    async def _emit(self, text: str):
+        self.frames += 1
+        TokenCoalescer.totals["frames"] += 1
+        await self.send(self.session_id, {"type":"token", "node_id": self.node_id, "token": text})
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        tokens, frames = cls.totals["tokens"], cls.totals["frames"]
+        return {
+            "window_ms": WS_TOKEN_FLUSH_MS,
+            "max_bytes": WS_TOKEN_FLUSH_BYTES,
+            "tokens": tokens,
+            "frames": frames,
+            "tokens_per_frame": round(tokens / frames, 2) if frames else 0.0,
+        }
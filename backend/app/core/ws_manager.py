@@ -1,28 +1,609 @@
-from typing import Dict, List
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Union
 from fastapi import WebSocket
 from loguru import logger
+from .backplane import Backplane, create_backplane
+
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# Steps tried in order when a connection's queue is full: drop_logs, coalesce, disconnect
+WS_SLOW_CONSUMER_POLICY = [p.strip() for p in os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_logs,coalesce,disconnect").split(",") if p.strip()]
+
+# Messages that must reach the client even if the queue is over its bound
+CRITICAL_TYPES = {"done", "error"}
+
+# Log events carry one of these levels; a socket receives events at or above its level
+LOG_LEVELS = {"trace": 5, "debug": 10, "info": 20, "error": 40}
+WS_DEFAULT_LOG_LEVEL = os.getenv("WS_DEFAULT_LOG_LEVEL", "info")
+
+LogMessage = Union[str, Callable[[], str]]
+
+# Per-session replay buffer so a reconnecting client can resume from its last seq
+WS_REPLAY_MAX_EVENTS = int(os.getenv("WS_REPLAY_MAX_EVENTS", "1000"))
+WS_REPLAY_MAX_BYTES = int(os.getenv("WS_REPLAY_MAX_BYTES", str(1024 * 1024)))
+
+# Session registry: sessions without sockets are evicted after WS_SESSION_TTL seconds of inactivity
+WS_SESSION_TTL = float(os.getenv("WS_SESSION_TTL", "300"))
+WS_SESSION_SWEEP_INTERVAL = float(os.getenv("WS_SESSION_SWEEP_INTERVAL", "60"))
+WS_MAX_SESSIONS = int(os.getenv("WS_MAX_SESSIONS", "10000"))
+# idle_lru evicts the least recently active session without sockets; lru may also close live ones
+WS_SESSION_EVICTION = os.getenv("WS_SESSION_EVICTION", "idle_lru")
+
+# Rough fixed cost of a session / socket entry, for the memory estimate
+_SESSION_OVERHEAD = 1024
+_CONNECTION_OVERHEAD = 4096
+
+def session_ref(session_id: str) -> str:
+    """Stable, non-reversible label for a session in reports; the id itself grants access to its events"""
+    return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:12]
+
+class _Frame(dict):
+    """
+    An event together with its JSON text, serialized once and shared by the replay
+    buffer (for its byte count) and every socket it is written to. Never mutated.
+    """
+
+    __slots__ = ("text",)
+
+    def __init__(self, event: Dict[str, Any]):
+        super().__init__(event)
+        self.text = json.dumps(event, default=str)
+
+def _text(message: Dict[str, Any]) -> str:
+    return message.text if isinstance(message, _Frame) else json.dumps(message, default=str)
+
+class _ReplayBuffer:
+    """Bounded ring of recent session events, each tagged with a monotonically increasing seq"""
+
+    def __init__(self, max_events: int, max_bytes: int):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.events: Deque[tuple] = deque()  # (seq, payload, size)
+        self.bytes = 0
+        self.seq = 0
+
+    def append(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self.seq += 1
+        return self._store({**payload, "seq": self.seq})
+
+    def append_remote(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Store an event sequenced by another worker, keeping its seq"""
+        self.seq = max(self.seq, event["seq"])
+        return self._store(event)
+
+    def _store(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        seq = event["seq"]
+        event = event if isinstance(event, _Frame) else _Frame(event)
+        size = len(event.text)
+        self.events.append((seq, event, size))
+        self.bytes += size
+        while self.events and (len(self.events) > self.max_events or self.bytes > self.max_bytes):
+            _, _, old = self.events.popleft()
+            self.bytes -= old
+        return event
+
+    @property
+    def oldest(self) -> int:
+        return self.events[0][0] if self.events else self.seq + 1
+
+    def since(self, last_seq: int, until: Optional[int] = None) -> List[Dict[str, Any]]:
+        return [e for seq, e, _ in self.events if seq > last_seq and (until is None or seq <= until)]
+
+class _Session:
+    """Registry entry: the session's sockets, its replay buffer and activity timestamps"""
+
+    def __init__(self, session_id: str, max_events: int, max_bytes: int):
+        self.session_id = session_id
+        self.connections: List["_Connection"] = []
+        self.buffer = _ReplayBuffer(max_events, max_bytes)
+        self.created_at = time.time()
+        self.last_activity = time.monotonic()
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def approx_bytes(self) -> int:
+        queued = sum(len(_text(m)) for c in self.connections for m in c.queue)
+        return _SESSION_OVERHEAD + len(self.connections) * _CONNECTION_OVERHEAD + self.buffer.bytes + queued
+
+class _Connection:
+    """One socket with its own bounded outbound queue drained by a writer task"""
+
+    def __init__(self, session_id: str, websocket: Optional[WebSocket], manager: "ConnectionManager"):
+        self.session_id = session_id
+        self.websocket = websocket
+        self.manager = manager
+        self.queue: Deque[Dict[str, Any]] = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.max_depth = 0
+        self.level = LOG_LEVELS.get(WS_DEFAULT_LOG_LEVEL, LOG_LEVELS["info"])
+        # Last seq already buffered when this socket joined; live events after it reach it directly
+        self.joined_seq = 0
+        # A resume can only put replayed events first while no session event has gone out yet
+        self.live_started = False
+        self.resumed = False
+        self.writer = self._start_writer()
+
+    def _start_writer(self) -> Optional[asyncio.Task]:
+        return asyncio.get_running_loop().create_task(self._write_loop())
+
+    def offer(self, message: Dict[str, Any], max_size: int, policy: List[str]):
+        if self.closed:
+            return
+        mtype = message.get("type")
+        if len(self.queue) >= max_size:
+            for step in policy:
+                if step == "drop_logs":
+                    if mtype == "log":
+                        # The incoming log is the cheapest thing to lose
+                        self.manager.dropped += 1
+                        return
+                    self._drop_oldest_log()
+                elif step == "coalesce":
+                    self._coalesce_tokens()
+                elif step == "disconnect" and mtype not in CRITICAL_TYPES:
+                    logger.warning(f"WS slow consumer on session {self.session_id}, disconnecting")
+                    self.manager.slow_disconnects += 1
+                    self.close()
+                    return
+                if len(self.queue) < max_size:
+                    break
+            if len(self.queue) >= max_size and mtype not in CRITICAL_TYPES:
+                self.manager.dropped += 1
+                return
+        self.queue.append(message)
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.wakeup.set()
+
+    def enqueue_replay(self, events: List[Dict[str, Any]]):
+        """
+        Queue replayed events ahead of any live events still waiting, and beyond the
+        bound; the replay buffer already limits their number
+        """
+        if self.closed:
+            return
+        self.queue.extendleft(reversed(events))
+        self.max_depth = max(self.max_depth, len(self.queue))
+        self.wakeup.set()
+
+    def _drop_oldest_log(self):
+        for i, queued in enumerate(self.queue):
+            if queued.get("type") == "log":
+                del self.queue[i]
+                self.manager.dropped += 1
+                return
+
+    def _coalesce_tokens(self):
+        """Merge runs of queued token messages for the same node into single messages"""
+        merged: Deque[Dict[str, Any]] = deque()
+        for queued in self.queue:
+            last = merged[-1] if merged else None
+            if (queued.get("type") == "token" and last is not None and last.get("type") == "token"
+                    and last.get("node_id") == queued.get("node_id")):
+                # Keep the newer message's seq so a resuming client does not see the merged tokens twice
+                merged[-1] = {**queued, "token": last.get("token", "") + queued.get("token", "")}
+                self.manager.coalesced += 1
+            else:
+                merged.append(queued)
+        self.queue = merged
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                message = self.queue.popleft()
+                if message.get("seq") is not None:
+                    self.live_started = True
+                await asyncio.wait_for(self.websocket.send_text(_text(message)), timeout=WS_SEND_TIMEOUT)
+                self.manager.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"WS writer for session {self.session_id} stopped: {e}")
+            # Don't leave a stalled or broken socket open after we stop writing to it
+            self.closed = True
+            await self._close_socket()
+        finally:
+            self.closed = True
+            self.manager._forget(self)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.writer.cancel()
+        asyncio.get_running_loop().create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            # Bounded: a peer that stopped reading may not take the close frame either
+            await asyncio.wait_for(self.websocket.close(code=1013), timeout=WS_SEND_TIMEOUT)  # try again later
+        except Exception:
+            pass
+
+class _StreamListener(_Connection):
+    """
+    Receives session events like a socket does, but is drained by an in-process
+    consumer (the SSE execute endpoint) instead of a writer task
+    """
+
+    def _start_writer(self) -> Optional[asyncio.Task]:
+        return None
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Next queued event; None once closed and drained. Raises TimeoutError on timeout."""
+        while not self.queue:
+            if self.closed:
+                return None
+            self.wakeup.clear()
+            await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+        return self.queue.popleft()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        self.manager._forget(self)
 
 class ConnectionManager:
-    def __init__(self):
-        self.active: Dict[str, List[WebSocket]] = {}
+    """
+    Session registry and fan-out for WebSocket events. With a cross-process backplane,
+    every event is also published to the other workers, which record it in their replay
+    buffers and deliver it to whatever sockets of the session they hold. Sequence
+    numbers are assigned by the worker that sends the event.
+    """
+
+    def __init__(self, max_queue: int = WS_SEND_QUEUE_SIZE, policy: Optional[List[str]] = None,
+                 backplane: Optional[Backplane] = None):
+        # Least recently active first, so eviction walks from the front
+        self.sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.max_queue = max_queue
+        self.policy = policy if policy is not None else WS_SLOW_CONSUMER_POLICY
+        self.replay_max_events = WS_REPLAY_MAX_EVENTS
+        self.replay_max_bytes = WS_REPLAY_MAX_BYTES
+        self.session_ttl = WS_SESSION_TTL
+        self.sweep_interval = WS_SESSION_SWEEP_INTERVAL
+        self.max_sessions = WS_MAX_SESSIONS
+        self.eviction = WS_SESSION_EVICTION
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.slow_disconnects = 0
+        self.replayed = 0
+        self.replay_gaps = 0
+        self.expired = 0
+        self.evicted = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self.backplane = backplane if backplane is not None else create_backplane()
+        # Lowest log level other workers' sockets listen at: session_id -> origin -> level
+        self.remote_levels: Dict[str, Dict[str, int]] = {}
+        # When another worker last reported a socket joining or leaving the session
+        self.remote_seen: Dict[str, float] = {}
+
+    async def start(self):
+        """Join the backplane and start the periodic session sweeper on the running loop"""
+        await self.backplane.start(self._on_backplane)
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_loop())
+
+    async def shutdown(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        await self.backplane.close()
+
+    def _on_backplane(self, message: Dict[str, Any]):
+        op = message.get("op")
+        session_id = message.get("session_id")
+        if op == "event" and session_id and isinstance(message.get("event"), dict):
+            if session_id not in self.sessions:
+                # No socket of the session has been here: the worker holding it keeps the replay buffer
+                return
+            event = message["event"]
+            if "seq" in event:
+                # Unsequenced events (logs below the buffered level) are delivered but not kept
+                event = self._session(session_id).buffer.append_remote(event)
+            self._deliver(session_id, event)
+        elif op == "presence" and session_id:
+            self.remote_seen[session_id] = time.monotonic()
+            levels = self.remote_levels.setdefault(session_id, {})
+            if message.get("level") is None:
+                levels.pop(message.get("origin"), None)
+                if not levels:
+                    self.remote_levels.pop(session_id, None)
+            else:
+                levels[message.get("origin")] = message["level"]
+        elif op == "hello":
+            # Tell the new worker which sessions we hold sockets for
+            for sid, sess in self.sessions.items():
+                if sess.connections:
+                    self._announce(sid)
+
+    def _announce(self, session_id: str):
+        """Publish the lowest log level this worker's sockets of the session listen at"""
+        conns = self._connections(session_id)
+        level = min((c.level for c in conns), default=None)
+        self.backplane.publish({"op":"presence", "session_id": session_id, "level": level})
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info(f"WS sweeper expired {removed} idle sessions, {len(self.sessions)} left")
+            except Exception as e:
+                logger.warning(f"WS session sweep failed: {e}")
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop sessions that have had no socket and no activity for longer than the TTL"""
+        now = time.monotonic() if now is None else now
+        stale = [sid for sid, sess in self.sessions.items()
+                 if not sess.connections and now - sess.last_activity > self.session_ttl]
+        for sid in stale:
+            del self.sessions[sid]
+            self.remote_levels.pop(sid, None)
+        for sid in [sid for sid, seen in self.remote_seen.items()
+                    if sid not in self.remote_levels and now - seen > self.session_ttl]:
+            del self.remote_seen[sid]
+        self.expired += len(stale)
+        return len(stale)
+
+    def _session(self, session_id: str) -> _Session:
+        """Look up or register a session and mark it as most recently active"""
+        sess = self.sessions.get(session_id)
+        if sess is None:
+            sess = self.sessions[session_id] = _Session(session_id, self.replay_max_events, self.replay_max_bytes)
+            self._enforce_max_sessions()
+        else:
+            self.sessions.move_to_end(session_id)
+        sess.touch()
+        return sess
+
+    def _enforce_max_sessions(self):
+        """Evict least recently active sessions until the registry is within max_sessions"""
+        excess = len(self.sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        # The newest entry (the one just registered) is never a candidate
+        candidates = list(self.sessions.values())[:-1]
+        idle = [s for s in candidates if not s.connections]
+        victims = idle[:excess]
+        if self.eviction == "lru" and len(victims) < excess:
+            busy = [s for s in candidates if s.connections]
+            victims += busy[:excess - len(victims)]
+        for sess in victims:
+            for conn in list(sess.connections):
+                conn.close()
+            self.sessions.pop(sess.session_id, None)
+            self.evicted += 1
+        if len(self.sessions) > self.max_sessions:
+            logger.warning(f"WS session registry over its bound ({len(self.sessions)} > {self.max_sessions}); all sessions have live sockets")
 
-    async def connect(self, session_id: str, websocket: WebSocket):
+    def _connections(self, session_id: Optional[str]) -> List[_Connection]:
+        sess = self.sessions.get(session_id) if session_id else None
+        return sess.connections if sess else []
+
+    async def connect(self, session_id: str, websocket: WebSocket, level: Optional[str] = None,
+                      last_seq: Optional[int] = None):
         await websocket.accept()
-        self.active.setdefault(session_id, []).append(websocket)
+        conn = _Connection(session_id, websocket, self)
+        if level in LOG_LEVELS:
+            conn.level = LOG_LEVELS[level]
+        sess = self._session(session_id)
+        conn.joined_seq = sess.buffer.seq
+        sess.connections.append(conn)
+        self._announce(session_id)
         logger.info(f"WS connect {session_id}")
+        if last_seq is not None:
+            self.resume(session_id, websocket, last_seq)
+
+    def listen(self, session_id: str, level: Optional[str] = None) -> _StreamListener:
+        """Register an in-process consumer of the session's events; call unlisten when done"""
+        listener = _StreamListener(session_id, None, self)
+        if level in LOG_LEVELS:
+            listener.level = LOG_LEVELS[level]
+        sess = self._session(session_id)
+        listener.joined_seq = sess.buffer.seq
+        sess.connections.append(listener)
+        self._announce(session_id)
+        return listener
+
+    def unlisten(self, listener: _StreamListener):
+        listener.close()
+
+    def resume(self, session_id: str, websocket: WebSocket, last_seq: int) -> bool:
+        """
+        Replay buffered events with seq > last_seq to one socket, then send a "replayed"
+        marker. Events newer than the socket's join point already reach it live, so they
+        are not replayed twice; those still queued are held back until the replay is sent.
+        If the buffer no longer reaches back to last_seq a "replay_gap" event tells the
+        client what was lost. Only accepted once per socket and before any live event
+        has been written to it, since older events cannot follow newer ones.
+        """
+        conn = next((c for c in self._connections(session_id) if c.websocket is websocket), None)
+        if conn is None or conn.resumed or conn.live_started:
+            return False
+        conn.resumed = True
+        buffer = self._session(session_id).buffer
+        batch: List[Dict[str, Any]] = []
+        if last_seq + 1 < buffer.oldest and last_seq < buffer.seq:
+            self.replay_gaps += 1
+            batch.append({"type":"replay_gap", "last_seq": last_seq, "oldest_seq": buffer.oldest})
+        events = [e for e in buffer.since(last_seq, conn.joined_seq)
+                  if e.get("type") != "log" or LOG_LEVELS.get(e.get("level"), 0) >= conn.level]
+        batch.extend(events)
+        batch.append({"type":"replayed", "last_seq": conn.joined_seq, "count": len(events)})
+        self.replayed += len(events)
+        conn.enqueue_replay(batch)
+        return True
+
+    def set_level(self, session_id: str, websocket: WebSocket, level: str) -> bool:
+        """Change which log levels one socket receives"""
+        if level not in LOG_LEVELS:
+            return False
+        for conn in self._connections(session_id):
+            if conn.websocket is websocket:
+                conn.level = LOG_LEVELS[level]
+        self._announce(session_id)
+        return True
+
+    def wants(self, session_id: Optional[str], level: str) -> bool:
+        """True if any socket of the session, on this or another worker, listens at this level"""
+        threshold = LOG_LEVELS[level]
+        if any(conn.level <= threshold for conn in self._connections(session_id)):
+            return True
+        remote = self.remote_levels.get(session_id) if session_id else None
+        return bool(remote) and min(remote.values()) <= threshold
 
     async def disconnect(self, session_id: str, websocket: WebSocket):
-        conns = self.active.get(session_id, [])
-        if websocket in conns:
-            conns.remove(websocket)
+        for conn in list(self._connections(session_id)):
+            if conn.websocket is websocket:
+                conn.closed = True
+                conn.writer.cancel()
+                self._forget(conn)
+
+    def _forget(self, conn: _Connection):
+        sess = self.sessions.get(conn.session_id)
+        if sess is not None and conn in sess.connections:
+            sess.connections.remove(conn)
+            # The TTL counts from when the last socket went away
+            sess.touch()
+            self._announce(conn.session_id)
+
+    def _tracked(self, session_id: Optional[str]) -> bool:
+        """
+        Whether the session's events are sequenced and buffered: a socket or listener of it
+        is, or within the TTL was, attached to this or another worker. Events for sessions
+        nobody listens to are not kept.
+        """
+        return bool(session_id) and (session_id in self.sessions or session_id in self.remote_seen)
+
+    def _record(self, session_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Append an event to the session's replay buffer and return it with its seq"""
+        if not self._tracked(session_id):
+            return payload
+        return self._session(session_id).buffer.append(payload)
+
+    def _deliver(self, session_id: Optional[str], payload: Dict[str, Any]):
+        """Queue an event for this worker's sockets of the session, honouring log levels"""
+        conns = self._connections(session_id)
+        if not conns:
+            return
+        if not isinstance(payload, _Frame):
+            # Serialized once here rather than by each socket's writer
+            payload = _Frame(payload)
+        threshold = LOG_LEVELS.get(payload.get("level")) if payload.get("type") == "log" else None
+        for conn in list(conns):
+            if threshold is None or conn.level <= threshold:
+                conn.offer(payload, self.max_queue, self.policy)
 
     async def send(self, session_id: str, message):
-        conns = self.active.get(session_id, [])
-        for ws in conns:
-            try:
-                # ensure JSON-serializable
-                await ws.send_json(message if isinstance(message, dict) else {"type":"log","message": str(message)})
-            except Exception:
-                logger.exception("Failed WS send")
+        """Queue a message for every socket of the session; never waits on a slow client"""
+        # ensure JSON-serializable
+        payload = message if isinstance(message, dict) else {"type":"log","message": str(message)}
+        if session_id:
+            payload = self._record(session_id, payload)
+            self.backplane.publish({"op":"event", "session_id": session_id, "event": payload})
+        self._deliver(session_id, payload)
+
+    async def log(self, session_id: Optional[str], level: str, message: LogMessage, **fields):
+        """
+        Send a leveled log event. `message` may be a zero-argument callable; it is only
+        called when some socket of the session (or the replay buffer, which keeps the
+        default level and above) wants `level`, so expensive formatting costs nothing otherwise.
+        """
+        threshold = LOG_LEVELS[level]
+        # The replay buffer listens at the default level so a reconnecting client gets those logs
+        buffered = self._tracked(session_id) and threshold >= LOG_LEVELS.get(WS_DEFAULT_LOG_LEVEL, LOG_LEVELS["info"])
+        if not buffered and not self.wants(session_id, level):
+            return
+        text = message() if callable(message) else message
+        payload = {"type":"log", "level": level, "message": text, **fields}
+        if buffered:
+            payload = self._record(session_id, payload)
+        if session_id:
+            self.backplane.publish({"op":"event", "session_id": session_id, "event": payload})
+        self._deliver(session_id, payload)
+
+    async def reply(self, session_id: str, websocket: WebSocket, message: Dict[str, Any]):
+        """Queue a message for one socket only, keeping it ordered with broadcast messages"""
+        for conn in self._connections(session_id):
+            if conn.websocket is websocket:
+                conn.offer(message, self.max_queue, self.policy)
+
+    def sessions_report(self, limit: int = 100) -> Dict[str, Any]:
+        """Live sessions, most recently active first, with sockets and approximate memory held"""
+        now = time.monotonic()
+        entries = []
+        total_bytes = 0
+        for sess in reversed(self.sessions.values()):
+            size = sess.approx_bytes()
+            total_bytes += size
+            if len(entries) < limit:
+                entries.append({
+                    "session": session_ref(sess.session_id),
+                    "sockets": len(sess.connections),
+                    "queued": sum(len(c.queue) for c in sess.connections),
+                    "replay_events": len(sess.buffer.events),
+                    "last_seq": sess.buffer.seq,
+                    "idle_seconds": round(now - sess.last_activity, 1),
+                    "approx_bytes": size,
+                })
+        return {
+            "sessions": len(self.sessions),
+            "sockets": sum(len(s.connections) for s in self.sessions.values()),
+            "approx_bytes": total_bytes,
+            "max_sessions": self.max_sessions,
+            "ttl": self.session_ttl,
+            "eviction": self.eviction,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "items": entries,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        conns = [c for s in self.sessions.values() for c in s.connections]
+        depths = [len(c.queue) for c in conns]
+        buffers = [s.buffer for s in self.sessions.values()]
+        return {
+            "sessions": len(self.sessions),
+            "live_sessions": sum(1 for s in self.sessions.values() if s.connections),
+            "connections": len(conns),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_depth_peak": max((c.max_depth for c in conns), default=0),
+            "max_queue": self.max_queue,
+            "policy": self.policy,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "slow_disconnects": self.slow_disconnects,
+            "expired_sessions": self.expired,
+            "evicted_sessions": self.evicted,
+            "backplane": self.backplane.stats(),
+            "replay": {
+                "events": sum(len(b.events) for b in buffers),
+                "bytes": sum(b.bytes for b in buffers),
+                "max_events": self.replay_max_events,
+                "max_bytes": self.replay_max_bytes,
+                "replayed": self.replayed,
+                "gaps": self.replay_gaps,
+            },
+        }
 
 ws_manager = ConnectionManager()
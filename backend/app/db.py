@@ -1,40 +1,104 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.pool import StaticPool
+from typing import AsyncIterator
 from loguru import logger
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./genai.db")
 
+# Pool for the async engine used by the API routers; sized for concurrent execute traffic
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Seconds a SQLite connection waits on a locked database before failing
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "30"))
+
+def _async_url(url: str) -> str:
+    """Map a sync DATABASE_URL to the matching async driver"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+IS_MEMORY_SQLITE = IS_SQLITE and (":memory:" in DATABASE_URL or DATABASE_URL.rstrip("/") in ("sqlite:", "sqlite:/"))
+
 # Configure engine with connection pooling and error handling
 engine_kwargs = {
     "echo": False,  # Set to True for SQL debugging
     "pool_pre_ping": True,  # Verify connections before use
 }
 
-# For SQLite, use StaticPool to avoid connection issues
-if DATABASE_URL.startswith("sqlite"):
-    engine_kwargs.update({
-        "poolclass": StaticPool,
-        "connect_args": {"check_same_thread": False}
+# An in-memory SQLite database only exists on its one connection; a file database can be pooled
+if IS_SQLITE:
+    engine_kwargs["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT}
+    if IS_MEMORY_SQLITE:
+        engine_kwargs["poolclass"] = StaticPool
+
+async_engine_kwargs = {"echo": False, "pool_pre_ping": True}
+if IS_MEMORY_SQLITE:
+    async_engine_kwargs["poolclass"] = StaticPool
+else:
+    async_engine_kwargs.update({
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
     })
+if IS_SQLITE:
+    async_engine_kwargs["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT}
 
 try:
     engine = create_engine(DATABASE_URL, **engine_kwargs)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_kwargs)
     logger.info(f"Database engine created successfully: {DATABASE_URL}")
 except Exception as e:
     logger.error(f"Failed to create database engine: {e}")
     raise
 
+if IS_SQLITE and not IS_MEMORY_SQLITE:
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed while the ingest workers and chat logging write
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    event.listen(engine, "connect", _sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency: one AsyncSession per request, closed when the request ends"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def get_db_health():
     """Check database health"""
     try:
         with engine.connect() as conn:
-            conn.execute("SELECT 1")
+            conn.execute(text("SELECT 1"))
         return True
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
         return False
+
+def pool_stats():
+    """Checked-out / idle connection counts of both engines"""
+    def describe(pool):
+        return {
+            "class": type(pool).__name__,
+            "status": pool.status(),
+        }
+    return {"sync": describe(engine.pool), "async": describe(async_engine.pool)}
@@ -1,15 +1,52 @@
+from .core import startup_profile
+startup_profile.begin()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from .api import upload, workflow
+from .api import admin, metrics, upload, workflow
+from .api.upload import UploadSizeLimit
+from .core.executors import executors
 from .core.ws_manager import ws_manager
-from .db import Base, engine, get_db_health
-from .models import *
+from .db import async_engine, get_db_health
+from .migrate import DB_MIGRATE_ON_START, migrate_schema
+from .services.chat_log_writer import chat_log_writer
+from .services.ingest_jobs import TERMINAL_STATUSES, ingest_jobs
+from .services.warmup import WARMUP_ON_START, warm_up
 from loguru import logger
+import json
 import os
 import traceback
 
-app = FastAPI(title="GenAI Stack Backend", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if DB_MIGRATE_ON_START:
+        # Before any worker touches the database; a failed migration stops startup
+        migrate_schema()
+    executors.start()
+    ingest_jobs.start()
+    await ws_manager.start()
+    chat_log_writer.start()
+    startup_profile.mark("lifespan_started")
+    startup_profile.log_report()
+    # Runs once the server is serving, so cold-start requests are not held up by it
+    warmup_task = asyncio.create_task(warm_up()) if WARMUP_ON_START else None
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await chat_log_writer.shutdown()
+    await ws_manager.shutdown()
+    ingest_jobs.shutdown()
+    executors.shutdown()
+    await async_engine.dispose()
+
+app = FastAPI(title="GenAI Stack Backend", version="1.0.0", lifespan=lifespan)
+
+# Reject oversized uploads while they are being received, not after Starlette has buffered them;
+# added before CORS so its 413 responses still carry the CORS headers
+app.add_middleware(UploadSizeLimit, paths={"/api/upload"})
 
 # Add CORS middleware
 app.add_middleware(
@@ -45,26 +82,62 @@ async def health_check():
 async def favicon():
     return {"message": "No favicon available"}
 
-# Initialize database
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created successfully")
-except Exception as e:
-    logger.error(f"Failed to create database tables: {e}")
-    raise
-
 app.include_router(upload.router, prefix="/api")
 app.include_router(workflow.router, prefix="/api")
+app.include_router(metrics.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    await ws_manager.connect(session_id, websocket)
+    # A reconnecting client passes ?last_seq=N to get the events it missed
+    last_seq = websocket.query_params.get("last_seq")
+    await ws_manager.connect(
+        session_id, websocket,
+        level=websocket.query_params.get("level"),
+        last_seq=int(last_seq) if last_seq and last_seq.isdigit() else None,
+    )
     try:
         while True:
             data = await websocket.receive_text()
-            await websocket.send_json({"type":"ack", "message": "ok"})
+            try:
+                msg = json.loads(data)
+            except ValueError:
+                msg = None
+            if isinstance(msg, dict) and msg.get("type") == "subscribe_job" and msg.get("job_id"):
+                # Subscribe before reading the state so no status change is missed in between
+                job_id = str(msg["job_id"])
+                ingest_jobs.subscribe(job_id, session_id)
+                job = await ingest_jobs.get(job_id)
+                if not job or job["status"] in TERMINAL_STATUSES:
+                    ingest_jobs.unsubscribe(job_id, session_id)
+                if job:
+                    await ws_manager.reply(session_id, websocket, {"type":"ingest_job", **job})
+                else:
+                    await ws_manager.reply(session_id, websocket, {"type":"error", "message": f"Ingest job {job_id} not found"})
+                continue
+            if isinstance(msg, dict) and msg.get("type") == "resume":
+                try:
+                    last = int(msg.get("last_seq", 0))
+                except (TypeError, ValueError):
+                    await ws_manager.reply(session_id, websocket, {"type":"error", "message": "resume needs an integer last_seq"})
+                    continue
+                if not ws_manager.resume(session_id, websocket, last):
+                    # Live events already went out; replaying now would put older events after them
+                    await ws_manager.reply(session_id, websocket, {"type":"error", "message": "resume must come before any live event; reconnect with ?last_seq="})
+                continue
+            if isinstance(msg, dict) and msg.get("type") == "subscribe_logs":
+                # Choose which log levels this socket receives: trace, debug, info or error
+                level = str(msg.get("level", "info"))
+                if ws_manager.set_level(session_id, websocket, level):
+                    await ws_manager.reply(session_id, websocket, {"type":"ack", "message": f"log level {level}"})
+                else:
+                    await ws_manager.reply(session_id, websocket, {"type":"error", "message": f"Unknown log level {level}"})
+                continue
+            await ws_manager.reply(session_id, websocket, {"type":"ack", "message": "ok"})
     except WebSocketDisconnect:
         await ws_manager.disconnect(session_id, websocket)
     except Exception as e:
         logger.exception(f"WebSocket error for session {session_id}: {e}")
         await ws_manager.disconnect(session_id, websocket)
+
+startup_profile.mark("app_imported")
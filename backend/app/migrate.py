@@ -0,0 +1,77 @@
+import os
+from loguru import logger
+from sqlalchemy import Index, Table, and_, func, inspect, select, text
+from sqlalchemy.engine import Engine
+from .db import Base, engine
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+
+# Run migrate_schema in the app's lifespan; turn off when deploys run `python -m app.migrate` first
+DB_MIGRATE_ON_START = os.getenv("DB_MIGRATE_ON_START", "true").lower() == "true"
+
+class SchemaMigrationError(RuntimeError):
+    pass
+
+def _add_missing_columns(bind: Engine, table: Table, present: set):
+    for column in table.columns:
+        if column.name in present:
+            continue
+        if not column.nullable:
+            raise SchemaMigrationError(
+                f"Column {table.name}.{column.name} is NOT NULL and cannot be added to existing rows automatically"
+            )
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}"))
+        logger.info(f"Added column {table.name}.{column.name}")
+
+def _duplicate_count(bind: Engine, table: Table, index: Index) -> int:
+    """Groups of rows that a unique index on these columns would reject (NULLs never conflict)"""
+    columns = list(index.columns)
+    groups = (
+        select(*columns)
+        .where(and_(*(c.isnot(None) for c in columns)))
+        .group_by(*columns)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    with bind.connect() as conn:
+        return conn.execute(select(func.count()).select_from(groups)).scalar_one()
+
+def _sync_indexes(bind: Engine, table: Table, current: dict):
+    for index in table.indexes:
+        existing = current.get(index.name)
+        if existing is None:
+            if index.unique and _duplicate_count(bind, table, index):
+                raise SchemaMigrationError(
+                    f"Cannot create unique index {index.name}: {table.name} has duplicate "
+                    f"({', '.join(c.name for c in index.columns)}) rows; remove them and migrate again"
+                )
+            index.create(bind=bind)
+            logger.info(f"Created index {index.name}")
+        elif index.unique and not existing["unique"]:
+            # Checked up front: on SQLite the DROP is not undone if the CREATE then fails
+            duplicates = _duplicate_count(bind, table, index)
+            if duplicates:
+                raise SchemaMigrationError(
+                    f"Cannot make index {index.name} unique: {table.name} has {duplicates} groups of duplicate "
+                    f"({', '.join(c.name for c in index.columns)}) rows; remove them and migrate again"
+                )
+            index.drop(bind=bind)
+            index.create(bind=bind)
+            logger.info(f"Made index {index.name} unique")
+
+def migrate_schema(bind: Engine = engine):
+    """
+    Create missing tables, then bring existing ones up to the models: create_all skips
+    tables that already exist, so the nullable columns and indexes introduced since are
+    added here. A change that cannot be applied safely raises SchemaMigrationError
+    rather than leaving the schema weaker than the models declare.
+    """
+    Base.metadata.create_all(bind=bind)
+    for table in Base.metadata.sorted_tables:
+        existing = inspect(bind)
+        _add_missing_columns(bind, table, {c["name"] for c in existing.get_columns(table.name)})
+        _sync_indexes(bind, table, {i["name"]: i for i in existing.get_indexes(table.name)})
+    logger.info("Database schema is up to date")
+
+if __name__ == "__main__":
+    migrate_schema()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .db import Base
 import datetime
@@ -10,6 +10,11 @@ class Document(Base):
     description = Column(Text, nullable=True)
     uploaded_at = Column(DateTime, default=datetime.datetime.utcnow)
     document_metadata = Column(Text, nullable=True)
+    # The uploaded PDF on disk (see services.document_store); unset for documents from before it was kept
+    file_path = Column(String, nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    # sha256 of the file; an upload matching an existing document reuses it instead of ingesting again
+    content_hash = Column(String(64), nullable=True, unique=True, index=True)
 
 class Workflow(Base):
     __tablename__ = "workflows"
@@ -19,10 +24,37 @@ class Workflow(Base):
     definition = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+    # Keyset pagination of the workflow list walks (created_at, id) descending
+    __table_args__ = (Index("ix_workflows_created_at_id", "created_at", "id"),)
+
 class ChatLog(Base):
     __tablename__ = "chat_logs"
     id = Column(Integer, primary_key=True, index=True)
     workflow_id = Column(Integer, ForeignKey("workflows.id"), nullable=True)
+    # Client-chosen id grouping the turns of one conversation; unset means the workflow's shared chat
+    conversation_id = Column(String, nullable=True)
     user_query = Column(Text)
     response = Column(Text)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    # Chat history pages: one workflow's rows by (created_at, id) descending
+    __table_args__ = (
+        Index("ix_chat_logs_workflow_created_id", "workflow_id", "created_at", "id"),
+        Index("ix_chat_logs_conversation_created_id", "conversation_id", "created_at", "id"),
+    )
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+    id = Column(String, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    filename = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)  # queued | running | done | failed
+    stored_chunks = Column(Integer, default=0)
+    pages = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Worker running the job and until when it holds it; expired leases are recovered by another worker
+    owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
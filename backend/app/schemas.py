@@ -4,8 +4,9 @@ import re
 
 class UploadResponse(BaseModel):
     success: bool
+    job_id: str
     document_id: int
-    stored_chunks: int
+    status: str
 
 class WorkflowDefinition(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -25,6 +26,9 @@ class ExecuteRequest(BaseModel):
     session_id: Optional[str] = Field(None, max_length=100)
     api_keys: Optional[Dict[str, str]] = Field(default_factory=dict)
     node_configs: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    # Groups turns into one server-side conversation; without it the workflow's chat is used
+    conversation_id: Optional[str] = Field(None, max_length=100)
+    # Only read when server-side memory is disabled (MEMORY_ENABLED=false)
     chat_history: Optional[List[Dict[str, Any]]] = Field(default_factory=list)
     
     @validator('query')
@@ -0,0 +1,204 @@
+import asyncio
+import datetime
+import os
+from collections import deque
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
+from ..db import AsyncSessionLocal
+from ..models import ChatLog
+from loguru import logger
+
+# "behind" queues chat logs and inserts them in batches; "sync" commits each one inline (tests)
+CHATLOG_WRITE_MODE = os.getenv("CHATLOG_WRITE_MODE", "behind")
+CHATLOG_BATCH_SIZE = int(os.getenv("CHATLOG_BATCH_SIZE", "100"))
+CHATLOG_FLUSH_INTERVAL = float(os.getenv("CHATLOG_FLUSH_INTERVAL", "0.5"))
+# Buffered rows above which add() waits for a flush instead of growing the buffer
+CHATLOG_MAX_BUFFER = int(os.getenv("CHATLOG_MAX_BUFFER", "10000"))
+# Failed attempts at a batch before it is inserted row by row and rows that still fail are set aside
+CHATLOG_MAX_ATTEMPTS = int(os.getenv("CHATLOG_MAX_ATTEMPTS", "3"))
+# Set-aside rows kept in memory for inspection (oldest dropped first)
+CHATLOG_QUARANTINE_SIZE = int(os.getenv("CHATLOG_QUARANTINE_SIZE", "100"))
+
+def _row_key(row: Dict[str, Any]):
+    return (row["workflow_id"], row["created_at"], row["user_query"], row["response"])
+
+class ChatLogWriter:
+    """
+    Write-behind buffer for chat logs. Rows are flushed with one multi-row INSERT when
+    the batch size is reached or the flush interval elapses, and on shutdown. Rows not
+    yet committed stay visible to readers through pending().
+    """
+
+    def __init__(self, mode: str = CHATLOG_WRITE_MODE, batch_size: int = CHATLOG_BATCH_SIZE,
+                 interval: float = CHATLOG_FLUSH_INTERVAL, max_buffer: int = CHATLOG_MAX_BUFFER,
+                 max_attempts: int = CHATLOG_MAX_ATTEMPTS):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.max_attempts = max_attempts
+        # Consecutive failed inserts of the batch at the front of the buffer
+        self.attempts = 0
+        self.quarantine: deque = deque(maxlen=CHATLOG_QUARANTINE_SIZE)
+        self.quarantined = 0
+        self.buffer: List[Dict[str, Any]] = []
+        # Taken from the buffer by a flush that has not committed yet
+        self.inflight: List[Dict[str, Any]] = []
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.failures = 0
+        self.max_depth = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.mode != "behind" or (self._task is not None and not self._task.done()):
+            return
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.buffer:
+            await self.flush()
+
+    async def add(self, workflow_id: Optional[int], user_query: Optional[str], response: Optional[str],
+                  conversation_id: Optional[str] = None):
+        row = {
+            "workflow_id": workflow_id,
+            "conversation_id": conversation_id,
+            "user_query": user_query,
+            "response": response,
+            "created_at": datetime.datetime.utcnow(),
+        }
+        if self.mode != "behind":
+            await self._insert([row])
+            return
+        self.start()
+        if len(self.buffer) >= self.max_buffer:
+            # Back-pressure rather than unbounded memory when the database falls behind
+            try:
+                await self.flush()
+            except Exception as e:
+                # The chat turn itself succeeded; a logging backlog must not fail the request
+                logger.warning(f"Chat log flush failed with a full buffer ({len(self.buffer)} rows): {e}")
+        self.buffer.append(row)
+        self.queued += 1
+        self.max_depth = max(self.max_depth, len(self.buffer))
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows committed"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            written = 0
+            while self.buffer:
+                batch, self.buffer = self.buffer[:self.batch_size], self.buffer[self.batch_size:]
+                self.inflight = batch
+                try:
+                    if self.attempts >= self.max_attempts:
+                        written += await self._insert_rows(batch)
+                        self.attempts = 0
+                        continue
+                    await self._insert(batch)
+                    self.attempts = 0
+                except Exception:
+                    # Put the batch back in front so order is kept for the next attempt
+                    self.attempts += 1
+                    self.buffer = batch + self.buffer
+                    raise
+                finally:
+                    self.inflight = []
+                written += len(batch)
+            return written
+
+    async def _insert_rows(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert a batch that keeps failing one row at a time, so a single bad row (e.g. a
+        workflow deleted meanwhile) cannot block every later chat log. Rows that fail on
+        their own are set aside in `quarantine` and logged.
+        """
+        written = 0
+        for row in rows:
+            try:
+                await self._insert([row])
+                written += 1
+            except Exception as e:
+                self.quarantined += 1
+                self.quarantine.append({**row, "error": str(e)})
+                logger.error(f"Dropping chat log for workflow {row['workflow_id']} after "
+                             f"{self.max_attempts} failed batch attempts: {e}")
+        return written
+
+    async def _insert(self, rows: List[Dict[str, Any]]):
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(ChatLog), rows)
+            await db.commit()
+        self.written += len(rows)
+        self.batches += 1
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self.buffer:
+                continue
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Chat log flush failed, {len(self.buffer)} rows kept for retry: {e}")
+
+    def pending(self, workflow_id: int, conversation_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Rows for the workflow (or just one conversation) that are not committed yet, newest first"""
+        if conversation_id:
+            rows = [r for r in self.inflight + self.buffer if r["conversation_id"] == conversation_id]
+        else:
+            rows = [r for r in self.inflight + self.buffer if r["workflow_id"] == workflow_id]
+        return sorted(rows, key=lambda r: r["created_at"], reverse=True)
+
+    def merge_history(self, workflow_id: int, stored: List[Dict[str, Any]], limit: int,
+                      conversation_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Combine committed history rows (newest first) with pending ones. Read pending
+        after querying the database: a row committed in between then shows up in both
+        lists and is deduplicated here.
+        """
+        seen = {_row_key(r) for r in stored}
+        pending = [
+            {"id": None, **r} for r in self.pending(workflow_id, conversation_id) if _row_key(r) not in seen
+        ]
+        merged = sorted(pending + stored, key=lambda r: r["created_at"], reverse=True)
+        return merged[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "queue_depth": len(self.buffer) + len(self.inflight),
+            "max_depth": self.max_depth,
+            "batch_size": self.batch_size,
+            "interval": self.interval,
+            "queued": self.queued,
+            "written": self.written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "quarantined": self.quarantined,
+        }
+
+chat_log_writer = ChatLogWriter()
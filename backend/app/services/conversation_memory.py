@@ -0,0 +1,199 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from ..core.executors import run_blocking
+from ..core.llm_client import ask_llm_with_key
+from ..db import AsyncSessionLocal
+from ..models import ChatLog
+from .chat_log_writer import chat_log_writer
+from loguru import logger
+
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Token budget for the verbatim recent turns put into the prompt
+MEMORY_HISTORY_TOKENS = int(os.getenv("MEMORY_HISTORY_TOKENS", "1500"))
+# A single message longer than this is cut down before it goes into the window
+MEMORY_MESSAGE_TOKENS = int(os.getenv("MEMORY_MESSAGE_TOKENS", "400"))
+# Token budget for the rolling summary of turns that fell out of the window
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+# Most recent turns read from the database per request
+MEMORY_LOAD_TURNS = int(os.getenv("MEMORY_LOAD_TURNS", "200"))
+# extractive: clipped turn digests, no extra API call; llm: fold new turns into the summary with the LLM
+MEMORY_SUMMARY_MODE = os.getenv("MEMORY_SUMMARY_MODE", "extractive")
+MEMORY_CACHE_SIZE = int(os.getenv("MEMORY_CACHE_SIZE", "1000"))
+
+def estimate_tokens(text: str) -> int:
+    """Cheap provider-neutral estimate: about four characters per token"""
+    return len(text) // 4 + 1 if text else 0
+
+def clip(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, keeping its head and tail"""
+    text = text or ""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]} [...] {text[-tail:]}"
+
+def _turn_key(turn: Dict[str, Any]):
+    # Not the id: a buffered turn has none until its batch is written
+    return turn["created_at"]
+
+class ConversationMemory:
+    """
+    Conversation state kept server-side and backed by ChatLog. Each request gets the
+    most recent turns that fit a token budget, plus a rolling summary of the older
+    turns. The summary is cached per conversation and extended incrementally, only
+    with turns that have left the window since the last request.
+    """
+
+    def __init__(self, history_tokens: int = MEMORY_HISTORY_TOKENS, message_tokens: int = MEMORY_MESSAGE_TOKENS,
+                 summary_tokens: int = MEMORY_SUMMARY_TOKENS, max_turns: int = MEMORY_LOAD_TURNS,
+                 summary_mode: str = MEMORY_SUMMARY_MODE, cache_size: int = MEMORY_CACHE_SIZE):
+        self.history_tokens = history_tokens
+        self.message_tokens = message_tokens
+        self.summary_tokens = summary_tokens
+        self.max_turns = max_turns
+        self.summary_mode = summary_mode
+        self.cache_size = cache_size
+        # conversation key -> {"summary": str, "through": key of the newest folded turn}
+        self._summaries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.folded_turns = 0
+        self.summary_calls = 0
+
+    @staticmethod
+    def conversation_key(workflow_id: int, conversation_id: Optional[str]) -> str:
+        return f"conv:{conversation_id}" if conversation_id else f"wf:{workflow_id}"
+
+    async def load_turns(self, workflow_id: int, conversation_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Most recent turns, newest first, including ones still in the write-behind buffer"""
+        q = select(ChatLog.id, ChatLog.workflow_id, ChatLog.user_query, ChatLog.response, ChatLog.created_at)
+        if conversation_id:
+            q = q.where(ChatLog.conversation_id == conversation_id)
+        else:
+            q = q.where(ChatLog.workflow_id == workflow_id)
+        q = q.order_by(ChatLog.created_at.desc(), ChatLog.id.desc()).limit(self.max_turns)
+        async with AsyncSessionLocal() as db:
+            stored = [dict(r._mapping) for r in (await db.execute(q)).all()]
+        return chat_log_writer.merge_history(workflow_id, stored, self.max_turns, conversation_id=conversation_id)
+
+    def window(self, turns: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Split newest-first turns into (window, older), both oldest first"""
+        used = 0
+        window = []
+        for i, turn in enumerate(turns):
+            cost = estimate_tokens(clip(turn["user_query"], self.message_tokens)) + \
+                estimate_tokens(clip(turn["response"], self.message_tokens))
+            if window and used + cost > self.history_tokens:
+                return list(reversed(window)), list(reversed(turns[i:]))
+            window.append(turn)
+            used += cost
+        return list(reversed(window)), []
+
+    def fit_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Newest client-sent {"role", "content"} messages that fit the history budget, oldest first"""
+        used = 0
+        kept = []
+        for msg in reversed(messages):
+            content = clip(str(msg.get("content", "")), self.message_tokens)
+            cost = estimate_tokens(content)
+            if kept and used + cost > self.history_tokens:
+                break
+            kept.append({"role": msg.get("role"), "content": content})
+            used += cost
+        return list(reversed(kept))
+
+    async def context_for(self, workflow_id: int, conversation_id: Optional[str] = None,
+                          api_keys: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Prompt memory for the next turn: {"chat_history": [...messages], "summary": str,
+        "history_tokens": int}. Messages use the {"role", "content"} shape clients used to send.
+        """
+        turns = await self.load_turns(workflow_id, conversation_id)
+        window, older = self.window(turns)
+        summary = await self._summary(self.conversation_key(workflow_id, conversation_id), older, api_keys or {})
+        messages = []
+        for turn in window:
+            messages.append({"role": "user", "content": clip(turn["user_query"], self.message_tokens)})
+            messages.append({"role": "assistant", "content": clip(turn["response"], self.message_tokens)})
+        return {
+            "chat_history": messages,
+            "summary": summary,
+            "history_tokens": sum(estimate_tokens(m["content"]) for m in messages) + estimate_tokens(summary),
+        }
+
+    async def _summary(self, key: str, older: List[Dict[str, Any]], api_keys: Dict[str, str]) -> str:
+        if not older:
+            return self._summaries.get(key, {}).get("summary", "")
+        entry = self._summaries.get(key)
+        if entry is not None:
+            self._summaries.move_to_end(key)
+            fresh = [t for t in older if _turn_key(t) > entry["through"]]
+            if not fresh:
+                self.hits += 1
+                return entry["summary"]
+            previous = entry["summary"]
+        else:
+            self.misses += 1
+            fresh = older
+            previous = ""
+        summary = await self._fold(previous, fresh, api_keys)
+        self._summaries[key] = {"summary": summary, "through": _turn_key(older[-1])}
+        while len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+        self.folded_turns += len(fresh)
+        return summary
+
+    async def _fold(self, previous: str, turns: List[Dict[str, Any]], api_keys: Dict[str, str]) -> str:
+        if self.summary_mode == "llm":
+            provider, key = next(((p, api_keys[p]) for p in ("openai", "gemini", "grok") if api_keys.get(p)), (None, None))
+            if key:
+                try:
+                    return await self._fold_llm(previous, turns, provider, key)
+                except Exception as e:
+                    logger.warning(f"Conversation summary via {provider} failed, using extractive summary: {e}")
+        return self._fold_extractive(previous, turns)
+
+    def _fold_extractive(self, previous: str, turns: List[Dict[str, Any]]) -> str:
+        lines = previous.splitlines() if previous else []
+        for turn in turns:
+            lines.append(f"- User: {clip(turn['user_query'], 30)} | Assistant: {clip(turn['response'], 40)}")
+        # Rolling: the oldest digests give way once the summary is over budget
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_tokens:
+            lines.pop(0)
+        return "\n".join(lines)
+
+    async def _fold_llm(self, previous: str, turns: List[Dict[str, Any]], provider: str, api_key: str) -> str:
+        transcript = "\n".join(
+            f"User: {clip(t['user_query'], self.message_tokens)}\nAssistant: {clip(t['response'], self.message_tokens)}"
+            for t in turns
+        )
+        prompt = (f"Current summary:\n{previous or '(none)'}\n\nNew conversation turns:\n{transcript}\n\n"
+                  f"Rewrite the summary to include the new turns. Keep facts, names, decisions and open "
+                  f"questions. At most {self.summary_tokens * 3 // 4} words.")
+        self.summary_calls += 1
+        text = await asyncio.wait_for(run_blocking(
+            "provider", ask_llm_with_key, api_key, provider, False,
+            system="You maintain a concise running summary of a conversation.",
+            prompt=prompt, temperature=0.0, max_tokens=self.summary_tokens,
+        ), timeout=30.0)
+        return clip(str(text).strip(), self.summary_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": MEMORY_ENABLED,
+            "summary_mode": self.summary_mode,
+            "cached_summaries": len(self._summaries),
+            "history_tokens": self.history_tokens,
+            "summary_tokens": self.summary_tokens,
+            "hits": self.hits,
+            "misses": self.misses,
+            "folded_turns": self.folded_turns,
+            "summary_calls": self.summary_calls,
+        }
+
+conversation_memory = ConversationMemory()
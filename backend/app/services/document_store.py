@@ -0,0 +1,86 @@
+import base64
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Optional, Tuple
+from loguru import logger
+
+# Uploaded PDFs are kept here as <document_id>.pdf so ingestion and Knowledge Base nodes read them from disk
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./uploads")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# Bytes copied per read while spooling an upload to disk
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+class UploadTooLarge(ValueError):
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"File size ({size / 1024 / 1024:.1f}MB) exceeds {limit / 1024 / 1024:.0f}MB limit")
+        self.size = size
+        self.limit = limit
+
+def _temp_path() -> Tuple[int, str]:
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    # Same directory as the final file, so keep() is a rename rather than a copy
+    return tempfile.mkstemp(suffix=".part", dir=UPLOAD_DIR)
+
+def discard(path: Optional[str]):
+    if path:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+def spool(src: BinaryIO, max_bytes: int = UPLOAD_MAX_BYTES) -> Tuple[str, int, str]:
+    """
+    Copy a file object to a temp file in UPLOAD_DIR, UPLOAD_CHUNK_SIZE bytes at a time.
+    Stops and raises UploadTooLarge as soon as more than max_bytes have been read.
+    Returns (path, size, sha256 of the content).
+    """
+    fd, path = _temp_path()
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(size, max_bytes)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        discard(path)
+        raise
+    return path, size, digest.hexdigest()
+
+def spool_base64(content: str, max_bytes: int = UPLOAD_MAX_BYTES) -> Tuple[str, int, str]:
+    """Decode inline base64 file content to a temp file piecewise, never holding the decoded bytes whole"""
+    # Decoded size is known up front: 3 bytes per 4 characters, less the padding
+    size = len(content) * 3 // 4 - content[-2:].count("=")
+    if size > max_bytes:
+        raise UploadTooLarge(size, max_bytes)
+    fd, path = _temp_path()
+    # A multiple of 4 characters, so every slice decodes on its own
+    step = UPLOAD_CHUNK_SIZE // 3 * 4
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for start in range(0, len(content), step):
+                chunk = base64.b64decode(content[start:start + step])
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        discard(path)
+        raise
+    return path, size, digest.hexdigest()
+
+def document_path(document_id: int) -> str:
+    return os.path.join(UPLOAD_DIR, f"{document_id}.pdf")
+
+def keep(temp_path: str, document_id: int) -> str:
+    """Move a spooled upload to its permanent place; returns the new path"""
+    path = document_path(document_id)
+    os.replace(temp_path, path)
+    logger.debug(f"Stored document {document_id} at {path}")
+    return path
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from .node_executors import get_executor
+from loguru import logger
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "128"))
+
+class GraphExecutionError(Exception):
+    pass
+
+def build_levels(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]):
+    node_ids = {n["id"] for n in nodes}
+    indegree = {nid: 0 for nid in node_ids}
+    adj = {nid: [] for nid in node_ids}
+
+    for e in edges:
+        s, t = e["source"], e["target"]
+        if s in node_ids and t in node_ids:
+            adj[s].append(e)
+            indegree[t] += 1
+
+    queue = [nid for nid, deg in indegree.items() if deg == 0]
+    levels = []
+    while queue:
+        this_level = queue[:]
+        levels.append(this_level)
+        queue = []
+        for n in this_level:
+            for e in adj.get(n, []):
+                tgt = e["target"]
+                indegree[tgt] -= 1
+                if indegree[tgt] == 0:
+                    queue.append(tgt)
+
+    if sum(len(l) for l in levels) != len(node_ids):
+        raise GraphExecutionError("Cycle detected in workflow graph")
+
+    return levels
+
+@dataclass(frozen=True)
+class Route:
+    """One outgoing edge, with its handle mapping already resolved"""
+    target: str
+    source_handle: Optional[str]
+    target_handle: Optional[str]
+    input_key: str
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    """Everything execute_graph needs from a workflow definition, computed once"""
+    definition_hash: str
+    node_map: Mapping[str, Dict[str, Any]]
+    levels: Tuple[Tuple[str, ...], ...]
+    order: Tuple[str, ...]
+    executors: Mapping[str, Optional[Callable]]
+    routes: Mapping[str, Tuple[Route, ...]]
+    upstream: Mapping[str, Tuple[str, ...]]
+    indegree: Mapping[str, int]
+
+def hash_definition(definition: str) -> str:
+    return hashlib.sha256(definition.encode("utf-8")).hexdigest()
+
+def compile_plan(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
+                 definition_hash: str = "") -> ExecutionPlan:
+    """Compile a workflow's nodes and edges into an immutable ExecutionPlan"""
+    node_map = {n["id"]: n for n in nodes}
+    levels = build_levels(nodes, edges)
+
+    routes: Dict[str, List[Route]] = {nid: [] for nid in node_map}
+    upstream: Dict[str, List[str]] = {nid: [] for nid in node_map}
+    for e in edges:
+        s, t = e["source"], e["target"]
+        if s not in node_map or t not in node_map:
+            continue
+        s_handle = e.get("sourceHandle")
+        t_handle = e.get("targetHandle")
+        routes[s].append(Route(t, s_handle, t_handle, t_handle or s_handle or "output"))
+        upstream[t].append(s)
+
+    return ExecutionPlan(
+        definition_hash=definition_hash,
+        node_map=MappingProxyType(node_map),
+        levels=tuple(tuple(level) for level in levels),
+        order=tuple(nid for level in levels for nid in level),
+        executors=MappingProxyType({nid: get_executor(n.get("type")) for nid, n in node_map.items()}),
+        routes=MappingProxyType({nid: tuple(r) for nid, r in routes.items()}),
+        upstream=MappingProxyType({nid: tuple(u) for nid, u in upstream.items()}),
+        indegree=MappingProxyType({nid: len(u) for nid, u in upstream.items()}),
+    )
+
+class PlanCache:
+    """Bounded LRU of compiled plans keyed by (workflow_id, definition hash)"""
+
+    def __init__(self, max_size: int = PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self._plans: "OrderedDict[Tuple[int, str], ExecutionPlan]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compile(self, workflow_id: int, definition: str) -> ExecutionPlan:
+        key = (workflow_id, hash_definition(definition))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+
+        parsed = json.loads(definition)
+        plan = compile_plan(parsed.get("nodes", []), parsed.get("edges", []), key[1])
+
+        with self._lock:
+            # Drop plans for older versions of this workflow
+            for stale in [k for k in self._plans if k[0] == workflow_id and k != key]:
+                del self._plans[stale]
+            self._plans[key] = plan
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+                self.evictions += 1
+        return plan
+
+    def invalidate(self, workflow_id: int):
+        with self._lock:
+            for key in [k for k in self._plans if k[0] == workflow_id]:
+                del self._plans[key]
+        logger.debug(f"Invalidated execution plans for workflow {workflow_id}")
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._plans),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+plan_cache = PlanCache()
@@ -1,117 +1,193 @@
 import asyncio
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Mapping, Optional, Sequence
 from ..core.ws_manager import ws_manager
-from .node_executors import get_executor
+from .execution_plan import ExecutionPlan, GraphExecutionError, compile_plan
+from .node_cache import node_cache
 from loguru import logger
 
-class GraphExecutionError(Exception):
-    pass
-
-def build_levels(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]]):
-    node_ids = {n["id"] for n in nodes}
-    indegree = {nid: 0 for nid in node_ids}
-    adj = {nid: [] for nid in node_ids}
-
-    for e in edges:
-        s, t = e["source"], e["target"]
-        if s in node_ids and t in node_ids:
-            adj[s].append(e)
-            indegree[t] += 1
-
-    queue = [nid for nid, deg in indegree.items() if deg == 0]
-    levels = []
-    while queue:
-        this_level = queue[:]
-        levels.append(this_level)
-        queue = []
-        for n in this_level:
-            for e in adj.get(n, []):
-                tgt = e["target"]
-                indegree[tgt] -= 1
-                if indegree[tgt] == 0:
-                    queue.append(tgt)
-
-    if sum(len(l) for l in levels) != len(node_ids):
-        raise GraphExecutionError("Cycle detected in workflow graph")
-
-    return levels
+def compute_run_stats(levels: Sequence[Sequence[str]], upstream: Mapping[str, Sequence[str]],
+                      ready_at: Dict[str, float], started_at: Dict[str, float],
+                      finished_at: Dict[str, float], wall_time: float) -> Dict[str, Any]:
+    """
+    Summarize a finished run: the critical path through the DAG (longest chain of
+    node durations), the time a per-level barrier schedule would have needed, and
+    how much of the wall time was not spent on the critical path.
+    """
+    durations = {nid: finished_at[nid] - started_at[nid] for nid in finished_at}
+
+    # Longest path by duration, walking nodes in topological (level) order
+    path_time: Dict[str, float] = {}
+    path_prev: Dict[str, Optional[str]] = {}
+    for level in levels:
+        for nid in level:
+            if nid not in durations:
+                continue
+            best_prev, best_time = None, 0.0
+            for up in upstream.get(nid, []):
+                if path_time.get(up, 0.0) > best_time:
+                    best_prev, best_time = up, path_time[up]
+            path_time[nid] = best_time + durations[nid]
+            path_prev[nid] = best_prev
+
+    critical_path = []
+    if path_time:
+        nid = max(path_time, key=path_time.get)
+        critical_time = path_time[nid]
+        while nid is not None:
+            critical_path.append(nid)
+            nid = path_prev[nid]
+        critical_path.reverse()
+    else:
+        critical_time = 0.0
+
+    # What the old level-by-level gather would have cost: sum of per-level maximums
+    barrier_time = sum(
+        max((durations[nid] for nid in level if nid in durations), default=0.0)
+        for level in levels
+    )
+    queue_delay = sum(started_at[nid] - ready_at[nid] for nid in started_at)
+
+    return {
+        "wall_time": round(wall_time, 4),
+        "critical_path": critical_path,
+        "critical_path_time": round(critical_time, 4),
+        "idle_time": round(max(wall_time - critical_time, 0.0), 4),
+        "queue_delay": round(queue_delay, 4),
+        "level_barrier_time": round(barrier_time, 4),
+        "node_durations": {nid: round(d, 4) for nid, d in durations.items()},
+    }
 
 async def execute_graph(nodes: List[Dict[str, Any]], edges: List[Dict[str, Any]],
-                        initial_inputs: Dict[str, Any], session_id: str = None):
-    node_map = {n["id"]: n for n in nodes}
+                        initial_inputs: Dict[str, Any], session_id: str = None,
+                        stats: Optional[Dict[str, Any]] = None):
+    """Compile and run a workflow graph; see execute_plan"""
+    plan = compile_plan(nodes, edges)
+    return await execute_plan(plan, initial_inputs, session_id=session_id, stats=stats)
+
+async def execute_plan(plan: ExecutionPlan, initial_inputs: Dict[str, Any], session_id: str = None,
+                       stats: Optional[Dict[str, Any]] = None):
+    """
+    Run a compiled workflow plan, starting each node as soon as all of its own upstream
+    nodes have finished instead of waiting for a whole level to complete.
+    If a `stats` dict is passed it is filled with the run's scheduling stats.
+    """
+    node_map = plan.node_map
     out_map: Dict[str, Dict[str, Any]] = {}
-    in_map: Dict[str, Dict[str, Any]] = {nid: {} for nid in node_map}
-
-    for nid in in_map:
-        in_map[nid].update(initial_inputs)
-
-    edges_by_source = {}
-    for e in edges:
-        edges_by_source.setdefault(e["source"], []).append(e)
+    in_map: Dict[str, Dict[str, Any]] = {nid: dict(initial_inputs) for nid in node_map}
+    remaining: Dict[str, int] = dict(plan.indegree)
 
     outputs_collection = []
 
-    levels = build_levels(nodes, edges)
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"Execution plan has {len(levels)} levels"})
+        await ws_manager.log(session_id, "debug", f"Execution plan has {len(plan.levels)} levels")
+
+    context = {
+        "session_id": session_id,
+        "api_keys": initial_inputs.get("api_keys", {}),
+        "node_configs": initial_inputs.get("node_configs", {}),
+        "chat_history": initial_inputs.get("chat_history", []),
+        "history_summary": initial_inputs.get("history_summary", ""),
+    }
+
+    ready_at: Dict[str, float] = {}
+    started_at: Dict[str, float] = {}
+    finished_at: Dict[str, float] = {}
+
+    async def run_node(nid: str):
+        started_at[nid] = time.perf_counter()
+        node = node_map[nid]
+        node_type = node.get("type")
+        executor = plan.executors.get(nid)
+        if not executor:
+            msg = f"No executor for node type {node_type}"
+            if session_id:
+                await ws_manager.send(session_id, {"type":"error","message": msg})
+            raise GraphExecutionError(msg)
 
-    for level in levels:
+        inputs = in_map[nid]
         if session_id:
-            await ws_manager.send(session_id, {"type":"log","message":f"Executing level with nodes {level}"})
-
-        async def run_node(nid: str):
-            node = node_map[nid]
-            node_type = node.get("type")
-            executor = get_executor(node_type)
-            if not executor:
-                msg = f"No executor for node type {node_type}"
-                if session_id:
-                    await ws_manager.send(session_id, {"type":"error","message": msg})
-                raise GraphExecutionError(msg)
-
-            inputs = in_map[nid]
-            if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"Executing node {nid} ({node_type}) with inputs keys: {list(inputs.keys())}"})
+            await ws_manager.log(session_id, "debug", lambda: f"Executing node {nid} ({node_type}) with inputs keys: {list(inputs.keys())}")
+        cache_key = None
+        result = None
+        if node_cache.is_enabled(node, context):
+            cache_key = node_cache.make_key(node, inputs, context)
+            result = await node_cache.get(cache_key)
+            if result is not None and session_id:
+                await ws_manager.log(session_id, "info", f"[{nid}] Cache hit ({node_type}), skipping executor")
+                if node_type == "llm":
+                    await ws_manager.send(session_id, {"type":"done", "node_id": nid, "text": result.get("output", "")})
+        if result is None:
             try:
-                context = {
-                    "session_id": session_id,
-                    "api_keys": initial_inputs.get("api_keys", {}),
-                    "node_configs": initial_inputs.get("node_configs", {}),
-                    "chat_history": initial_inputs.get("chat_history", [])
-                }
                 result = await executor(node, inputs, context)
             except Exception as e:
                 logger.exception(f"Node {nid} execution failed")
                 if session_id:
                     await ws_manager.send(session_id, {"type":"error","message": str(e)})
                 raise
-            out_map[nid] = result or {}
-
-            for e in edges_by_source.get(nid, []):
-                tgt = e["target"]
-                s_handle = e.get("sourceHandle")
-                t_handle = e.get("targetHandle")
-                val = None
-                if s_handle:
-                    val = result.get(s_handle)
-                else:
-                    if result:
-                        val = next(iter(result.values()))
-                if t_handle:
-                    in_map[tgt][t_handle] = val
-                else:
-                    in_map[tgt][s_handle or "output"] = val
-                
-                # Debug logging for edge connections
-                if session_id:
-                    await ws_manager.send(session_id, {"type":"log","message":f"Edge: {nid}({s_handle}) -> {tgt}({t_handle}), value type: {type(val)}, value length: {len(str(val)) if val else 0}"})
-
-            if node_type == "output":
-                final = result.get("final") or result.get("output") or result
-                outputs_collection.append({"node_id": nid, "value": final})
-
-        await asyncio.gather(*(run_node(nid) for nid in level))
+            if cache_key and result:
+                await node_cache.set(cache_key, result, node_cache.ttl_for(node))
+        out_map[nid] = result or {}
+        finished_at[nid] = time.perf_counter()
+
+        for route in plan.routes.get(nid, ()):
+            val = None
+            if route.source_handle:
+                val = result.get(route.source_handle)
+            else:
+                if result:
+                    val = next(iter(result.values()))
+            in_map[route.target][route.input_key] = val
+
+            # Debug logging for edge connections
+            if session_id:
+                await ws_manager.log(session_id, "trace", lambda: f"Edge: {nid}({route.source_handle}) -> {route.target}({route.target_handle}), value type: {type(val)}, value length: {len(str(val)) if val else 0}")
+
+        if node_type == "output":
+            final = result.get("final") or result.get("output") or result
+            outputs_collection.append({"node_id": nid, "value": final})
+
+    run_start = time.perf_counter()
+    pending: Dict[asyncio.Task, str] = {}
+
+    def schedule(nid: str):
+        ready_at[nid] = time.perf_counter()
+        pending[asyncio.ensure_future(run_node(nid))] = nid
+
+    for nid, deg in remaining.items():
+        if deg == 0:
+            schedule(nid)
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                nid = pending.pop(task)
+                task.result()  # re-raise node failures
+                ready = []
+                for route in plan.routes.get(nid, ()):
+                    remaining[route.target] -= 1
+                    if remaining[route.target] == 0:
+                        ready.append(route.target)
+                if ready and session_id:
+                    await ws_manager.log(session_id, "debug", lambda: f"Node {nid} finished, starting {ready}")
+                for tgt in ready:
+                    schedule(tgt)
+    except BaseException:
+        # One node failed (or we were cancelled): stop everything still in flight
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending.keys(), return_exceptions=True)
+        raise
+
+    run_stats = compute_run_stats(plan.levels, plan.upstream, ready_at, started_at, finished_at,
+                                  time.perf_counter() - run_start)
+    if stats is not None:
+        stats.update(run_stats)
+    logger.info(f"Graph run stats: wall={run_stats['wall_time']}s critical_path={run_stats['critical_path_time']}s "
+                f"level_barrier={run_stats['level_barrier_time']}s")
 
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":"Graph execution finished."})
+        await ws_manager.send(session_id, {"type":"stats", **run_stats})
+        await ws_manager.log(session_id, "info", "Graph execution finished.")
     return outputs_collection
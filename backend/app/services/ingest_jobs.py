@@ -0,0 +1,350 @@
+import asyncio
+import datetime
+import os
+import socket
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+from ..core.executors import WorkloadPool, executors
+from ..core.ws_manager import ws_manager
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from ..db import AsyncSessionLocal, SessionLocal
+from ..models import Document, IngestJob
+from . import document_store
+from .processor import ingest_pdf
+from loguru import logger
+
+# Jobs accepted but not finished
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "32"))
+
+# A worker holds its unfinished jobs this many seconds past its last heartbeat; other
+# workers recover only jobs whose lease has expired
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "60"))
+
+TERMINAL_STATUSES = ("done", "failed")
+
+class IngestQueueFull(Exception):
+    pass
+
+def job_to_dict(job: IngestJob) -> Dict[str, Any]:
+    def ts(value):
+        return value.isoformat() if value else None
+
+    duration = None
+    if job.started_at and job.finished_at:
+        duration = round((job.finished_at - job.started_at).total_seconds(), 3)
+    return {
+        "job_id": job.id,
+        "document_id": job.document_id,
+        "filename": job.filename,
+        "status": job.status,
+        "stored_chunks": job.stored_chunks or 0,
+        "pages": job.pages or 0,
+        "error": job.error,
+        "created_at": ts(job.created_at),
+        "started_at": ts(job.started_at),
+        "finished_at": ts(job.finished_at),
+        "duration": duration,
+    }
+
+class IngestJobManager:
+    """
+    Runs document ingestion in the background on the shared "ingest" executor pool
+    (EXEC_INGEST_WORKERS, or INGEST_WORKERS, threads).
+    Job state is persisted in the ingest_jobs table; subscribed WebSocket sessions get
+    an `ingest_job` event on every status change and stored batch.
+    """
+
+    def __init__(self, pool: Optional[WorkloadPool] = None, max_pending: int = INGEST_MAX_PENDING,
+                 lease_seconds: float = INGEST_LEASE_SECONDS):
+        self.pool = pool or executors["ingest"]
+        self.max_pending = max_pending
+        self.lease_seconds = lease_seconds
+        # Distinguishes this process from sibling workers sharing the database
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.recovered = 0
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._subscribers: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.recover()
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = self._loop.create_task(self._heartbeat_loop())
+
+    def shutdown(self):
+        # The pool itself belongs to the executor registry, which shuts it down
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _lease(self) -> datetime.datetime:
+        return datetime.datetime.utcnow() + datetime.timedelta(seconds=self.lease_seconds)
+
+    def recover(self):
+        """Take over unfinished jobs whose owner stopped renewing its lease (crashed or restarted)"""
+        self._resume(self._claim_expired())
+
+    def _resume(self, resumed: List[tuple]):
+        for job_id, path, filename, description, content_hash in resumed:
+            with self._lock:
+                self._pending += 1
+            self._schedule(job_id, path, filename, description, content_hash)
+
+    def _claim_expired(self) -> List[tuple]:
+        """
+        Claim expired unfinished jobs for this worker. Those whose upload is still on disk
+        are requeued and returned; the rest are failed.
+        """
+        db = SessionLocal()
+        resumed = []
+        try:
+            now = datetime.datetime.utcnow()
+            expired = or_(IngestJob.lease_until.is_(None), IngestJob.lease_until < now)
+            candidates = db.query(IngestJob.id).filter(IngestJob.status.in_(["queued", "running"]), expired).all()
+            claimed = 0
+            for (job_id,) in candidates:
+                # Conditional update, so of several workers recovering at once only one wins each job
+                won = db.execute(
+                    update(IngestJob).where(IngestJob.id == job_id, IngestJob.status.in_(["queued", "running"]), expired)
+                    .values(owner=self.worker_id, lease_until=self._lease())
+                ).rowcount
+                db.commit()
+                if not won:
+                    continue
+                claimed += 1
+                job = db.get(IngestJob, job_id)
+                doc = db.get(Document, job.document_id) if job.document_id else None
+                if doc is not None and doc.file_path and os.path.exists(doc.file_path):
+                    job.status = "queued"
+                    job.started_at = None
+                    resumed.append((job.id, doc.file_path, doc.filename, doc.description or "", doc.content_hash))
+                else:
+                    job.status = "failed"
+                    job.error = "Interrupted by server restart"
+                    job.finished_at = datetime.datetime.utcnow()
+                db.commit()
+            if claimed:
+                self.recovered += claimed
+                logger.warning(f"Recovered {claimed} interrupted ingest jobs, {len(resumed)} requeued")
+        finally:
+            db.close()
+        return resumed
+
+    def _renew(self) -> int:
+        """Extend the lease of every unfinished job this worker owns"""
+        db = SessionLocal()
+        try:
+            renewed = db.execute(
+                update(IngestJob).where(IngestJob.owner == self.worker_id, IngestJob.status.in_(["queued", "running"]))
+                .values(lease_until=self._lease())
+            ).rowcount
+            db.commit()
+            return renewed
+        finally:
+            db.close()
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._renew)
+                # Also pick up jobs of a sibling worker that died while this one kept running
+                self._resume(await asyncio.to_thread(self._claim_expired))
+            except Exception as e:
+                logger.warning(f"Ingest job lease heartbeat failed: {e}")
+
+    async def _add_document(self, db, temp_path: str, filename: str, description: str, size: int,
+                            content_hash: Optional[str]) -> Tuple[Document, bool]:
+        """
+        The document for a spooled upload and whether it is new. A file whose content hash
+        matches an existing document resolves to that document and the upload is dropped.
+        Must be the first write in `db`: a lost insert race is rolled back.
+        """
+        if content_hash:
+            doc = await self._find_by_hash(db, content_hash)
+            if doc is not None:
+                return self._reuse(doc, temp_path), False
+        doc = Document(filename=filename, description=description, size_bytes=size, content_hash=content_hash)
+        db.add(doc)
+        try:
+            await db.flush()
+        except IntegrityError:
+            # A concurrent upload of the same file inserted it first (content_hash is unique)
+            await db.rollback()
+            doc = await self._find_by_hash(db, content_hash) if content_hash else None
+            if doc is None:
+                raise
+            return self._reuse(doc, temp_path), False
+        doc.file_path = document_store.keep(temp_path, doc.id)
+        return doc, True
+
+    async def _find_by_hash(self, db, content_hash: str) -> Optional[Document]:
+        # Ordered: databases from before the unique index may still hold duplicates
+        return await db.scalar(select(Document).where(Document.content_hash == content_hash)
+                               .order_by(Document.id).limit(1))
+
+    def _reuse(self, doc: Document, temp_path: str) -> Document:
+        """Drop the new upload, or keep it as the stored file if the document's one is gone"""
+        if doc.file_path and os.path.exists(doc.file_path):
+            document_store.discard(temp_path)
+        else:
+            doc.file_path = document_store.keep(temp_path, doc.id)
+        return doc
+
+    async def store(self, temp_path: str, filename: str, description: str = "", size: int = 0,
+                    content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Keep a spooled upload as a document without ingesting it (a Knowledge Base node will)"""
+        try:
+            async with AsyncSessionLocal() as db:
+                doc, created = await self._add_document(db, temp_path, filename, description, size, content_hash)
+                await db.commit()
+                return {"document_id": doc.id, "filename": doc.filename, "size_bytes": doc.size_bytes,
+                        "duplicate": not created}
+        except Exception:
+            document_store.discard(temp_path)
+            raise
+
+    async def submit(self, temp_path: str, filename: str, description: str = "", size: int = 0,
+                     content_hash: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Record a document for a spooled upload plus a queued job, and schedule ingestion;
+        returns the job dict. The upload file is moved into the document store. Re-uploading
+        a file that is already ingested, or being ingested, returns that job with
+        "duplicate": true instead of queueing another.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                document_store.discard(temp_path)
+                raise IngestQueueFull(f"{self._pending} ingest jobs already pending")
+            self._pending += 1
+
+        try:
+            async with AsyncSessionLocal() as db:
+                doc, created = await self._add_document(db, temp_path, filename, description, size, content_hash)
+                if not created:
+                    previous = await db.scalar(select(IngestJob).where(IngestJob.document_id == doc.id)
+                                               .order_by(IngestJob.created_at.desc()).limit(1))
+                    if previous is not None and previous.status != "failed":
+                        await db.commit()
+                        with self._lock:
+                            self._pending -= 1
+                        if session_id and previous.status not in TERMINAL_STATUSES:
+                            self.subscribe(previous.id, session_id)
+                        return {**job_to_dict(previous), "duplicate": True}
+                job = IngestJob(id=str(uuid.uuid4()), document_id=doc.id, filename=doc.filename, status="queued",
+                                owner=self.worker_id, lease_until=self._lease())
+                db.add(job)
+                await db.commit()
+                job_dict = job_to_dict(job)
+                path, filename, description = doc.file_path, doc.filename, doc.description or ""
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            document_store.discard(temp_path)
+            raise
+
+        if session_id:
+            self.subscribe(job_dict["job_id"], session_id)
+        self._loop = asyncio.get_running_loop()
+        self._schedule(job_dict["job_id"], path, filename, description, content_hash)
+        return job_dict
+
+    def _schedule(self, job_id: str, path: str, filename: str, description: str, content_hash: Optional[str]):
+        task = self._loop.create_task(self._run(job_id, path, filename, description, content_hash))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(IngestJob, job_id)
+            return job_to_dict(job) if job else None
+
+    async def list(self, limit: int = 50, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        async with AsyncSessionLocal() as db:
+            q = select(IngestJob)
+            if status:
+                q = q.where(IngestJob.status == status)
+            jobs = await db.scalars(q.order_by(IngestJob.created_at.desc()).limit(limit))
+            return [job_to_dict(j) for j in jobs]
+
+    def subscribe(self, job_id: str, session_id: str):
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(session_id)
+
+    def unsubscribe(self, job_id: str, session_id: str):
+        with self._lock:
+            sessions = self._subscribers.get(job_id)
+            if sessions is not None:
+                sessions.discard(session_id)
+                if not sessions:
+                    del self._subscribers[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": self.pool.max_workers, "pending": self._pending, "max_pending": self.max_pending,
+                "worker_id": self.worker_id, "recovered": self.recovered}
+
+    async def _publish(self, job_id: str, payload: Dict[str, Any]):
+        with self._lock:
+            sessions = list(self._subscribers.get(job_id, ()))
+            if payload.get("status") in TERMINAL_STATUSES:
+                self._subscribers.pop(job_id, None)
+        for sid in sessions:
+            await ws_manager.send(sid, {"type": "ingest_job", **payload})
+
+    def _publish_threadsafe(self, job_id: str, payload: Dict[str, Any]):
+        # Called from ingest worker threads while the loop may be (un)subscribing
+        with self._lock:
+            subscribed = job_id in self._subscribers
+        if self._loop is not None and subscribed:
+            asyncio.run_coroutine_threadsafe(self._publish(job_id, payload), self._loop)
+
+    async def _run(self, job_id: str, path: str, filename: str, description: str, content_hash: Optional[str]):
+        try:
+            await self.pool.run(self._ingest, job_id, path, filename, description, content_hash)
+        except Exception:
+            logger.exception(f"Ingest job {job_id} could not run")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _update(self, job_id: str, **fields) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            job = db.query(IngestJob).filter(IngestJob.id == job_id).first()
+            for key, value in fields.items():
+                setattr(job, key, value)
+            db.commit()
+            return job_to_dict(job)
+        finally:
+            db.close()
+
+    def _ingest(self, job_id: str, path: str, filename: str, description: str, content_hash: Optional[str]):
+        """Worker thread body: run the ingest pipeline and record the outcome"""
+        self._publish_threadsafe(job_id, self._update(job_id, status="running", started_at=datetime.datetime.utcnow()))
+
+        def report_progress(stage, count):
+            if stage == "stored":
+                self._publish_threadsafe(job_id, {"job_id": job_id, "status": "running", "stage": stage, "stored_chunks": count})
+
+        try:
+            result = ingest_pdf(path, filename, {"description": description}, progress=report_progress,
+                                fingerprint=content_hash)
+            if not (result["stored_chunks"] or result.get("skipped_chunks") or result.get("duplicate")):
+                raise ValueError("No text content found in PDF")
+            final = self._update(job_id, status="done", stored_chunks=result["stored_chunks"],
+                                 pages=result.get("pages", 0), finished_at=datetime.datetime.utcnow())
+            logger.info(f"Ingest job {job_id} done: {result['stored_chunks']} chunks")
+        except Exception as e:
+            logger.error(f"Ingest job {job_id} failed: {e}")
+            final = self._update(job_id, status="failed", error=str(e), finished_at=datetime.datetime.utcnow())
+        self._publish_threadsafe(job_id, final)
+
+ingest_jobs = IngestJobManager()
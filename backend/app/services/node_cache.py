@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from loguru import logger
+
+NODE_CACHE_BACKEND = os.getenv("NODE_CACHE_BACKEND", "memory")  # memory | sqlite
+NODE_CACHE_PATH = os.getenv("NODE_CACHE_PATH", "./node_cache.db")
+NODE_CACHE_MAX_ENTRIES = int(os.getenv("NODE_CACHE_MAX_ENTRIES", "1024"))
+NODE_CACHE_TTL = float(os.getenv("NODE_CACHE_TTL", "3600"))
+# Node types cached even without `cache: true` in their config, e.g. "knowledgebase,websearch"
+NODE_CACHE_TYPES = {t.strip() for t in os.getenv("NODE_CACHE_TYPES", "").split(",") if t.strip()}
+
+# Request-level inputs copied into every node's inputs; they are keyed separately
+_SHARED_INPUTS = {"api_keys", "node_configs", "chat_history", "history_summary"}
+# Config keys that control caching itself or carry one-off side effects
+_IGNORED_CONFIG_KEYS = {"cache", "cache_ttl", "uploaded_file"}
+
+class CacheBackend:
+    """Storage interface for node results; values are JSON strings"""
+    blocking = False
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: float):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU with per-entry expiry"""
+
+    def __init__(self, max_entries: int = NODE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend(CacheBackend):
+    """On-disk cache that survives restarts; least recently read entries are evicted first"""
+    blocking = True
+
+    def __init__(self, path: str = NODE_CACHE_PATH, max_entries: int = NODE_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS node_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_node_cache_accessed ON node_cache (accessed_at)")
+        self._conn.commit()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM node_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM node_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE node_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO node_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM node_cache").fetchone()[0]
+            if count > self.max_entries:
+                overflow = count - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM node_cache WHERE key IN "
+                    "(SELECT key FROM node_cache ORDER BY expires_at < ? DESC, accessed_at ASC LIMIT ?)",
+                    (now, overflow),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM node_cache")
+            self._conn.commit()
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM node_cache").fetchone()[0]
+
+def _fingerprint(secret: Any) -> str:
+    return hashlib.sha256(str(secret).encode("utf-8")).hexdigest()[:16]
+
+def _normalize(value: Any, ignored=frozenset()) -> Any:
+    """Make a value stable for hashing: drop ignored keys and replace secrets by fingerprints"""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in ignored:
+                continue
+            if isinstance(k, str) and k.endswith("api_key") and v:
+                out[k] = _fingerprint(v)
+            else:
+                out[k] = _normalize(v)
+        return out
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+class NodeCache:
+    """Content-addressed memoization of node results in front of a pluggable backend"""
+
+    def __init__(self, backend: CacheBackend, default_ttl: float = NODE_CACHE_TTL):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def is_enabled(self, node: Dict[str, Any], context: Dict[str, Any]) -> bool:
+        config = node.get("data", {}).get("config", {}) or {}
+        enabled = config.get("cache")
+        if enabled is None:
+            enabled = node.get("type") in NODE_CACHE_TYPES
+        if not enabled:
+            return False
+        # A pending upload makes the knowledge base run a side effect; never skip it
+        runtime = context.get("node_configs", {}).get(node["id"], {}) or {}
+        return not runtime.get("uploaded_file")
+
+    def ttl_for(self, node: Dict[str, Any]) -> float:
+        config = node.get("data", {}).get("config", {}) or {}
+        try:
+            return float(config.get("cache_ttl", self.default_ttl))
+        except (TypeError, ValueError):
+            return self.default_ttl
+
+    def make_key(self, node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[str, Any]) -> str:
+        """Hash of node type + normalized node config + the node's resolved inputs"""
+        payload = {
+            "type": node.get("type"),
+            "config": _normalize(node.get("data", {}).get("config", {}) or {}, _IGNORED_CONFIG_KEYS),
+            "runtime": _normalize(context.get("node_configs", {}).get(node["id"], {}) or {}, _IGNORED_CONFIG_KEYS),
+            "credentials": {k: _fingerprint(v) for k, v in (context.get("api_keys") or {}).items()},
+            "inputs": _normalize({k: v for k, v in inputs.items() if k not in _SHARED_INPUTS}),
+        }
+        if node.get("type") == "llm":
+            payload["chat_history"] = context.get("chat_history", [])
+            payload["history_summary"] = context.get("history_summary", "")
+        blob = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            if self.backend.blocking:
+                raw = await asyncio.to_thread(self.backend.get, key)
+            else:
+                raw = self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Node cache read failed: {e}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, result: Dict[str, Any], ttl: float):
+        try:
+            raw = json.dumps(result)
+        except (TypeError, ValueError):
+            return  # not cacheable
+        try:
+            if self.backend.blocking:
+                await asyncio.to_thread(self.backend.set, key, raw, ttl)
+            else:
+                self.backend.set(key, raw, ttl)
+            self.stores += 1
+        except Exception as e:
+            logger.warning(f"Node cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "size": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": getattr(self.backend, "evictions", 0),
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+def create_backend(name: str = NODE_CACHE_BACKEND) -> CacheBackend:
+    if name == "sqlite":
+        return SQLiteCacheBackend(NODE_CACHE_PATH, NODE_CACHE_MAX_ENTRIES)
+    if name != "memory":
+        logger.warning(f"Unknown NODE_CACHE_BACKEND '{name}', using memory")
+    return MemoryCacheBackend(NODE_CACHE_MAX_ENTRIES)
+
+node_cache = NodeCache(create_backend())
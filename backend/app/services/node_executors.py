@@ -1,23 +1,27 @@
 import asyncio
 from typing import Dict, Any, Optional
-from ..core.embeddings import embed_texts
+from ..core.embeddings import EMBEDDING_MODEL, embed_texts
+from ..core.executors import run_blocking
 from ..core.chroma_client import get_or_create_collection
-from ..core.llm_client import ask_llm, ask_llm_with_key
+from ..core.llm_client import ask_llm, ask_llm_with_key, astream_llm_with_key
+from ..core.token_coalescer import TokenCoalescer
 from ..core.ws_manager import ws_manager
+from .conversation_memory import MEMORY_ENABLED, conversation_memory
+from . import document_store
+from .processor import KB_DEDUP_OVERFETCH, collapse_near_duplicates, embedding_space, ingest_pdf, is_ingested
+from ..db import AsyncSessionLocal
+from ..models import Document, IngestJob
+from sqlalchemy import select
 from loguru import logger
 import os
 
 CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "kb_collection")
 
-async def _run_blocking(func, *args, **kwargs):
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
-
 async def exec_user_query(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
     session_id = context.get("session_id")
     q = node.get("data", {}).get("config", {}).get("default_query") or inputs.get("query")
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] UserQuery -> {q}"})
+        await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] UserQuery -> {q}")
     return {"query": q}
 
 async def exec_knowledgebase(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
@@ -35,7 +39,7 @@ async def exec_knowledgebase(node: Dict[str, Any], inputs: Dict[str, Any], conte
     query = inputs.get("query")
     if not query or not query.strip():
         if session_id:
-            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] No query provided to Knowledge Base"})
+            await ws_manager.log(session_id, "info", f"[{node['id']}] No query provided to Knowledge Base")
         return {"context": "", "kb_docs": []}
     
     top_k = int(node.get("data", {}).get("config", {}).get("top_k", 5))
@@ -47,79 +51,107 @@ async def exec_knowledgebase(node: Dict[str, Any], inputs: Dict[str, Any], conte
     else:
         embedding_model = node_configs.get(node["id"], {}).get("embedding_model", "text-embedding-3-large")
     
-    # Check if there's an uploaded file to process
-    uploaded_file = node_configs.get(node["id"], {}).get("uploaded_file")
-    if uploaded_file:
-        if session_id:
-            filename = uploaded_file.get('name', 'uploaded_file.pdf') if isinstance(uploaded_file, dict) else getattr(uploaded_file, 'name', 'uploaded_file.pdf')
-            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Processing uploaded file: {filename}"})
-        
+    # A document uploaded earlier (POST /api/upload) is referenced by id; an inline base64
+    # `uploaded_file` is still accepted from older clients
+    node_config = node_configs.get(node["id"], {})
+    document_id = node_config.get("document_id") or node.get("data", {}).get("config", {}).get("document_id")
+    uploaded_file = node_config.get("uploaded_file")
+    if document_id or uploaded_file:
+        filename = "uploaded_file.pdf"
+        temp_path = None
         try:
-            # Process the uploaded file
-            from ..services.processor import extract_text_from_pdf, store_document_in_chroma
-            import io
-            import base64
-            import asyncio
-            
-            # Handle base64 file data from frontend
-            if isinstance(uploaded_file, dict) and 'content' in uploaded_file:
-                # File was sent as base64 from frontend
-                file_contents = base64.b64decode(uploaded_file['content'])
-                filename = uploaded_file.get('name', 'uploaded_file.pdf')
+            already = None
+            if document_id:
+                async with AsyncSessionLocal() as db:
+                    doc = await db.get(Document, int(document_id))
+                    job = (await db.execute(
+                        select(IngestJob).where(IngestJob.document_id == int(document_id))
+                        .order_by(IngestJob.created_at.desc()).limit(1)
+                    )).scalar_one_or_none()
+                if doc is None or not doc.file_path or not os.path.exists(doc.file_path):
+                    raise Exception(f"Document {document_id} not found or its file is no longer stored")
+                source, filename, fingerprint = doc.file_path, doc.filename, doc.content_hash
+                # Documents uploaded with ingest=true are ingested by their job, in the server's default space
+                job_space = embedding_space("openai", EMBEDDING_MODEL)
+                if fingerprint and await run_blocking("vector", is_ingested, fingerprint, embedding_provider,
+                                                      embedding_api_key, embedding_model):
+                    already = "is already in the knowledge base"
+                elif (job is not None and job.status in ("queued", "running")
+                      and embedding_space(embedding_provider, embedding_model) == job_space):
+                    already = f"is being ingested by upload job {job.id}"
+            elif isinstance(uploaded_file, dict) and 'content' in uploaded_file:
+                # Decoded to disk piecewise rather than into a second in-memory copy
+                filename = uploaded_file.get('name', filename)
+                temp_path, _, fingerprint = await asyncio.to_thread(document_store.spool_base64, uploaded_file['content'])
+                source = temp_path
             else:
-                # File was sent as file object (fallback)
-                file_contents = await uploaded_file.read()
-                filename = getattr(uploaded_file, 'name', 'uploaded_file.pdf')
-            
-            # Extract text from PDF with shorter timeout
-            text = await asyncio.wait_for(
-                _run_blocking(extract_text_from_pdf, file_contents),
-                timeout=15.0  # 15 second timeout for PDF extraction
-            )
-            
-            # Store in ChromaDB with the selected embedding provider with shorter timeout
-            result = await asyncio.wait_for(
-                _run_blocking(store_document_in_chroma, filename, text, 
-                            {"description": f"Uploaded via Knowledge Base node {node['id']}"},
-                            embedding_provider, embedding_api_key, embedding_model),
-                timeout=30.0  # 30 second timeout for ChromaDB storage
-            )
-            
-            if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] File processed and stored: {result.get('stored_chunks', 0)} chunks"})
+                raise Exception("Unsupported uploaded_file format, upload the PDF and pass its document_id")
+
+            if already:
+                if session_id:
+                    await ws_manager.log(session_id, "info", f"[{node['id']}] {filename} {already}, not ingesting it again")
+            else:
+                if session_id:
+                    await ws_manager.log(session_id, "info", f"[{node['id']}] Processing uploaded file: {filename}")
+
+                loop = asyncio.get_running_loop()
+
+                def report_progress(stage, count):
+                    # Called from ingest worker threads; only stored batches are worth a message
+                    if session_id and stage == "stored":
+                        asyncio.run_coroutine_threadsafe(
+                            ws_manager.log(session_id, "info", f"[{node['id']}] Ingest progress: {count} chunks stored"),
+                            loop
+                        )
+
+                # Extract, chunk, embed and store as one streaming pipeline with the selected embedding provider
+                result = await asyncio.wait_for(
+                    run_blocking("ingest", ingest_pdf, source, filename,
+                                 {"description": f"Uploaded via Knowledge Base node {node['id']}"},
+                                 embedding_provider, embedding_api_key, embedding_model, report_progress, fingerprint),
+                    timeout=45.0  # 45 second timeout for extraction and ChromaDB storage
+                )
             
+                if session_id:
+                    if result.get("duplicate"):
+                        await ws_manager.log(session_id, "info", f"[{node['id']}] {filename} is already in the knowledge base")
+                    else:
+                        await ws_manager.log(session_id, "info", f"[{node['id']}] File processed and stored: {result.get('stored_chunks', 0)} chunks"
+                                             f" ({result.get('skipped_chunks', 0)} already present)")
+
             # Clear the uploaded file from config to prevent re-processing
-            if node["id"] in node_configs:
+            if uploaded_file and node["id"] in node_configs:
                 node_configs[node["id"]]["uploaded_file"] = None
             
         except asyncio.TimeoutError:
-            error_msg = f"File processing timeout for {filename if 'filename' in locals() else 'uploaded file'}"
+            error_msg = f"File processing timeout for {filename}"
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] {error_msg}"})
+                await ws_manager.log(session_id, "error", f"[{node['id']}] {error_msg}")
             logger.warning(error_msg)
         except Exception as e:
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] File processing error: {str(e)}"})
+                await ws_manager.log(session_id, "error", f"[{node['id']}] File processing error: {str(e)}")
             # Continue with query processing even if file upload fails
+        finally:
+            document_store.discard(temp_path)
     
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] KB searching top {top_k} for query..."})
+        await ws_manager.log(session_id, "info", f"[{node['id']}] KB searching top {top_k} for query...")
     
     # Use the provided API key for embeddings with the selected provider
     from ..core.embeddings import embed_texts_with_provider
     emb = None
     try:
         # Add a timeout wrapper to prevent hanging
-        import asyncio
         emb = await asyncio.wait_for(
-            _run_blocking(embed_texts_with_provider, embedding_api_key, [query], embedding_provider, embedding_model),
+            run_blocking("provider", embed_texts_with_provider, embedding_api_key, [query], embedding_provider, embedding_model),
             timeout=10.0  # 10 second timeout for embedding calls
         )
         
         # Validate embeddings
         if not emb or len(emb) == 0 or not emb[0]:
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Empty embeddings received from {embedding_provider}"})
+                await ws_manager.log(session_id, "info", f"[{node['id']}] Empty embeddings received from {embedding_provider}")
             emb = None
     except asyncio.TimeoutError:
         error_msg = "Embedding request timed out after 10 seconds. The Gemini API may be slow or unavailable. Please try again."
@@ -151,23 +183,25 @@ async def exec_knowledgebase(node: Dict[str, Any], inputs: Dict[str, Any], conte
     if not emb or len(emb) == 0:
         docs = []
         if session_id:
-            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] No embeddings generated for query"})
+            await ws_manager.log(session_id, "info", f"[{node['id']}] No embeddings generated for query")
     else:
         try:
-            client = get_or_create_collection(coll_name)
+            client = await run_blocking("vector", get_or_create_collection, coll_name)
             q_emb = emb[0]
             
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Querying ChromaDB with {len(q_emb)}-dim embedding"})
+                await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] Querying ChromaDB with {len(q_emb)}-dim embedding")
             
             # Check if collection has any documents
-            collection_count = client.count()
+            collection_count = await run_blocking("vector", client.count)
             if collection_count == 0:
                 if session_id:
-                    await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] ChromaDB collection is empty, no documents to search"})
+                    await ws_manager.log(session_id, "info", f"[{node['id']}] ChromaDB collection is empty, no documents to search")
                 docs = []
             else:
-                res = await _run_blocking(client.query, query_embeddings=[q_emb], n_results=top_k, include=["documents","metadatas"])
+                # Over-fetch so top_k remain once near-duplicate chunks are collapsed
+                n_results = min(collection_count, top_k * max(1, KB_DEDUP_OVERFETCH))
+                res = await run_blocking("vector", client.query, query_embeddings=[q_emb], n_results=n_results, include=["documents","metadatas"])
                 docs = []
                 
                 # Handle different response formats from ChromaDB
@@ -187,20 +221,20 @@ async def exec_knowledgebase(node: Dict[str, Any], inputs: Dict[str, Any], conte
                         docs = res
                 
                 if session_id:
-                    await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] ChromaDB query returned {len(docs)} documents"})
+                    await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] ChromaDB query returned {len(docs)} documents")
                     
         except Exception as e:
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] ChromaDB query error: {str(e)}"})
+                await ws_manager.log(session_id, "error", f"[{node['id']}] ChromaDB query error: {str(e)}")
             logger.error(f"ChromaDB query error: {e}")
             docs = []
     
-    # Filter out empty documents
-    docs = [doc for doc in docs if doc and doc.strip()]
+    # Filter out empty documents and collapse near-duplicates, keeping the best-ranked of each
+    docs = collapse_near_duplicates([doc for doc in docs if doc and doc.strip()], top_k)
     
     kb_context = "\n\n".join(docs) if docs else ""
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] KB retrieved {len(docs)} chunks, context length: {len(kb_context)} chars"})
+        await ws_manager.log(session_id, "info", f"[{node['id']}] KB retrieved {len(docs)} chunks, context length: {len(kb_context)} chars")
     
     # Return only context - query should come directly from User Query to LLM
     result = {
@@ -209,8 +243,8 @@ async def exec_knowledgebase(node: Dict[str, Any], inputs: Dict[str, Any], conte
     }
     
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] KB output: {list(result.keys())}"})
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Context length: {len(kb_context)} chars"})
+        await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] KB output: {list(result.keys())}")
+        await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] Context length: {len(kb_context)} chars")
     
     return result
 
@@ -227,7 +261,7 @@ async def exec_websearch(node: Dict[str, Any], inputs: Dict[str, Any], context:
     query = inputs.get("query")
     if not query or not query.strip():
         if session_id:
-            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] No query provided to Web Search"})
+            await ws_manager.log(session_id, "info", f"[{node['id']}] No query provided to Web Search")
         return {"web_results": [], "context": ""}
     
     search_query = node.get("data", {}).get("config", {}).get("search_query") or query
@@ -235,7 +269,7 @@ async def exec_websearch(node: Dict[str, Any], inputs: Dict[str, Any], context:
     num_results = int(node.get("data", {}).get("config", {}).get("num_results", 5))
     
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] WebSearch for query: {search_query}"})
+        await ws_manager.log(session_id, "info", f"[{node['id']}] WebSearch for query: {search_query}")
     
     try:
         # Implement actual SERP API call
@@ -254,7 +288,7 @@ async def exec_websearch(node: Dict[str, Any], inputs: Dict[str, Any], context:
         
         # Add timeout and error handling
         response = await asyncio.wait_for(
-            _run_blocking(requests.get, url, params=params),
+            run_blocking("provider", requests.get, url, params=params),
             timeout=15.0  # 15 second timeout
         )
         
@@ -284,7 +318,7 @@ async def exec_websearch(node: Dict[str, Any], inputs: Dict[str, Any], context:
                     results.append(f"No specific results found for '{search_query}'")
             
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] WebSearch found {len(results)} results"})
+                await ws_manager.log(session_id, "info", f"[{node['id']}] WebSearch found {len(results)} results")
             
             return {"web_results": results, "context": "\n\n".join(results)}
             
@@ -343,22 +377,28 @@ async def exec_llm(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[s
     # Since we now have a single input handle, we need to collect all inputs
     user_prompt_parts = []
     
-    # Get chat history for context
+    # Get chat history for context; server-side memory has already fitted it to a token budget
     chat_history = context.get("chat_history", [])
+    history_summary = context.get("history_summary", "")
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Chat history received: {len(chat_history)} messages"})
+        await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] Chat history received: {len(chat_history)} messages")
     
+    if history_summary:
+        user_prompt_parts.append(f"Summary of earlier conversation:\n{history_summary}")
     if chat_history:
+        if not MEMORY_ENABLED:
+            # Client-sent history is not budgeted by the server
+            chat_history = conversation_memory.fit_messages(chat_history)
         # Format chat history for context
         history_context = "Previous conversation:\n"
-        for msg in chat_history[-6:]:  # Keep last 6 messages for context
+        for msg in chat_history:
             role = "User" if msg.get("role") == "user" else "Assistant"
             content = msg.get("content", "")
             history_context += f"{role}: {content}\n"
         user_prompt_parts.append(history_context)
         
         if session_id:
-            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] History context: {history_context[:200]}..."})
+            await ws_manager.log(session_id, "trace", lambda: f"[{node['id']}] History context: {history_context[:200]}...")
     
     # Get query from User Query component
     query = inputs.get("query", "")
@@ -370,17 +410,18 @@ async def exec_llm(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[s
     if context_data:
         user_prompt_parts.append(f"CONTEXT: {context_data}")
         if session_id:
-            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Received context from Knowledge Base: {len(context_data)} chars"})
+            await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] Received context from Knowledge Base: {len(context_data)} chars")
     else:
         if session_id:
-            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] No context received from Knowledge Base"})
+            await ws_manager.log(session_id, "debug", f"[{node['id']}] No context received from Knowledge Base")
     
     # Debug: Show all inputs received by LLM
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] LLM inputs: {list(inputs.keys())}"})
+        await ws_manager.log(session_id, "debug", lambda: f"[{node['id']}] LLM inputs: {list(inputs.keys())}")
+    if ws_manager.wants(session_id, "trace"):
         for key, value in inputs.items():
             if value:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Input '{key}': {type(value)} with {len(str(value))} chars"})
+                await ws_manager.log(session_id, "trace", lambda: f"[{node['id']}] Input '{key}': {type(value)} with {len(str(value))} chars")
     
     # Get web results from Web Search component
     web_results = inputs.get("web_results", "")
@@ -399,29 +440,20 @@ async def exec_llm(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[s
     prompt = "\n\n".join(user_prompt_parts) if user_prompt_parts else "Please provide a response."
 
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] LLM starting (provider={provider}, streaming={streaming})"})
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] System prompt: {system_prompt}"})
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Final prompt: {prompt[:300]}..."})
+        await ws_manager.log(session_id, "info", f"[{node['id']}] LLM starting (provider={provider}, streaming={streaming})")
+        await ws_manager.log(session_id, "trace", lambda: f"[{node['id']}] System prompt: {system_prompt}")
+        await ws_manager.log(session_id, "trace", lambda: f"[{node['id']}] Final prompt: {prompt[:300]}...")
 
     if streaming:
         stream_iter = None
+        coalescer = TokenCoalescer(ws_manager.send, session_id, node["id"]) if session_id else None
         try:
-            stream_iter = ask_llm_with_key(api_key, provider, streaming=True, system=system_prompt, prompt=prompt, temperature=temperature, max_tokens=max_tokens)
+            stream_iter = astream_llm_with_key(api_key, provider, system=system_prompt, prompt=prompt, temperature=temperature, max_tokens=max_tokens)
             final_text = ""
             token_count = 0
             max_tokens_limit = 5000  # Safety limit
-            import time
-            start_time = time.time()
-            max_duration = 60  # 60 second timeout for LLM streaming
-            
-            for event in stream_iter:
-                # Safety checks to prevent infinite loops
-                if time.time() - start_time > max_duration:
-                    logger.warning(f"LLM streaming timeout after {max_duration}s, breaking")
-                    if session_id:
-                        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] LLM streaming timeout after {max_duration}s"})
-                    break
-                
+
+            async for event in stream_iter:
                 if not isinstance(event, dict):
                     continue
                 if event.get("type") == "token":
@@ -431,23 +463,26 @@ async def exec_llm(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[s
                     if token_count > max_tokens_limit:
                         logger.warning(f"LLM streaming: Too many tokens ({token_count}), breaking")
                         if session_id:
-                            await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] LLM streaming: Too many tokens, breaking"})
+                            await ws_manager.log(session_id, "info", f"[{node['id']}] LLM streaming: Too many tokens, breaking")
                         break
-                    if session_id:
-                        await ws_manager.send(session_id, {"type":"token", "node_id": node["id"], "token": token})
+                    if coalescer:
+                        await coalescer.push(token)
                 elif event.get("type") == "done":
                     final_text = event.get("text", final_text)
                     if session_id:
+                        await coalescer.flush()
                         await ws_manager.send(session_id, {"type":"done", "node_id": node["id"], "text": final_text})
                     break
                 elif event.get("type") == "error":
                     err = event.get("error")
                     if session_id:
+                        await coalescer.flush()
                         await ws_manager.send(session_id, {"type":"error", "node_id": node["id"], "error": err})
                     raise Exception(err)
             
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] LLM streaming complete (len={len(final_text)}, tokens={token_count})"})
+                await coalescer.flush()
+                await ws_manager.log(session_id, "info", f"[{node['id']}] LLM streaming complete (len={len(final_text)}, tokens={token_count}, frames={coalescer.frames})")
             return {"output": final_text}
         except Exception as e:
             logger.exception("Streaming LLM failed")
@@ -467,11 +502,11 @@ async def exec_llm(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[s
             raise Exception(error_msg)
         finally:
             # Cleanup streaming resources
+            if coalescer:
+                await coalescer.aclose()
             if stream_iter:
                 try:
-                    # Close the stream iterator if it has a close method
-                    if hasattr(stream_iter, 'close'):
-                        stream_iter.close()
+                    await stream_iter.aclose()
                 except Exception:
                     pass
     else:
@@ -479,11 +514,11 @@ async def exec_llm(node: Dict[str, Any], inputs: Dict[str, Any], context: Dict[s
             # Add timeout for non-streaming calls
             import asyncio
             text = await asyncio.wait_for(
-                _run_blocking(ask_llm_with_key, api_key, provider, False, system=system_prompt, prompt=prompt, temperature=temperature, max_tokens=max_tokens),
+                run_blocking("provider", ask_llm_with_key, api_key, provider, False, system=system_prompt, prompt=prompt, temperature=temperature, max_tokens=max_tokens),
                 timeout=60.0  # 60 second timeout
             )
             if session_id:
-                await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] LLM finished (non-streaming)"})
+                await ws_manager.log(session_id, "info", f"[{node['id']}] LLM finished (non-streaming)")
             return {"output": text}
         except Exception as e:
             logger.exception("Non-streaming LLM error")
@@ -507,13 +542,13 @@ async def exec_output(node, inputs, context):
     session_id = context.get("session_id")
     
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Output node processing"})
+        await ws_manager.log(session_id, "debug", f"[{node['id']}] Output node processing")
     
     # Get the final output from the inputs
     final_output = inputs.get("output") or inputs.get("context") or inputs.get("input", "")
     
     if session_id:
-        await ws_manager.send(session_id, {"type":"log","message":f"[{node['id']}] Output: {final_output[:100]}..."})
+        await ws_manager.log(session_id, "trace", lambda: f"[{node['id']}] Output: {final_output[:100]}...")
     
     return {"final": final_output}
 
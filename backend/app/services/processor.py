@@ -1,128 +1,484 @@
-import fitz
-import uuid
+import hashlib
+import mmap
+import queue
+import re
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, Optional, Union
 from ..core.chroma_client import get_or_create_collection
-from ..core.embeddings import embed_texts, embed_texts_with_provider
+from ..core.embeddings import EMBEDDING_MODEL, embed_texts, embed_texts_with_provider
+from ..core.executors import executors
 import os
 from loguru import logger
 
 CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "kb_collection")
 
-def extract_text_from_pdf(file_bytes: bytes):
-    """Extract text from PDF with memory optimization"""
-    doc = None
+# Ingestion limits; 0 means unlimited. Documents over a limit are rejected, never truncated.
+INGEST_MAX_PAGES = int(os.getenv("INGEST_MAX_PAGES", "0"))
+INGEST_MAX_CHARS = int(os.getenv("INGEST_MAX_CHARS", "0"))
+INGEST_MAX_CHUNKS = int(os.getenv("INGEST_MAX_CHUNKS", "0"))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "50"))
+# Batches allowed to wait between two pipeline stages before the producer blocks
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))
+# Pages extracted per task on the "pdf" process pool
+PDF_PAGE_BATCH = int(os.getenv("PDF_PAGE_BATCH", "16"))
+# Smaller documents are extracted in the calling thread; IPC would cost more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+# Where documents are spooled for the extraction workers (None: the system temp dir)
+PDF_TEMP_DIR = os.getenv("PDF_TEMP_DIR") or None
+# Retrieved chunks whose word overlap (Jaccard of 3-word shingles) reaches this are collapsed; 0 disables
+KB_DEDUP_THRESHOLD = float(os.getenv("KB_DEDUP_THRESHOLD", "0.85"))
+# Query results fetched per requested chunk, so top_k remain after duplicates are collapsed
+KB_DEDUP_OVERFETCH = int(os.getenv("KB_DEDUP_OVERFETCH", "2"))
+
+class IngestLimitExceeded(ValueError):
+    pass
+
+def embedding_space(provider: Optional[str], model: Optional[str]) -> str:
+    """Vectors are only comparable within one provider and model; ids and lookups are scoped by it"""
+    return f"{(provider or 'openai').lower()}:{model or 'default'}"
+
+def chunk_id(text: str, space: str) -> str:
+    """
+    Deterministic chunk id: a hash of the whitespace-normalised text within an embedding
+    space. The same passage from any document, or from re-ingesting a document, maps to
+    the same id and is stored once.
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{space}\0{normalized}".encode("utf-8")).hexdigest()
+
+ProgressCallback = Callable[[str, int], None]
+
+# A PDF as bytes in memory or as the path of a file on disk
+PdfSource = Union[bytes, str]
+
+def _open_pdf(source):
+    import fitz  # PyMuPDF is heavy; only ingestion needs it
+    if isinstance(source, str):
+        # MuPDF reads pages from the file as they are needed
+        return fitz.open(source, filetype="pdf")
+    return fitz.open(stream=source, filetype="pdf")
+
+def _pdf_page_texts(doc, start: int, stop: int) -> List[str]:
+    return [doc[page_num].get_text("text") for page_num in range(start, min(stop, doc.page_count))]
+
+def extract_pages(path: str, start: int, stop: int) -> List[str]:
+    """
+    Text of pages [start, stop) of the PDF at `path`. Runs in a "pdf" pool worker process:
+    the file is memory-mapped, so workers share the page cache instead of each receiving
+    a pickled copy of the document.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        doc = _open_pdf(view)
+        try:
+            return _pdf_page_texts(doc, start, stop)
+        finally:
+            doc.close()
+            view.release()
+
+@contextmanager
+def _pdf_file(source: PdfSource) -> Iterator[str]:
+    """A path the worker processes can map; in-memory PDFs are written once to a temp file"""
+    if isinstance(source, str):
+        yield source
+        return
+    fd, path = tempfile.mkstemp(suffix=".pdf", dir=PDF_TEMP_DIR)
     try:
-        doc = fitz.open(stream=file_bytes, filetype="pdf")
-        texts = []
-        
-        # Process pages one by one to avoid memory issues
-        for page_num in range(doc.page_count):
-            page = doc[page_num]
-            text = page.get_text("text")
-            if text.strip():  # Only add non-empty pages
-                texts.append(text)
-            
-            # Clear page from memory after processing
-            page = None
-            
-            # Limit to reasonable number of pages to prevent OOM
-            if page_num >= 100:  # Max 100 pages
-                logger.warning(f"PDF has {doc.page_count} pages, processing only first 100 to prevent memory issues")
-                break
-        
-        return "\n".join(texts)
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        yield path
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+def _parallel_batches(source: PdfSource, page_count: int) -> Iterator[List[str]]:
+    """
+    Page batches in document order. Up to twice as many batches as there are pool
+    workers are in flight, so all cores stay busy while the consumer works through
+    the oldest batch and memory stays bounded for very long documents.
+    """
+    pool = executors["pdf"]
+    ranges = [(start, min(start + PDF_PAGE_BATCH, page_count)) for start in range(0, page_count, PDF_PAGE_BATCH)]
+    window = max(2, pool.max_workers * 2)
+    with _pdf_file(source) as path:
+        in_flight = deque()
+        try:
+            for start, stop in ranges:
+                if len(in_flight) >= window:
+                    yield in_flight.popleft().result()
+                in_flight.append(pool.submit(extract_pages, path, start, stop))
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            # The consumer stopped early (limit hit, error): drop batches not started yet
+            for future in in_flight:
+                future.cancel()
+
+def iter_pdf_pages(source: PdfSource, max_pages: int = INGEST_MAX_PAGES) -> Iterator[str]:
+    """
+    Yield the text of each non-empty page in page order. Documents of at least
+    PDF_PARALLEL_MIN_PAGES pages are split into page ranges extracted in parallel on
+    the "pdf" process pool; smaller ones are read in this thread.
+    """
+    try:
+        doc = _open_pdf(source)
+        try:
+            page_count = doc.page_count
+            if max_pages and page_count > max_pages:
+                raise IngestLimitExceeded(f"PDF has {page_count} pages, limit is {max_pages}")
+            parallel = executors["pdf"].enabled and page_count >= PDF_PARALLEL_MIN_PAGES
+            if not parallel:
+                for page_num in range(page_count):
+                    text = doc[page_num].get_text("text")
+                    if text.strip():  # Only yield non-empty pages
+                        yield text
+                return
+        finally:
+            doc.close()
+        batches = _parallel_batches(source, page_count)
+        try:
+            for batch in batches:
+                for text in batch:
+                    if text.strip():
+                        yield text
+        finally:
+            batches.close()
+    except IngestLimitExceeded:
+        raise
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}")
         raise
-    finally:
-        if doc:
-            doc.close()
+
+def extract_text_from_pdf(source: PdfSource):
+    """Extract the whole text of a PDF; prefer iter_pdf_pages for large documents"""
+    return "\n".join(iter_pdf_pages(source))
+
+def iter_chunks(pages: Iterable[str], chunk_size: int = 1000, overlap: int = 200,
+                max_chars: int = INGEST_MAX_CHARS) -> Iterator[str]:
+    """
+    Chunk a stream of page texts into overlapping windows. Pages are joined with
+    newlines, as extract_text_from_pdf does, but only about one chunk plus one page
+    is held at a time.
+    """
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError("chunk_size must be larger than overlap")
+
+    buffer = ""
+    total_chars = 0
+    first = True
+    for page in pages:
+        piece = page if first else "\n" + page
+        first = False
+        total_chars += len(piece)
+        if max_chars and total_chars > max_chars:
+            raise IngestLimitExceeded(f"Document text exceeds {max_chars} characters")
+        buffer += piece
+        # Emit only windows that are followed by more text; the tail is handled below
+        while len(buffer) > chunk_size:
+            chunk = buffer[:chunk_size]
+            if chunk.strip():
+                yield chunk
+            buffer = buffer[step:]
+
+    if buffer.strip():
+        yield buffer
 
 def chunk_text(text, chunk_size=1000, overlap=200):
-    """Chunk text with memory optimization"""
-    if not text or len(text) == 0:
+    """Chunk text into overlapping windows"""
+    if not text:
         return []
-    
-    # Limit text size to prevent memory issues
-    max_text_size = 500000  # 500KB limit
-    if len(text) > max_text_size:
-        logger.warning(f"Text size {len(text)} exceeds limit, truncating to {max_text_size} chars")
-        text = text[:max_text_size]
-    
-    out = []
-    start = 0
-    n = len(text)
-    
-    while start < n:
-        end = min(start + chunk_size, n)
-        chunk = text[start:end]
-        if chunk.strip():  # Only add non-empty chunks
-            out.append(chunk)
-        start = end - overlap
-        if start < 0:
-            start = 0
-    return out
+    return list(iter_chunks([text], chunk_size, overlap, max_chars=0))
 
-def store_document_in_chroma(filename: str, text: str, metadata: dict = None, 
-                           embedding_provider: str = "openai", embedding_api_key: str = None, 
-                           embedding_model: str = None):
-    """Store document in ChromaDB with memory optimization"""
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+_DONE = object()
+
+def _stage(source: Iterable, out: "queue.Queue", failed: threading.Event, errors: list):
+    """Drain `source` into a bounded queue from a worker thread, forwarding any error"""
     try:
-        chunks = chunk_text(text, chunk_size=1000, overlap=200)
-        
-        if not chunks:
-            logger.warning("No chunks to store")
-            return {"stored_chunks": 0}
-        
-        # Limit number of chunks to prevent memory issues
-        max_chunks = 200
-        if len(chunks) > max_chunks:
-            logger.warning(f"Document has {len(chunks)} chunks, limiting to {max_chunks} to prevent memory issues")
-            chunks = chunks[:max_chunks]
-        
-        ids = [f"{uuid.uuid4()}" for _ in chunks]
-        metadatas = [{"source": filename, "chunk_idx": idx, **(metadata or {})} for idx in range(len(chunks))]
-        
-        # Process embeddings in smaller batches to avoid memory issues
-        batch_size = 50  # Process 50 chunks at a time
-        all_embeddings = []
-        
-        for i in range(0, len(chunks), batch_size):
-            batch_chunks = chunks[i:i + batch_size]
-            
+        for item in source:
+            while True:
+                if failed.is_set():
+                    return
+                try:
+                    out.put(item, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+    except BaseException as e:
+        errors.append(e)
+        failed.set()
+    finally:
+        while True:
+            try:
+                out.put(_DONE, timeout=0.5)
+                return
+            except queue.Full:
+                if failed.is_set():
+                    return
+
+def _drain(q: "queue.Queue", failed: threading.Event, errors: list) -> Iterator:
+    while True:
+        try:
+            item = q.get(timeout=0.5)
+        except queue.Empty:
+            if failed.is_set():
+                break
+            continue
+        if item is _DONE:
+            break
+        yield item
+    if errors:
+        raise errors[0]
+
+def _space_for(embedding_provider: Optional[str], embedding_api_key: Optional[str], embedding_model: Optional[str]) -> str:
+    # Without a key the pipeline falls back to embed_texts, i.e. OpenAI with the configured model
+    if embedding_api_key and embedding_provider:
+        return embedding_space(embedding_provider, embedding_model)
+    return embedding_space("openai", EMBEDDING_MODEL)
+
+def _with_source(meta: dict, filename: str, fingerprint: Optional[str]) -> dict:
+    """
+    Chunk metadata with this document added to its sources. A chunk is stored once per
+    embedding space however many documents contain it, so it lists all of them
+    rather than the first one ingested.
+    """
+    sources = list(meta.get("sources") or [])
+    if filename not in sources:
+        sources.append(filename)
+    merged = {**meta, "sources": sources}
+    if fingerprint:
+        hashes = list(meta.get("doc_hashes") or [])
+        if fingerprint not in hashes:
+            hashes.append(fingerprint)
+        merged["doc_hashes"] = hashes
+    return merged
+
+def ingest_pages(pages: Iterable[str], filename: str, metadata: dict = None,
+                 embedding_provider: str = "openai", embedding_api_key: str = None,
+                 embedding_model: str = None, progress: Optional[ProgressCallback] = None,
+                 max_chunks: int = INGEST_MAX_CHUNKS, fingerprint: Optional[str] = None):
+    """
+    Streaming ingestion: pages -> chunks -> embedding batches -> collection.upsert batches.
+    Each stage runs in its own thread connected by bounded queues, so peak memory depends
+    on INGEST_QUEUE_DEPTH and the batch size, not on the document size. Chunks already in
+    the collection for this embedding space are neither embedded nor stored again.
+    """
+    report = progress or (lambda stage, count: None)
+    counts = {"pages": 0, "chunks": 0, "embedded": 0, "stored": 0, "skipped": 0}
+    failed = threading.Event()
+    errors: list = []
+    chunk_q: "queue.Queue" = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+    embed_q: "queue.Queue" = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+    space = _space_for(embedding_provider, embedding_api_key, embedding_model)
+    coll = get_or_create_collection(CHROMA_COLLECTION)
+
+    def counted_pages():
+        for page in pages:
+            counts["pages"] += 1
+            report("pages", counts["pages"])
+            yield page
+
+    def chunk_batches():
+        for batch in _batched(iter_chunks(counted_pages()), INGEST_EMBED_BATCH_SIZE):
+            counts["chunks"] += len(batch)
+            if max_chunks and counts["chunks"] > max_chunks:
+                raise IngestLimitExceeded(f"Document produces more than {max_chunks} chunks")
+            report("chunks", counts["chunks"])
+            yield batch
+
+    seen = set()
+    # Stored chunks this document shares with others: (id, metadata) to add it to as a source
+    shared: List[tuple] = []
+
+    def new_chunks(batch: List[str], offset: int):
+        """
+        (texts, ids, positions, stored metadatas) of the chunks not repeated in this
+        document and not already stored with a real embedding
+        """
+        fresh = []
+        for i, text in enumerate(batch):
+            cid = chunk_id(text, space)
+            if cid not in seen:
+                seen.add(cid)
+                fresh.append((text, cid, offset + i))
+        stored = {}
+        if fresh:
+            found = coll.get(ids=[cid for _, cid, _ in fresh], include=["metadatas"])
+            stored = {cid: meta or {} for cid, meta in zip(found["ids"], found["metadatas"])}
+            kept = []
+            for item in fresh:
+                meta = stored.get(item[1])
+                # Chunks stored with fallback zero vectors are embedded again
+                if meta is None or meta.get("zero_vector"):
+                    kept.append(item)
+                elif _with_source(meta, filename, fingerprint) != meta:
+                    shared.append((item[1], meta))
+            fresh = kept
+        counts["skipped"] += len(batch) - len(fresh)
+        return ([t for t, _, _ in fresh], [c for _, c, _ in fresh], [p for _, _, p in fresh],
+                [stored.get(c) for _, c, _ in fresh])
+
+    def embedded_batches():
+        dim = None
+        offset = 0
+        for batch_no, raw in enumerate(_drain(chunk_q, failed, errors), start=1):
+            batch, ids, positions, previous = new_chunks(raw, offset)
+            offset += len(raw)
+            if not batch:
+                continue
             try:
                 if embedding_api_key and embedding_provider:
-                    batch_embeddings = embed_texts_with_provider(embedding_api_key, batch_chunks, embedding_provider, embedding_model)
+                    vectors = embed_texts_with_provider(embedding_api_key, batch, embedding_provider, embedding_model)
                 else:
-                    batch_embeddings = embed_texts(batch_chunks)
-                
-                if batch_embeddings and len(batch_embeddings) > 0:
-                    all_embeddings.extend(batch_embeddings)
-                else:
-                    logger.warning(f"Empty embeddings for batch {i//batch_size + 1}")
-                    # Create zero embeddings as fallback
-                    zero_embeddings = [[0.0] * 1536 for _ in batch_chunks]  # 1536 is common embedding dimension
-                    all_embeddings.extend(zero_embeddings)
-                
-                # Clear batch from memory
-                batch_chunks = None
-                batch_embeddings = None
-                
+                    vectors = embed_texts(batch)
+                if not vectors or len(vectors) != len(batch):
+                    logger.warning(f"Empty embeddings for batch {batch_no}")
+                    vectors = None
             except Exception as e:
-                logger.error(f"Error processing batch {i//batch_size + 1}: {e}")
-                # Create zero embeddings as fallback
-                zero_embeddings = [[0.0] * 1536 for _ in batch_chunks]
-                all_embeddings.extend(zero_embeddings)
-        
-        if len(all_embeddings) != len(chunks):
-            logger.error(f"Embedding count mismatch: {len(all_embeddings)} vs {len(chunks)}")
-            return {"stored_chunks": 0, "error": "Embedding generation failed"}
-        
-        coll = get_or_create_collection(CHROMA_COLLECTION)
-        coll.add(documents=chunks, metadatas=metadatas, ids=ids, embeddings=all_embeddings)
-        
-        logger.info(f"Successfully stored {len(chunks)} chunks for {filename}")
-        return {"stored_chunks": len(chunks)}
-        
+                logger.error(f"Error processing batch {batch_no}: {e}")
+                vectors = None
+            zero = vectors is None
+            if zero:
+                # Zero embeddings as fallback so the text is still stored
+                vectors = [[0.0] * (dim or 1536) for _ in batch]
+            dim = len(vectors[0])
+            counts["embedded"] += len(batch)
+            report("embedded", counts["embedded"])
+            yield batch, ids, positions, previous, vectors, zero
+
+    threads = [
+        threading.Thread(target=_stage, args=(chunk_batches(), chunk_q, failed, errors), daemon=True),
+        threading.Thread(target=_stage, args=(embedded_batches(), embed_q, failed, errors), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    # Chunks this run created, and pre-existing (zero-vector) ones it overwrote with their old metadata
+    created: List[str] = []
+    replaced: List[tuple] = []
+    try:
+        for batch, ids, positions, previous, vectors, zero in _drain(embed_q, failed, errors):
+            metadatas = [_with_source({
+                **(metadata or {}),
+                **(prev or {}),
+                "chunk_idx": (prev or {}).get("chunk_idx", pos),
+                "embedding_space": space,
+                "zero_vector": zero,
+            }, filename, fingerprint) for pos, prev in zip(positions, previous)]
+            # upsert: replaces zero-vector chunks, and tolerates a concurrent ingest of the same text
+            coll.upsert(documents=batch, metadatas=metadatas, ids=ids, embeddings=vectors)
+            for cid, prev in zip(ids, previous):
+                if prev is None:
+                    created.append(cid)
+                else:
+                    replaced.append((cid, prev))
+            counts["stored"] += len(batch)
+            report("stored", counts["stored"])
+    except BaseException:
+        failed.set()
+        # Don't leave a partially ingested document behind, but keep chunks other documents own
+        try:
+            if created:
+                coll.delete(ids=created)
+            for start in range(0, len(replaced), INGEST_EMBED_BATCH_SIZE):
+                batch = replaced[start:start + INGEST_EMBED_BATCH_SIZE]
+                coll.update(ids=[cid for cid, _ in batch], metadatas=[prev for _, prev in batch])
+        except Exception as e:
+            logger.error(f"Failed to roll back partial ingest of {filename}: {e}")
+        raise
+    finally:
+        for t in threads:
+            t.join(timeout=5)
+
+    for start in range(0, len(shared), INGEST_EMBED_BATCH_SIZE):
+        batch = shared[start:start + INGEST_EMBED_BATCH_SIZE]
+        coll.update(ids=[cid for cid, _ in batch],
+                    metadatas=[_with_source(meta, filename, fingerprint) for _, meta in batch])
+
+    if counts["stored"] == 0 and counts["skipped"] == 0:
+        logger.warning("No chunks to store")
+    else:
+        logger.info(f"Stored {counts['stored']} chunks for {filename} ({counts['pages']} pages), "
+                    f"{counts['skipped']} already present")
+    return {"stored_chunks": counts["stored"], "skipped_chunks": counts["skipped"], "pages": counts["pages"]}
+
+def is_ingested(fingerprint: str, embedding_provider: str = "openai", embedding_api_key: str = None,
+                embedding_model: str = None) -> bool:
+    """
+    Whether a document with this content hash is fully ingested in this space: it has
+    chunks, and none of them is still waiting on a real embedding (zero_vector)
+    """
+    coll = get_or_create_collection(CHROMA_COLLECTION)
+    space = _space_for(embedding_provider, embedding_api_key, embedding_model)
+    scope = [{"doc_hashes": {"$contains": fingerprint}}, {"embedding_space": space}]
+    if coll.get(where={"$and": scope + [{"zero_vector": True}]}, limit=1, include=[])["ids"]:
+        # Ingest again: chunks already embedded are skipped, only the zero-vector ones are redone
+        return False
+    return bool(coll.get(where={"$and": scope}, limit=1, include=[])["ids"])
+
+def ingest_pdf(source: PdfSource, filename: str, metadata: dict = None,
+               embedding_provider: str = "openai", embedding_api_key: str = None,
+               embedding_model: str = None, progress: Optional[ProgressCallback] = None,
+               fingerprint: Optional[str] = None):
+    """
+    Extract, chunk, embed and store a PDF (bytes or a file path) as one streaming pipeline.
+    With a fingerprint (content hash) a document already ingested in this embedding space
+    is skipped without being read.
+    """
+    if fingerprint and is_ingested(fingerprint, embedding_provider, embedding_api_key, embedding_model):
+        logger.info(f"{filename} is already ingested, skipping")
+        return {"stored_chunks": 0, "skipped_chunks": 0, "pages": 0, "duplicate": True}
+    return ingest_pages(iter_pdf_pages(source), filename, metadata,
+                        embedding_provider, embedding_api_key, embedding_model, progress,
+                        fingerprint=fingerprint)
+
+def _shingles(text: str) -> set:
+    # Case, whitespace and punctuation differences do not make a chunk distinct
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+def collapse_near_duplicates(docs: List[str], limit: int, threshold: float = KB_DEDUP_THRESHOLD) -> List[str]:
+    """
+    Keep retrieved chunks in rank order, dropping any whose 3-word shingles overlap an
+    already kept chunk by at least `threshold` (Jaccard), until `limit` are kept.
+    """
+    kept: List[str] = []
+    kept_shingles: List[set] = []
+    for doc in docs:
+        if len(kept) >= limit:
+            break
+        shingles = _shingles(doc)
+        if threshold > 0 and any(len(shingles & other) / (len(shingles | other) or 1) >= threshold
+                                 for other in kept_shingles):
+            continue
+        kept.append(doc)
+        kept_shingles.append(shingles)
+    return kept
+
+def store_document_in_chroma(filename: str, text: str, metadata: dict = None, 
+                           embedding_provider: str = "openai", embedding_api_key: str = None, 
+                           embedding_model: str = None, progress: Optional[ProgressCallback] = None):
+    """Store already extracted text in ChromaDB through the streaming pipeline"""
+    try:
+        return ingest_pages([text] if text else [], filename, metadata,
+                            embedding_provider, embedding_api_key, embedding_model, progress)
     except Exception as e:
         logger.error(f"Error storing document in ChromaDB: {e}")
         raise
@@ -0,0 +1,30 @@
+import importlib
+import os
+from typing import List
+from ..core import startup_profile
+from ..core.chroma_client import get_or_create_collection
+from ..core.executors import run_blocking
+from .processor import CHROMA_COLLECTION
+from loguru import logger
+
+# Pre-open the vector store in the background once the server is accepting traffic
+WARMUP_ON_START = os.getenv("WARMUP_ON_START", "false").lower() in ("1", "true", "yes")
+# Extra SDKs to import during warm-up, comma separated (e.g. "openai,fitz")
+WARMUP_MODULES = [m.strip() for m in os.getenv("WARMUP_MODULES", "").split(",") if m.strip()]
+
+def _warm_up(modules: List[str]):
+    get_or_create_collection(CHROMA_COLLECTION)
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Warm-up could not import {name}: {e}")
+
+async def warm_up(modules: List[str] = None):
+    """Open Chroma and import the listed SDKs off the event loop; failures are only logged"""
+    try:
+        await run_blocking("vector", _warm_up, WARMUP_MODULES if modules is None else modules)
+        startup_profile.mark("warm_up_done")
+        logger.info("Warm-up finished")
+    except Exception as e:
+        logger.warning(f"Warm-up failed: {e}")
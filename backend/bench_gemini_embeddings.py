@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark Gemini embedding ingest throughput against a local fake Gemini endpoint.
+
+The fake server answers embedContent/batchEmbedContents over REST with a fixed
+per-request latency, so the numbers show the effect of batching and batches in
+flight rather than real API speed.
+
+    python bench_gemini_embeddings.py --chunks 200 --latency 0.08
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    latency = 0.08
+    requests_seen = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeGeminiHandler.requests_seen += 1
+        time.sleep(self.latency)
+        if "requests" in body:
+            texts = [r["content"]["parts"][0]["text"] for r in body["requests"]]
+            payload = {"embeddings": [{"values": [float(len(t)), float(hash(t) % 1000)]} for t in texts]}
+        else:
+            text = body["content"]["parts"][0]["text"]
+            payload = {"embedding": {"values": [float(len(text)), float(hash(text) % 1000)]}}
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.08, help="fake server seconds per request")
+    args = parser.parse_args()
+
+    FakeGeminiHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGeminiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ["GEMINI_API_ENDPOINT"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["GEMINI_TRANSPORT"] = "rest"
+    from app.core.embeddings import embed_texts_gemini
+
+    texts = [f"chunk {i} " + "lorem ipsum " * (i % 7) for i in range(args.chunks)]
+    expected = [[float(len(t)), float(hash(t) % 1000)] for t in texts]
+
+    print(f"{args.chunks} chunks, {args.latency * 1000:.0f} ms per request")
+    print(f"{'batch':>6} {'in flight':>10} {'requests':>9} {'seconds':>8} {'chunks/s':>9}")
+    for batch_size, concurrency in [(1, 1), (20, 1), (100, 1), (20, 4), (50, 4)]:
+        FakeGeminiHandler.requests_seen = 0
+        start = time.perf_counter()
+        vectors = embed_texts_gemini("bench-key", texts, batch_size=batch_size, concurrency=concurrency)
+        elapsed = time.perf_counter() - start
+        assert vectors == expected, "embedding order does not match input order"
+        print(f"{batch_size:>6} {concurrency:>10} {FakeGeminiHandler.requests_seen:>9} {elapsed:>8.2f} {len(texts) / elapsed:>9.1f}")
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark page-parallel PDF text extraction against serial extraction.
+
+Generates multi-hundred-page PDFs with PyMuPDF, extracts them once in the calling
+thread and then on "pdf" process pools of increasing size, and checks that every
+run returns the same pages in the same order. Speedup is bounded by the number of
+cores on the machine.
+
+    python bench_pdf_extraction.py --pages 200 400 --workers 1 2 4
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+def make_pdf(pages: int) -> bytes:
+    import fitz
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        # Dense small text so get_text() has real layout work to do on every page
+        lines = [f"page {page_num} line {line}: " + "lorem ipsum dolor sit amet " * 3 for line in range(60)]
+        page.insert_textbox(page.rect + (36, 36, -36, -36), "\n".join(lines), fontsize=7)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def timed(pdf: bytes):
+    from app.services.processor import iter_pdf_pages
+    start = time.perf_counter()
+    pages = list(iter_pdf_pages(pdf, max_pages=0))
+    return pages, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 400])
+    parser.add_argument("--workers", type=int, nargs="+", default=None,
+                        help="pool sizes to try (default: 1, 2, 4, ... up to the core count)")
+    args = parser.parse_args()
+
+    from app.core.executors import WorkloadPool, executors
+    from app.services import processor
+
+    cpus = os.cpu_count() or 1
+    workers = args.workers or sorted({1, *[n for n in (2, 4, 8, 16) if n <= cpus], cpus})
+    # Always take the parallel path so small pool sizes are measured too
+    processor.PDF_PARALLEL_MIN_PAGES = 1
+
+    print(f"{cpus} cores, {processor.PDF_PAGE_BATCH} pages per task")
+    print(f"{'pages':>6} {'workers':>8} {'seconds':>8} {'pages/s':>8} {'speedup':>8}")
+    for pages in args.pages:
+        pdf = make_pdf(pages)
+        executors.pools["pdf"] = WorkloadPool("pdf", "process", 0)
+        expected, serial = timed(pdf)
+        print(f"{pages:>6} {'serial':>8} {serial:>8.2f} {pages / serial:>8.1f} {1.0:>8.2f}")
+        for n in workers:
+            pool = executors.pools["pdf"] = WorkloadPool("pdf", "process", n)
+            pool.start()
+            # Spawn the workers (and their imports) before timing
+            list(pool._get_executor().map(abs, range(n)))
+            result, elapsed = timed(pdf)
+            pool.shutdown(wait=True)
+            assert result == expected, "parallel extraction changed the page text or order"
+            print(f"{pages:>6} {n:>8} {elapsed:>8.2f} {pages / elapsed:>8.1f} {serial / elapsed:>8.2f}")
+
+if __name__ == "__main__":
+    main()
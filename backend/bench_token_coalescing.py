@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Measure WebSocket frame counts and server CPU for LLM token streaming with and
+without token coalescing.
+
+Simulates concurrent sessions streaming tokens through ConnectionManager into
+fake sockets that JSON-encode every frame, the way Starlette's send_json does.
+
+    python bench_token_coalescing.py --sessions 50 --tokens 400 --interval-ms 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from loguru import logger
+from app.core.token_coalescer import TokenCoalescer
+from app.core.ws_manager import ConnectionManager
+
+logger.remove()  # keep per-connection log lines out of the report
+
+class FakeSocket:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message):
+        self.frames += 1
+        self.bytes += len(json.dumps(message).encode("utf-8"))
+
+    async def close(self, code=None):
+        pass
+
+async def stream_session(manager, session_id, tokens, interval, window_ms, max_bytes):
+    coalescer = TokenCoalescer(manager.send, session_id, "llm-1", window_ms=window_ms, max_bytes=max_bytes)
+    for i in range(tokens):
+        await coalescer.push(f" tok{i % 100}")
+        await asyncio.sleep(interval)
+    await coalescer.aclose()
+    await manager.send(session_id, {"type": "done", "node_id": "llm-1", "text": "..."})
+
+async def run(sessions, tokens, interval_ms, window_ms, max_bytes):
+    manager = ConnectionManager(max_queue=100000, policy=[])
+    sockets = []
+    for i in range(sessions):
+        ws = FakeSocket()
+        sockets.append(ws)
+        await manager.connect(f"s{i}", ws)
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(stream_session(manager, f"s{i}", tokens, interval_ms / 1000.0, window_ms, max_bytes)
+                           for i in range(sessions)))
+    while any(c.queue for cs in manager.active.values() for c in cs):
+        await asyncio.sleep(0.01)
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    for cs in list(manager.active.values()):
+        for c in cs:
+            c.writer.cancel()
+    return sum(s.frames for s in sockets), sum(s.bytes for s in sockets), cpu, wall
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="delay between tokens per session")
+    parser.add_argument("--max-bytes", type=int, default=512)
+    args = parser.parse_args()
+
+    total_tokens = args.sessions * args.tokens
+    print(f"{args.sessions} sessions x {args.tokens} tokens, one token every {args.interval_ms} ms")
+    print(f"{'window ms':>9} {'frames':>8} {'tok/frame':>9} {'KB sent':>8} {'cpu s':>7} {'wall s':>7} {'tok/cpu s':>10}")
+    for window_ms in (0, 20, 50):
+        frames, sent, cpu, wall = asyncio.run(run(args.sessions, args.tokens, args.interval_ms, window_ms, args.max_bytes))
+        print(f"{window_ms:>9} {frames:>8} {total_tokens / frames:>9.1f} {sent / 1024:>8.0f} {cpu:>7.2f} {wall:>7.2f} {total_tokens / cpu:>10.0f}")
+
+if __name__ == "__main__":
+    main()
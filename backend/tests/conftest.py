@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# Module-level settings are read at import time, so point every store at a scratch
+# directory before the first `app` import
+_scratch = tempfile.mkdtemp(prefix="flowmind-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_scratch}/test.db")
+os.environ.setdefault("CHROMA_PERSIST_DIR", os.path.join(_scratch, "chroma"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_scratch, "uploads"))
+os.environ.setdefault("CHATLOG_WRITE_MODE", "behind")
+os.environ.setdefault("EXEC_PDF_START_METHOD", "spawn")
@@ -0,0 +1,29 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.core.ws_manager import session_ref
+from app.main import app
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+def test_admin_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.get("/api/admin/sessions").status_code == 404
+    assert client.post("/api/admin/sessions/sweep").status_code == 404
+
+def test_admin_requires_matching_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/api/admin/sessions").status_code == 401
+    assert client.get("/api/admin/sessions", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.post("/api/admin/sessions/sweep", headers={"X-Admin-Token": "s3cret"}).status_code == 200
+
+def test_sessions_report_hides_session_ids(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "s3cret")
+    with client.websocket_connect("/ws/private-session-id"):
+        report = client.get("/api/admin/sessions", headers={"X-Admin-Token": "s3cret"}).json()
+    assert "private-session-id" not in str(report)
+    assert session_ref("private-session-id") in [item["session"] for item in report["items"]]
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core.backplane import BrokerAdapter, BrokerBackplane
+
+class FlakyAdapter(BrokerAdapter):
+    """The first subscription and the first reconnect fail; the one after that delivers"""
+
+    def __init__(self):
+        self.connects = 0
+        self.subscriptions = 0
+
+    async def connect(self):
+        self.connects += 1
+        if self.connects == 2:
+            raise ConnectionError("broker still down")
+
+    async def publish(self, data: bytes):
+        pass
+
+    async def listen(self):
+        self.subscriptions += 1
+        if self.subscriptions == 1:
+            raise ConnectionError("connection reset")
+        yield b"not json"
+        yield json.dumps({"op": "event", "session_id": "s1", "origin": "other"}).encode()
+        await asyncio.Event().wait()
+
+    async def close(self):
+        pass
+
+def test_listener_resubscribes_with_backoff():
+    async def scenario():
+        adapter = FlakyAdapter()
+        backplane = BrokerBackplane(adapter, retry_min=0.01, retry_max=0.02)
+        received = []
+        await backplane.start(received.append)
+        for _ in range(200):
+            if received:
+                break
+            await asyncio.sleep(0.01)
+        await backplane.close()
+        return adapter, backplane, received
+    adapter, backplane, received = asyncio.run(scenario())
+    assert [m["session_id"] for m in received] == ["s1"]
+    assert adapter.connects == 3
+    assert backplane.stats()["resubscribes"] == 1
+
+def test_adapter_must_implement_the_interface():
+    class Partial(BrokerAdapter):
+        async def connect(self):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,84 @@
+import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.workflow import decode_cursor, encode_cursor
+from app.db import SessionLocal
+from app.main import app
+from app.models import ChatLog
+from app.services.chat_log_writer import chat_log_writer
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+def make_workflow(client) -> int:
+    return client.post("/api/workflows", json={"name": "history", "nodes": [], "edges": []}).json()["workflow_id"]
+
+def add_logs(workflow_id: int, count: int, base: datetime.datetime, same_time_every: int = 3):
+    db = SessionLocal()
+    try:
+        for i in range(count):
+            # Groups of rows share a timestamp so the id tie-break is exercised
+            created = base + datetime.timedelta(seconds=i // same_time_every)
+            db.add(ChatLog(workflow_id=workflow_id, user_query=f"q{i}", response=f"r{i}", created_at=created))
+        db.commit()
+    finally:
+        db.close()
+
+def all_pages(client, workflow_id: int, limit: int):
+    seen, cursor = [], None
+    for _ in range(100):
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        page = client.get(f"/api/workflows/{workflow_id}/chat-history", params=params).json()
+        assert len(page["chat_history"]) <= limit
+        seen.extend(page["chat_history"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return seen
+    raise AssertionError("pagination did not terminate")
+
+def test_cursor_round_trip():
+    ts = datetime.datetime(2024, 1, 2, 3, 4, 5, 6)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+
+def test_invalid_cursor_is_rejected(client):
+    wf = make_workflow(client)
+    assert client.get(f"/api/workflows/{wf}/chat-history", params={"cursor": "nope"}).status_code == 400
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 50])
+def test_pages_cover_every_row_once(client, limit):
+    wf = make_workflow(client)
+    add_logs(wf, 20, datetime.datetime(2024, 1, 1))
+    rows = all_pages(client, wf, limit)
+    assert [r["user_query"] for r in rows] == [f"q{i}" for i in reversed(range(20))]
+
+def test_buffered_rows_are_flushed_and_paged(client):
+    wf = make_workflow(client)
+    add_logs(wf, 5, datetime.datetime(2024, 1, 1))
+    for i in range(3):
+        client.portal.call(chat_log_writer.add, wf, f"new{i}", "r")
+    rows = all_pages(client, wf, 4)
+    assert len(rows) == 8
+    assert all(r["id"] is not None for r in rows)
+    assert [r["user_query"] for r in rows[:3]] == ["new2", "new1", "new0"]
+
+def test_buffered_rows_do_not_hide_stored_rows_when_flush_fails(client, monkeypatch):
+    wf = make_workflow(client)
+    add_logs(wf, 5, datetime.datetime(2024, 1, 1))
+    now = datetime.datetime.utcnow()
+    pending = [{"workflow_id": wf, "conversation_id": None, "user_query": f"buf{i}", "response": "r",
+                "created_at": now + datetime.timedelta(seconds=i)} for i in range(3)]
+    monkeypatch.setattr(chat_log_writer, "pending", lambda workflow_id, conversation_id=None:
+                        sorted(pending, key=lambda r: r["created_at"], reverse=True) if workflow_id == wf else [])
+
+    async def failing_flush():
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(chat_log_writer, "flush", failing_flush)
+    for limit in (2, 3, 4):
+        rows = all_pages(client, wf, limit)
+        stored = [r["user_query"] for r in rows if r["id"] is not None]
+        assert stored == [f"q{i}" for i in reversed(range(5))], limit
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from app.services.chat_log_writer import ChatLogWriter
+
+def make_writer(fail_on: str, **kwargs) -> ChatLogWriter:
+    writer = ChatLogWriter(mode="behind", batch_size=10, interval=60, **kwargs)
+    committed = []
+
+    async def insert(rows):
+        # Stands in for the database rejecting any statement that carries the bad row
+        if any(r["user_query"] == fail_on for r in rows):
+            raise RuntimeError("constraint failed")
+        committed.extend(rows)
+
+    writer._insert = insert
+    writer.committed = committed
+    return writer
+
+def queue(writer: ChatLogWriter, *queries: str):
+    for q in queries:
+        writer.buffer.append({"workflow_id": 1, "conversation_id": None, "user_query": q,
+                              "response": "r", "created_at": None})
+
+def test_bad_row_is_quarantined_after_max_attempts():
+    async def scenario():
+        writer = make_writer("bad", max_attempts=2)
+        queue(writer, "a", "bad", "b")
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await writer.flush()
+        assert len(writer.buffer) == 3
+        assert await writer.flush() == 2
+        return writer
+    writer = asyncio.run(scenario())
+    assert [r["user_query"] for r in writer.committed] == ["a", "b"]
+    assert writer.buffer == []
+    assert writer.quarantined == 1
+    assert writer.quarantine[0]["user_query"] == "bad"
+    assert writer.stats()["quarantined"] == 1
+
+def test_full_buffer_add_does_not_raise():
+    async def scenario():
+        writer = make_writer("bad", max_attempts=1, max_buffer=2)
+        queue(writer, "bad", "a")
+        # First add hits the failing batch, the next one takes the row-by-row path
+        await writer.add(1, "b", "r")
+        await writer.add(1, "c", "r")
+        writer._task.cancel()
+        return writer
+    writer = asyncio.run(scenario())
+    assert [r["user_query"] for r in writer.committed] == ["a", "b"]
+    assert [r["user_query"] for r in writer.buffer] == ["c"]
+    assert writer.quarantined == 1
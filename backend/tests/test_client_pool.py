@@ -0,0 +1,80 @@
+import asyncio
+import threading
+
+from app.core.client_pool import ClientPool
+
+def sync_factory(closed, name):
+    def factory():
+        return name, lambda: closed.append(name), None
+    return factory
+
+def test_eviction_waits_for_the_last_lease():
+    closed = []
+    pool = ClientPool(max_size=1, idle_ttl=600)
+    with pool.lease("openai", "key-a", sync_factory(closed, "a")) as client:
+        assert client == "a"
+        # "b" pushes "a" out of the pool while it is still leased
+        with pool.lease("openai", "key-b", sync_factory(closed, "b")):
+            pass
+        assert closed == []
+        assert pool.stats()["evictions"] == 1
+    assert closed == ["a"]
+
+def test_idle_eviction_skips_leased_clients():
+    closed = []
+    pool = ClientPool(max_size=8, idle_ttl=0)
+    with pool.lease("openai", "key-a", sync_factory(closed, "a")):
+        with pool.lease("openai", "key-b", sync_factory(closed, "b")):
+            pass
+        assert closed == []
+    # "a" is idle now, so the next acquisition may close it
+    with pool.lease("openai", "key-c", sync_factory(closed, "c")):
+        pass
+    assert "a" in closed
+
+def test_leases_share_one_client():
+    closed = []
+    pool = ClientPool(max_size=4, idle_ttl=600)
+    with pool.lease("openai", "key", sync_factory(closed, "a")) as first:
+        with pool.lease("openai", "key", sync_factory(closed, "other")) as second:
+            assert first is second
+            assert pool.stats()["leased"] == 1
+    assert pool.stats()["leased"] == 0
+    assert (pool.hits, pool.misses) == (1, 1)
+
+def test_async_close_runs_on_the_owning_loop():
+    closed = threading.Event()
+    close_loops = []
+    pool = ClientPool(max_size=1, idle_ttl=600)
+
+    async def aclose():
+        close_loops.append(asyncio.get_running_loop())
+        closed.set()
+
+    def async_factory():
+        return "async-client", aclose, None
+
+    def evict():
+        with pool.lease("openai", "key-b", sync_factory([], "b")):
+            pass
+
+    async def owner():
+        with pool.lease("openai_async", "key-a", async_factory):
+            pass
+        # Evict from a worker thread, i.e. off the event loop
+        await asyncio.to_thread(evict)
+        await asyncio.wait_for(asyncio.to_thread(closed.wait, 5), 5)
+        return asyncio.get_running_loop()
+
+    loop = asyncio.run(owner())
+    assert close_loops == [loop]
+
+def test_close_all_defers_leased_clients():
+    closed = []
+    pool = ClientPool(max_size=4, idle_ttl=600)
+    with pool.lease("openai", "key-a", sync_factory(closed, "a")):
+        with pool.lease("openai", "key-b", sync_factory(closed, "b")):
+            pass
+        pool.close_all()
+        assert closed == ["b"]
+    assert closed == ["b", "a"]
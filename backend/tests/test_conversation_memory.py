@@ -0,0 +1,82 @@
+import asyncio
+import datetime
+
+from app.services.conversation_memory import ConversationMemory, clip, estimate_tokens
+from app.services.node_cache import NodeCache, MemoryCacheBackend
+
+BASE = datetime.datetime(2024, 1, 1)
+
+def turns(count: int, size: int = 40):
+    """Newest first, as load_turns returns them"""
+    return [{"user_query": f"q{i} " + "x" * size, "response": f"r{i} " + "y" * size,
+             "created_at": BASE + datetime.timedelta(minutes=i)} for i in reversed(range(count))]
+
+def test_window_keeps_newest_turns_within_budget():
+    memory = ConversationMemory(history_tokens=60, message_tokens=400)
+    window, older = memory.window(turns(10))
+    # Each turn costs about 24 tokens: two fit in 60
+    assert [t["user_query"][:2] for t in window] == ["q8", "q9"]
+    assert [t["user_query"][:2] for t in older] == [f"q{i}" for i in range(8)]
+
+def test_window_always_keeps_the_newest_turn():
+    memory = ConversationMemory(history_tokens=1, message_tokens=400)
+    window, older = memory.window(turns(3))
+    assert len(window) == 1 and window[0]["user_query"].startswith("q2")
+    assert len(older) == 2
+
+def test_long_messages_are_clipped():
+    text = "a" * 1000 + "b" * 1000
+    clipped = clip(text, 50)
+    assert len(clipped) < 250 and clipped.startswith("a") and clipped.endswith("b")
+    assert estimate_tokens(clipped) <= 60
+
+def test_fit_messages_drops_oldest_first():
+    memory = ConversationMemory(history_tokens=30, message_tokens=400)
+    messages = [{"role": "user", "content": f"m{i} " + "z" * 40} for i in range(5)]
+    kept = memory.fit_messages(messages)
+    assert [m["content"][:2] for m in kept] == ["m3", "m4"]
+
+def test_summary_is_extended_incrementally():
+    memory = ConversationMemory(history_tokens=60, summary_tokens=1000)
+
+    async def scenario():
+        first = await memory._summary("wf:1", list(reversed(turns(5)[2:])), {})
+        # Same older turns again: served from the cache
+        again = await memory._summary("wf:1", list(reversed(turns(5)[2:])), {})
+        # Two more turns left the window since: only they are folded in
+        extended = await memory._summary("wf:1", list(reversed(turns(7)[2:])), {})
+        return first, again, extended
+
+    first, again, extended = asyncio.run(scenario())
+    assert again == first
+    assert extended.startswith(first) and "q3" in extended and "q4" in extended
+    assert memory.hits == 1 and memory.misses == 1
+    assert memory.folded_turns == 5
+
+def test_summary_rolls_within_its_budget():
+    memory = ConversationMemory(summary_tokens=40)
+    summary = memory._fold_extractive("", list(reversed(turns(20))))
+    assert estimate_tokens(summary) <= 40
+    assert "q19" in summary and "q0 " not in summary
+
+def test_context_for_combines_window_and_summary(monkeypatch):
+    memory = ConversationMemory(history_tokens=60, summary_tokens=1000)
+
+    async def load(workflow_id, conversation_id):
+        return turns(6)
+
+    monkeypatch.setattr(memory, "load_turns", load)
+    context = asyncio.run(memory.context_for(1))
+    assert [m["role"] for m in context["chat_history"]] == ["user", "assistant"] * 2
+    assert context["chat_history"][-1]["content"].startswith("r5")
+    assert "q3" in context["summary"] and "q4" not in context["summary"]
+
+def test_summary_only_keys_llm_nodes():
+    cache = NodeCache(MemoryCacheBackend())
+    inputs = {"query": "q", "api_keys": {}, "history_summary": "one"}
+    kb = {"id": "kb", "type": "knowledgebase", "data": {"config": {}}}
+    llm = {"id": "llm", "type": "llm", "data": {"config": {}}}
+    for node in (kb, llm):
+        a = cache.make_key(node, inputs, {"history_summary": "one"})
+        b = cache.make_key(node, {**inputs, "history_summary": "two"}, {"history_summary": "two"})
+        assert (a != b) == (node is llm)
@@ -0,0 +1,71 @@
+import sqlite3
+import struct
+
+import pytest
+
+from app.core import embedding_cache as embedding_cache_module
+from app.core.embedding_cache import EmbeddingCache, _from_blob, _to_blob
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(embedding_cache_module.time, "time", clock.time)
+    return clock
+
+def float32(values):
+    return list(struct.unpack(f"{len(values)}f", struct.pack(f"{len(values)}f", *values)))
+
+def test_vectors_round_trip_as_float32_blobs(tmp_path):
+    vector = [0.5, -1.25, 0.1, 3.0e-5, 12345.678]
+    blob = _to_blob(vector)
+    assert len(blob) == 4 * len(vector)
+    assert _from_blob(blob) == float32(vector)
+
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), memory_size=0)
+    cache.put_many("openai", "m", ["text"], [vector])
+    # A fresh instance has nothing in memory, so this reads the blob back from SQLite
+    reopened = EmbeddingCache(str(tmp_path / "cache.db"))
+    assert reopened.get_many("openai", "m", ["text"]) == [float32(vector)]
+    assert reopened.disk_hits == 1
+
+def test_entries_are_keyed_by_provider_and_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many("openai", "small", ["text"], [[1.0]])
+    cache.put_many("openai", "large", ["text"], [[2.0]])
+    cache.put_many("gemini", "small", ["text"], [[3.0]])
+    assert cache.get_many("openai", "small", ["text", "other"]) == [[1.0], None]
+    assert cache.get_many("openai", "large", ["text"]) == [[2.0]]
+    assert cache.get_many("gemini", "small", ["text"]) == [[3.0]]
+    assert cache.get_many("gemini", "large", ["text"]) == [None]
+
+def test_disk_is_pruned_least_recently_used_first(tmp_path, clock):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), memory_size=0, max_rows=2)
+    cache.put_many("openai", "m", ["a"], [[1.0]])
+    cache.put_many("openai", "m", ["b"], [[2.0]])
+    assert cache.get_many("openai", "m", ["a"]) == [[1.0]]  # "b" is now the oldest
+    cache.put_many("openai", "m", ["c"], [[3.0]])
+
+    assert cache.get_many("openai", "m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+    assert cache.stats()["pruned"] == 1
+
+def test_cache_files_without_access_times_are_upgraded(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE embeddings (provider TEXT NOT NULL, model TEXT NOT NULL, text_hash TEXT NOT NULL, "
+        "dim INTEGER NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (provider, model, text_hash))"
+    )
+    conn.commit()
+    conn.close()
+
+    cache = EmbeddingCache(path, max_rows=10)
+    cache.put_many("openai", "m", ["a"], [[1.0]])
+    assert EmbeddingCache(path).get_many("openai", "m", ["a"]) == [[1.0]]
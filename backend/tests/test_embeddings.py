@@ -0,0 +1,39 @@
+import random
+import time
+from contextlib import nullcontext
+
+import google.generativeai as genai
+
+from app.core import embeddings
+
+def test_gemini_multi_batch_keeps_input_order(monkeypatch):
+    calls = []
+
+    def fake_embed_content(model, content, task_type, client):
+        calls.append(len(content))
+        # Finish out of order so ordering has to come from the sliding window
+        time.sleep(random.uniform(0, 0.02))
+        return {"embedding": [[float(int(t.split()[1]))] for t in content]}
+
+    monkeypatch.setattr(embeddings, "lease_gemini_client", lambda api_key: nullcontext(object()))
+    monkeypatch.setattr(genai, "embed_content", fake_embed_content)
+
+    texts = [f"chunk {i}" for i in range(250)]
+    vectors = embeddings.embed_texts_gemini("key", texts, batch_size=20, concurrency=4)
+
+    assert vectors == [[float(i)] for i in range(250)]
+    assert sorted(calls) == sorted([20] * 12 + [10])
+
+def test_gemini_batch_error_propagates(monkeypatch):
+    def failing(model, content, task_type, client):
+        raise RuntimeError("bad request")
+
+    monkeypatch.setattr(embeddings, "lease_gemini_client", lambda api_key: nullcontext(object()))
+    monkeypatch.setattr(genai, "embed_content", failing)
+
+    try:
+        embeddings.embed_texts_gemini("key", [f"chunk {i}" for i in range(50)], batch_size=10, concurrency=2)
+    except Exception as e:
+        assert "bad request" in str(e)
+    else:
+        raise AssertionError("expected the batch error to propagate")
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.execution_plan import PlanCache, plan_cache
+
+NODES = [
+    {"id": "q", "type": "user_query", "data": {"config": {}}},
+    {"id": "out", "type": "output", "data": {"config": {}}},
+]
+EDGES = [{"source": "q", "target": "out", "sourceHandle": "query", "targetHandle": "output"}]
+
+def definition(nodes=NODES, edges=EDGES) -> str:
+    return json.dumps({"nodes": nodes, "edges": edges})
+
+def test_same_definition_hits_the_cache():
+    cache = PlanCache()
+    first = cache.get_or_compile(1, definition())
+    assert cache.get_or_compile(1, definition()) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_edited_workflow_gets_a_new_plan():
+    cache = PlanCache()
+    first = cache.get_or_compile(1, definition())
+    edited = cache.get_or_compile(1, definition(edges=[]))
+    assert edited is not first
+    assert edited.routes["q"] == () and first.routes["q"] != ()
+    # The plan for the old version is dropped, not kept alongside
+    assert cache.stats()["size"] == 1
+
+def test_least_recently_used_plan_is_evicted():
+    cache = PlanCache(max_size=2)
+    one = cache.get_or_compile(1, definition())
+    cache.get_or_compile(2, definition())
+    cache.get_or_compile(1, definition())
+    cache.get_or_compile(3, definition())
+    assert cache.evictions == 1
+    assert cache.get_or_compile(1, definition()) is one
+    assert cache.misses == 3
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+def test_update_and_delete_invalidate_plans(client, monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(plan_cache, "invalidate", invalidated.append)
+    body = {"name": "plans", "nodes": NODES, "edges": EDGES}
+    workflow_id = client.post("/api/workflows", json=body).json()["workflow_id"]
+
+    assert client.put(f"/api/workflows/{workflow_id}", json={**body, "name": "renamed"}).status_code == 200
+    assert invalidated == [workflow_id]
+    assert client.delete(f"/api/workflows/{workflow_id}").status_code == 200
+    assert invalidated == [workflow_id, workflow_id]
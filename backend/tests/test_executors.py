@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from app.core.executors import WorkloadPool
+
+def saturated_pool():
+    # One worker and one slot: every run() beyond the first has to wait
+    pool = WorkloadPool("test", "thread", 1, queue_factor=1)
+    gate = threading.Event()
+    return pool, gate
+
+def test_run_waits_for_a_slot_on_the_loop():
+    async def scenario():
+        pool, gate = saturated_pool()
+        first = asyncio.create_task(pool.run(gate.wait, 5))
+        await asyncio.sleep(0.05)
+        waiting = [asyncio.create_task(pool.run(lambda i=i: i)) for i in range(3)]
+        await asyncio.sleep(0.05)
+        stats = pool.stats()
+        gate.set()
+        results = await asyncio.gather(first, *waiting)
+        pool.shutdown(wait=True)
+        return stats, results, pool
+    stats, results, pool = asyncio.run(scenario())
+    assert stats["outstanding"] == 1 and stats["waiting"] == 3
+    assert results == [True, 0, 1, 2]
+    assert pool.stats()["outstanding"] == 0 and pool.stats()["waiting"] == 0
+    # Every slot came back
+    assert pool._slots.acquire(blocking=False)
+
+def test_cancelled_waiter_does_not_keep_the_slot():
+    async def scenario():
+        pool, gate = saturated_pool()
+        first = asyncio.create_task(pool.run(gate.wait, 5))
+        await asyncio.sleep(0.05)
+        abandoned = asyncio.create_task(pool.run(lambda: "abandoned"))
+        later = asyncio.create_task(pool.run(lambda: "later"))
+        await asyncio.sleep(0.05)
+        abandoned.cancel()
+        gate.set()
+        result = await asyncio.wait_for(later, timeout=5)
+        await first
+        pool.shutdown(wait=True)
+        return result, abandoned
+    result, abandoned = asyncio.run(scenario())
+    assert result == "later"
+    assert abandoned.cancelled()
@@ -0,0 +1,95 @@
+import asyncio
+import dataclasses
+from types import MappingProxyType
+
+import pytest
+
+from app.services.execution_plan import GraphExecutionError, compile_plan
+from app.services.graph_orchestrator import execute_plan
+
+def node(nid: str, node_type: str = "step"):
+    return {"id": nid, "type": node_type, "data": {"config": {}}}
+
+def edge(source: str, target: str, source_handle=None, target_handle=None):
+    return {"source": source, "target": target, "sourceHandle": source_handle, "targetHandle": target_handle}
+
+def plan_with(nodes, edges, executors):
+    """Compile a plan, then swap in test executors by node id"""
+    plan = compile_plan(nodes, edges)
+    return dataclasses.replace(plan, executors=MappingProxyType(executors))
+
+def test_downstream_starts_while_slow_sibling_runs():
+    # a -> fast -> after ; a -> slow
+    events = []
+
+    def step(name, delay=0.0):
+        async def run(node, inputs, context):
+            events.append(f"start {name}")
+            await asyncio.sleep(delay)
+            events.append(f"end {name}")
+            return {"output": name}
+        return run
+
+    nodes = [node("a"), node("fast"), node("slow"), node("after")]
+    edges = [edge("a", "fast"), edge("a", "slow"), edge("fast", "after")]
+    plan = plan_with(nodes, edges, {"a": step("a"), "fast": step("fast"), "slow": step("slow", 0.2),
+                                    "after": step("after")})
+    asyncio.run(execute_plan(plan, {}))
+
+    # Level-by-level execution would wait for "slow" before starting "after"
+    assert events.index("start after") < events.index("end slow")
+
+def test_failure_cancels_pending_nodes():
+    cancelled = []
+    started = []
+
+    async def fail(node, inputs, context):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def slow(node, inputs, context):
+        started.append(node["id"])
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(node["id"])
+            raise
+        return {"output": "slow"}
+
+    async def never(node, inputs, context):
+        started.append(node["id"])
+        return {}
+
+    nodes = [node("bad"), node("slow"), node("after_bad")]
+    edges = [edge("bad", "after_bad")]
+    plan = plan_with(nodes, edges, {"bad": fail, "slow": slow, "after_bad": never})
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(asyncio.wait_for(execute_plan(plan, {}), 2))
+
+    assert cancelled == ["slow"]
+    assert "after_bad" not in started
+
+def test_cycle_is_rejected():
+    nodes = [node("a"), node("b"), node("c")]
+    edges = [edge("a", "b"), edge("b", "c"), edge("c", "b")]
+    with pytest.raises(GraphExecutionError, match="Cycle"):
+        compile_plan(nodes, edges)
+
+def test_source_handles_route_each_value_to_its_target():
+    received = {}
+
+    async def router(node, inputs, context):
+        return {"yes": "approved", "no": "rejected"}
+
+    def sink(name):
+        async def run(node, inputs, context):
+            received[name] = {k: v for k, v in inputs.items() if k != "query"}
+            return {"output": name}
+        return run
+
+    nodes = [node("route"), node("on_yes"), node("on_no")]
+    edges = [edge("route", "on_yes", "yes", "input"), edge("route", "on_no", "no", "input")]
+    plan = plan_with(nodes, edges, {"route": router, "on_yes": sink("on_yes"), "on_no": sink("on_no")})
+    asyncio.run(execute_plan(plan, {"query": "q"}))
+
+    assert received == {"on_yes": {"input": "approved"}, "on_no": {"input": "rejected"}}
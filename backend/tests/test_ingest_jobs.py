@@ -0,0 +1,104 @@
+import io
+import os
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import document_store
+from app.services.ingest_jobs import IngestJobManager, ingest_jobs
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+def spooled(content: bytes):
+    return document_store.spool(io.BytesIO(content))
+
+def test_same_content_resolves_to_one_document(client):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    path, size, digest = spooled(content)
+    first = client.portal.call(ingest_jobs.store, path, "a.pdf", "", size, digest)
+    path2, size, digest = spooled(content)
+    second = client.portal.call(ingest_jobs.store, path2, "b.pdf", "", size, digest)
+    assert not first["duplicate"] and second["duplicate"]
+    assert second["document_id"] == first["document_id"]
+    assert not os.path.exists(path2)
+
+def test_lost_insert_race_resolves_to_existing_document(client, monkeypatch):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    path, size, digest = spooled(content)
+    first = client.portal.call(ingest_jobs.store, path, "a.pdf", "", size, digest)
+
+    # The second upload's lookup runs before the first one's commit: it misses and inserts
+    lookup = IngestJobManager._find_by_hash
+    misses = []
+
+    async def racing_lookup(self, db, content_hash):
+        if not misses:
+            misses.append(content_hash)
+            return None
+        return await lookup(self, db, content_hash)
+
+    monkeypatch.setattr(IngestJobManager, "_find_by_hash", racing_lookup)
+    path2, size, digest = spooled(content)
+    second = client.portal.call(ingest_jobs.store, path2, "b.pdf", "", size, digest)
+    assert misses == [digest]
+    assert second["duplicate"] and second["document_id"] == first["document_id"]
+    assert not os.path.exists(path2)
+
+def make_job(owner, lease_until, file_path):
+    from app.db import SessionLocal
+    from app.models import Document, IngestJob
+    db = SessionLocal()
+    try:
+        doc = Document(filename="x.pdf", file_path=file_path)
+        db.add(doc)
+        db.flush()
+        job = IngestJob(id=str(uuid.uuid4()), document_id=doc.id, filename="x.pdf", status="running",
+                        owner=owner, lease_until=lease_until)
+        db.add(job)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+def job_row(job_id):
+    from app.db import SessionLocal
+    from app.models import IngestJob
+    db = SessionLocal()
+    try:
+        return db.get(IngestJob, job_id)
+    finally:
+        db.close()
+
+def test_recovery_claims_only_expired_leases(client, tmp_path):
+    import datetime
+    pdf = tmp_path / "x.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    now = datetime.datetime.utcnow()
+    live = make_job("sibling", now + datetime.timedelta(seconds=60), str(pdf))
+    expired = make_job("crashed", now - datetime.timedelta(seconds=1), str(pdf))
+    legacy = make_job(None, None, str(tmp_path / "gone.pdf"))
+
+    first, second = IngestJobManager(), IngestJobManager()
+    claimed = [job_id for job_id, *_ in first._claim_expired()]
+    assert expired in claimed and live not in claimed
+    # A second worker recovering at the same time finds nothing left to take
+    assert [job_id for job_id, *_ in second._claim_expired() if job_id in (live, expired, legacy)] == []
+
+    assert job_row(live).owner == "sibling" and job_row(live).status == "running"
+    assert job_row(expired).owner == first.worker_id and job_row(expired).status == "queued"
+    assert job_row(legacy).status == "failed"
+
+def test_heartbeat_renews_own_unfinished_jobs(client, tmp_path):
+    import datetime
+    manager = IngestJobManager(lease_seconds=300)
+    old = datetime.datetime.utcnow() + datetime.timedelta(seconds=5)
+    mine = make_job(manager.worker_id, old, str(tmp_path / "x.pdf"))
+    other = make_job("sibling", old, str(tmp_path / "x.pdf"))
+    assert manager._renew() >= 1
+    assert job_row(mine).lease_until > old + datetime.timedelta(seconds=200)
+    assert job_row(other).lease_until == old
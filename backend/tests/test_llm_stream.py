@@ -0,0 +1,76 @@
+import asyncio
+from contextlib import aclosing, nullcontext
+
+import pytest
+
+from app.core.llm_client import StreamIdleTimeout, _iter_with_idle_timeout
+
+class FakeStream:
+    """Stands in for a provider stream: yields items, optionally stalls, and records close()"""
+
+    def __init__(self, items, stall: bool = False):
+        self.items = items
+        self.stall = stall
+        self.closed = False
+
+    async def _iterate(self):
+        for item in self.items:
+            yield item
+        if self.stall:
+            await asyncio.Event().wait()
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def close(self):
+        self.closed = True
+
+def test_stream_closed_when_consumer_stops_early():
+    async def scenario():
+        stream = FakeStream([1, 2, 3])
+        async with aclosing(_iter_with_idle_timeout(stream, 1)) as items:
+            async for item in items:
+                break
+        return stream
+    assert asyncio.run(scenario()).closed
+
+def test_stream_closed_on_idle_timeout():
+    async def scenario():
+        stream = FakeStream([1], stall=True)
+        with pytest.raises(StreamIdleTimeout):
+            async for _ in _iter_with_idle_timeout(stream, 0.05):
+                pass
+        return stream
+    assert asyncio.run(scenario()).closed
+
+def gemini_chunk(text: str):
+    import google.ai.generativelanguage as glm
+    return glm.GenerateContentResponse(candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)]))])
+
+class FakeGeminiAsyncClient:
+    """The pooled GenerativeServiceAsyncClient: records requests and streams canned chunks"""
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.requests = []
+
+    async def stream_generate_content(self, request):
+        self.requests.append(request)
+        return FakeStream([gemini_chunk(t) for t in self.texts])
+
+def test_gemini_stream_uses_the_pooled_service_client(monkeypatch):
+    from app.core import llm_client
+
+    fake = FakeGeminiAsyncClient(["Hel", "lo"])
+    monkeypatch.setattr(llm_client, "lease_gemini_async_client", lambda api_key: nullcontext(fake))
+
+    async def scenario():
+        return [e async for e in llm_client.astream_chat_gemini("key", "Be brief.", "Hi", 0.3, 50)]
+
+    events = asyncio.run(scenario())
+    assert events == [{"type": "token", "delta": "Hel"}, {"type": "token", "delta": "lo"},
+                      {"type": "done", "text": "Hello"}]
+    request = fake.requests[0]
+    assert request.model == f"models/{llm_client.GEMINI_MODEL}"
+    assert request.contents[0].parts[0].text == "Be brief.\n\nHi"
+    assert request.generation_config.max_output_tokens == 50
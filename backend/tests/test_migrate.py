@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.migrate import SchemaMigrationError, migrate_schema
+
+def legacy_engine(tmp_path):
+    """A database from before documents.content_hash was unique and ingest jobs had leases"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    migrate_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_documents_content_hash"))
+        conn.execute(text("CREATE INDEX ix_documents_content_hash ON documents (content_hash)"))
+        conn.execute(text("ALTER TABLE ingest_jobs DROP COLUMN lease_until"))
+    return engine
+
+def document_indexes(engine):
+    return {i["name"]: bool(i["unique"]) for i in inspect(engine).get_indexes("documents")}
+
+def test_upgrades_columns_and_unique_index(tmp_path):
+    engine = legacy_engine(tmp_path)
+    migrate_schema(engine)
+    assert "lease_until" in {c["name"] for c in inspect(engine).get_columns("ingest_jobs")}
+    assert document_indexes(engine)["ix_documents_content_hash"] is True
+    # Running it again changes nothing
+    migrate_schema(engine)
+
+def test_duplicate_rows_abort_without_weakening_the_index(tmp_path):
+    engine = legacy_engine(tmp_path)
+    with engine.begin() as conn:
+        for _ in range(2):
+            conn.execute(text("INSERT INTO documents (filename, content_hash) VALUES ('a.pdf', 'same')"))
+        conn.execute(text("INSERT INTO documents (filename, content_hash) VALUES ('b.pdf', NULL)"))
+        conn.execute(text("INSERT INTO documents (filename, content_hash) VALUES ('c.pdf', NULL)"))
+
+    with pytest.raises(SchemaMigrationError, match="ix_documents_content_hash"):
+        migrate_schema(engine)
+    # The existing index is left as it was rather than dropped or silently kept non-unique
+    assert document_indexes(engine)["ix_documents_content_hash"] is False
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM documents WHERE filename = 'a.pdf' AND id > (SELECT MIN(id) FROM documents)"))
+    migrate_schema(engine)
+    assert document_indexes(engine)["ix_documents_content_hash"] is True
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from app.services import node_cache as node_cache_module
+from app.services.node_cache import MemoryCacheBackend, NodeCache, SQLiteCacheBackend
+
+NODE = {"id": "kb", "type": "knowledgebase", "data": {"config": {"top_k": 3, "cache": True}}}
+INPUTS = {"query": "what is flowmind?", "api_keys": {"openai": "sk-one"}}
+CONTEXT = {"api_keys": {"openai": "sk-one"}, "node_configs": {"kb": {"collection": "docs"}}}
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(node_cache_module.time, "time", clock.time)
+    return clock
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        return NodeCache(SQLiteCacheBackend(str(tmp_path / "node_cache.db"), max_entries=2))
+    return NodeCache(MemoryCacheBackend(max_entries=2))
+
+def key(node=NODE, inputs=INPUTS, context=CONTEXT):
+    return NodeCache(MemoryCacheBackend()).make_key(node, inputs, context)
+
+def with_config(**changes):
+    return {**NODE, "data": {"config": {**NODE["data"]["config"], **changes}}}
+
+def test_key_changes_with_credential_config_or_input():
+    base = key()
+    assert key(context={**CONTEXT, "api_keys": {"openai": "sk-two"}}) != base
+    assert key(node=with_config(top_k=4)) != base
+    assert key(context={**CONTEXT, "node_configs": {"kb": {"collection": "other"}}}) != base
+    assert key(inputs={**INPUTS, "query": "something else"}) != base
+
+def test_key_ignores_cache_settings_and_shared_inputs():
+    base = key()
+    assert key(node=with_config(cache_ttl=5)) == base
+    # api_keys arrive in every node's inputs too; the credentials are keyed once, by fingerprint
+    assert key(inputs={**INPUTS, "api_keys": {"openai": "sk-other"}}) == base
+    assert "sk-one" not in str(key())
+
+def test_entries_expire_after_their_ttl(cache, clock):
+    async def scenario():
+        await cache.set("k", {"output": "v"}, ttl=10)
+        clock.now += 9
+        first = await cache.get("k")
+        clock.now += 2
+        return first, await cache.get("k")
+    assert asyncio.run(scenario()) == ({"output": "v"}, None)
+    assert cache.backend.size() == 0
+
+def test_backends_agree(cache, clock):
+    async def scenario():
+        await cache.set("a", {"output": 1}, ttl=60)
+        await cache.set("b", {"output": [1, 2]}, ttl=60)
+        clock.now += 1
+        assert await cache.get("a") == {"output": 1}  # "a" is now the most recently used
+        clock.now += 1
+        await cache.set("c", {"output": {"nested": True}}, ttl=60)
+        return [await cache.get(k) for k in ("a", "b", "c", "missing")]
+
+    assert asyncio.run(scenario()) == [{"output": 1}, None, {"output": {"nested": True}}, None]
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"], stats["stores"], stats["evictions"]) == (2, 3, 2, 3, 1)
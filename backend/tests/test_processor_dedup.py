@@ -0,0 +1,97 @@
+import itertools
+
+import pytest
+
+from app.core.chroma_client import get_or_create_collection
+from app.services import processor
+
+_names = itertools.count()
+
+@pytest.fixture
+def coll(monkeypatch):
+    name = f"dedup-test-{next(_names)}"
+    monkeypatch.setattr(processor, "CHROMA_COLLECTION", name)
+    return get_or_create_collection(name)
+
+@pytest.fixture
+def embedder(monkeypatch):
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0, 0.0] for t in texts]
+
+    monkeypatch.setattr(processor, "embed_texts", embed)
+    return calls
+
+def pages(*passages: str):
+    # One chunk per passage: each page is shorter than a chunk and joined by newlines
+    return [p.ljust(900, ".") for p in passages]
+
+def test_shared_chunk_lists_every_source(coll, embedder):
+    processor.ingest_pages(pages("alpha"), "a.pdf", fingerprint="hash-a")
+    result = processor.ingest_pages(pages("alpha"), "b.pdf", fingerprint="hash-b")
+
+    assert result["stored_chunks"] == 0 and result["skipped_chunks"] == 1
+    assert len(embedder) == 1
+    stored = coll.get(include=["metadatas"])
+    assert len(stored["ids"]) == 1
+    meta = stored["metadatas"][0]
+    assert meta["sources"] == ["a.pdf", "b.pdf"]
+    assert meta["doc_hashes"] == ["hash-a", "hash-b"]
+    assert processor.is_ingested("hash-a") and processor.is_ingested("hash-b")
+
+def test_reingest_of_same_document_adds_nothing(coll, embedder):
+    processor.ingest_pages(pages("alpha"), "a.pdf", fingerprint="hash-a")
+    processor.ingest_pages(pages("alpha"), "a.pdf", fingerprint="hash-a")
+    meta = coll.get(include=["metadatas"])["metadatas"][0]
+    assert meta["sources"] == ["a.pdf"]
+    assert len(embedder) == 1
+
+def test_zero_vector_chunks_are_not_treated_as_ingested(coll, monkeypatch):
+    def failing(texts):
+        raise RuntimeError("provider down")
+
+    monkeypatch.setattr(processor, "embed_texts", failing)
+    processor.ingest_pages(pages("alpha"), "a.pdf", fingerprint="hash-a")
+    assert coll.get(include=["metadatas"])["metadatas"][0]["zero_vector"] is True
+    assert not processor.is_ingested("hash-a")
+
+    embedded = []
+    monkeypatch.setattr(processor, "embed_texts", lambda texts: embedded.extend(texts) or [[1.0] * 1536 for _ in texts])
+    result = processor.ingest_pages(pages("alpha"), "a.pdf", fingerprint="hash-a")
+    assert result["stored_chunks"] == 1
+    assert coll.get(include=["metadatas"])["metadatas"][0]["zero_vector"] is False
+    assert processor.is_ingested("hash-a")
+
+def test_partial_zero_vectors_block_the_duplicate_shortcut(coll, embedder):
+    processor.ingest_pages(pages("alpha", "beta"), "a.pdf", fingerprint="hash-a")
+    ids = coll.get()["ids"]
+    coll.update(ids=ids[:1], metadatas=[{"zero_vector": True}])
+    assert not processor.is_ingested("hash-a")
+
+def test_unknown_fingerprint_is_not_ingested(coll):
+    assert not processor.is_ingested("missing")
+
+def test_failed_ingest_keeps_chunks_it_did_not_create(coll, embedder, monkeypatch):
+    processor.ingest_pages(pages("alpha", "beta"), "a.pdf", fingerprint="hash-a")
+    before = coll.get(include=["metadatas"])
+    # Pretend the second window was stored with a fallback zero vector, so b.pdf re-embeds it
+    second = next(cid for cid, meta in zip(before["ids"], before["metadatas"]) if meta["chunk_idx"] == 1)
+    coll.update(ids=[second], metadatas=[{"zero_vector": True}])
+
+    def fail_on_second_store(stage, count):
+        if stage == "stored" and count == 2:
+            raise RuntimeError("disk full")
+
+    monkeypatch.setattr(processor, "INGEST_EMBED_BATCH_SIZE", 1)
+    with pytest.raises(RuntimeError):
+        # Shares a.pdf's first two windows, then adds new ones
+        processor.ingest_pages(pages("alpha", "beta", "gamma"), "b.pdf", fingerprint="hash-b",
+                               progress=fail_on_second_store)
+
+    after = coll.get(include=["metadatas"])
+    assert sorted(after["ids"]) == sorted(before["ids"])
+    metas = dict(zip(after["ids"], after["metadatas"]))
+    assert all(meta["sources"] == ["a.pdf"] and meta["doc_hashes"] == ["hash-a"] for meta in metas.values())
+    assert metas[second]["zero_vector"] is True
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import workflow
+from app.core.ws_manager import ws_manager
+from app.main import app
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+def sse_events(body: str):
+    events = []
+    for block in body.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if line and not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_stream_sends_session_stats_log_result_in_order(client):
+    nodes = [
+        {"id": "q", "type": "user_query", "data": {"config": {}}},
+        {"id": "out", "type": "output", "data": {"config": {}}},
+    ]
+    edges = [{"source": "q", "target": "out", "sourceHandle": "query", "targetHandle": "output"}]
+    workflow_id = client.post("/api/workflows", json={"name": "sse", "nodes": nodes, "edges": edges}).json()["workflow_id"]
+
+    response = client.post(f"/api/workflows/{workflow_id}/execute?stream=true",
+                           json={"query": "hello", "session_id": "sse-order", "log_level": "info"})
+    events = sse_events(response.text)
+
+    assert [name for name, _ in events] == ["session", "stats", "log", "result"]
+    assert events[0][1] == {"session_id": "sse-order"}
+    assert events[2][1]["message"] == "Graph execution finished."
+    assert events[3][1]["output"] == "hello"
+    assert ws_manager._connections("sse-order") == []
+
+def test_disconnect_removes_listener_and_cancels_run(monkeypatch):
+    started = asyncio.Event()
+
+    async def slow_execute(workflow_id, definition, req, session_id):
+        started.set()
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(workflow, "_execute", slow_execute)
+
+    async def scenario():
+        # A response that never starts streaming registers nothing
+        unused = workflow._event_stream(1, "{}", {}, "sse-never-started")
+        await unused.aclose()
+        assert ws_manager._connections("sse-never-started") == []
+
+        stream = workflow._event_stream(1, "{}", {}, "sse-gone")
+        assert (await anext(stream)).startswith("event: session")
+        await started.wait()
+        assert len(ws_manager._connections("sse-gone")) == 1
+        runs = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        await stream.aclose()
+        await asyncio.sleep(0)
+        return runs
+
+    runs = asyncio.run(scenario())
+    assert ws_manager._connections("sse-gone") == []
+    assert runs and all(t.cancelled() for t in runs)
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from app.core.ws_manager import ConnectionManager
+
+class FakeSocket:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.sent = []
+        self.close_codes = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.fail:
+            raise RuntimeError("peer gone")
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000):
+        self.close_codes.append(code)
+
+def test_failed_send_closes_socket_and_forgets_it():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeSocket(fail=True)
+        await manager.connect("s1", ws)
+        await manager.send("s1", {"type": "done"})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return manager, ws
+    manager, ws = asyncio.run(scenario())
+    assert ws.close_codes == [1013]
+    assert manager._connections("s1") == []
+
+def test_sessions_without_listeners_are_not_buffered():
+    async def scenario():
+        manager = ConnectionManager()
+        await manager.send("nobody", {"type": "done"})
+        await manager.log("nobody", "info", "hello")
+        manager._on_backplane({"op": "event", "session_id": "elsewhere", "event": {"type": "done", "seq": 3}})
+        return manager
+    manager = asyncio.run(scenario())
+    assert manager.sessions == {}
+
+def test_replay_bytes_come_from_the_sent_frame():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeSocket()
+        await manager.connect("s1", ws)
+        await manager.send("s1", {"type": "token", "token": "hi"})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        await manager.disconnect("s1", ws)
+        # Still tracked after the socket left, so a reconnecting client can resume
+        await manager.send("s1", {"type": "done"})
+        manager._on_backplane({"op": "event", "session_id": "s1", "event": {"type": "done", "seq": 7}})
+        return manager, ws
+    manager, ws = asyncio.run(scenario())
+    buffer = manager.sessions["s1"].buffer
+    assert [seq for seq, _, _ in buffer.events] == [1, 2, 7]
+    assert json.loads(ws.sent[0]) == {"type": "token", "token": "hi", "seq": 1}
+    assert buffer.events[0][2] == len(ws.sent[0])
+    assert buffer.bytes == sum(size for _, _, size in buffer.events)
+
+def test_resume_puts_replay_ahead_of_queued_live_events():
+    async def scenario():
+        manager = ConnectionManager()
+        old = FakeSocket()
+        await manager.connect("s1", old)
+        await manager.send("s1", {"type": "token", "token": "a"})
+        await manager.send("s1", {"type": "token", "token": "b"})
+        await manager.disconnect("s1", old)
+
+        ws = FakeSocket()
+        await manager.connect("s1", ws)
+        # A live event is queued before the client's resume message is handled
+        await manager.send("s1", {"type": "token", "token": "c"})
+        accepted = manager.resume("s1", ws, 0)
+        for _ in range(50):
+            await asyncio.sleep(0)
+        return accepted, ws
+    accepted, ws = asyncio.run(scenario())
+    assert accepted
+    frames = [json.loads(text) for text in ws.sent]
+    assert [f["type"] for f in frames] == ["token", "token", "replayed", "token"]
+    assert [f.get("seq") for f in frames if f["type"] == "token"] == [1, 2, 3]
+
+def test_resume_after_live_events_is_refused():
+    async def scenario():
+        manager = ConnectionManager()
+        ws = FakeSocket()
+        await manager.connect("s1", ws)
+        await manager.send("s1", {"type": "token", "token": "a"})
+        for _ in range(10):
+            await asyncio.sleep(0)
+        late = manager.resume("s1", ws, 0)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        return late, ws
+    late, ws = asyncio.run(scenario())
+    assert late is False
+    assert [json.loads(text)["seq"] for text in ws.sent] == [1]
@@ -173,19 +173,12 @@ export default function ChatModal({ onClose, workflowId, nodes = [] }) {
           }
         }
       });
-      // Prepare chat history for context
-      const chatHistory = chat.map(c => ({
-        role: c.role,
-        content: c.text
-      }));
-
       const resp = await axios.post(`${import.meta.env.VITE_API_URL || "http://localhost:8000"}/api/workflows/${workflowId}/execute`, {
         workflow_id: workflowId,
         query: message,
         session_id: sid,
         api_keys: apiKeys,
-        node_configs: nodeConfigs,
-        chat_history: chatHistory
+        node_configs: nodeConfigs
       });
       if (resp.data && resp.data.output) {
         setChat(prev => {
@@ -1,5 +1,6 @@
 import React, { useState } from "react";
 import { Handle, Position } from "reactflow";
+import axios from "axios";
 import { BookOpen, Eye, EyeOff, Trash2, X } from "lucide-react";
 
 export default function KnowledgeBaseNode({ data, onDelete }) {
@@ -116,17 +117,22 @@ export default function KnowledgeBaseNode({ data, onDelete }) {
                   return;
                 }
                 
-                // Convert file to base64 for transmission
-                const reader = new FileReader();
-                reader.onload = () => {
-                  const base64 = reader.result.split(',')[1]; // Remove data:application/pdf;base64, prefix
-                  updateConfig('uploaded_file', {
-                    name: file.name,
-                    content: base64,
-                    type: file.type
-                  });
-                };
-                reader.readAsDataURL(file);
+                // Store the file on the server; the node references it by document id when the workflow runs
+                const formData = new FormData();
+                formData.append("file", file);
+                try {
+                  const res = await axios.post(
+                    `${import.meta.env.VITE_API_URL || "http://localhost:8000"}/api/upload?ingest=false`,
+                    formData,
+                    { headers: { "Content-Type": "multipart/form-data" } }
+                  );
+                  updateConfig('uploaded_file', null);
+                  updateConfig('file', file.name);
+                  updateConfig('document_id', res.data.document_id);
+                } catch (err) {
+                  alert(`Upload failed: ${err.response?.data?.detail || err.message}`);
+                  e.target.value = '';
+                }
               }
             }}
           />